@@ -1,12 +1,17 @@
 
 # src/backend/api_gateway/endpoints/auth.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from firebase_admin import auth, firestore
+from firebase_admin import auth
 from pydantic import BaseModel
 from typing import List
+import asyncio
 import logging
+from services.rate_limiter import rate_limiter, retry_after_header
+from services.token_verifier import verify_id_token
+from services.user_bootstrap import user_bootstrap
+from services.user_directory import user_directory
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -24,7 +29,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthUser:
     Handles first-time login role assignment.
     """
     try:
-        decoded_token = auth.verify_id_token(token, check_revoked=True)
+        decoded_token = await verify_id_token(token)
         uid = decoded_token['uid']
         email = decoded_token.get('email')
         role = decoded_token.get("role", "viewer") 
@@ -33,26 +38,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthUser:
         if "role" not in decoded_token:
             logger.info(f"No role found for user {email}. Assigning default role.")
             
-            db = firestore.client()
-            users_ref = db.collection("users")
-            all_users_snapshot = list(users_ref.stream())
-
-            # The very first user in the system gets to be admin
-            if not all_users_snapshot or (len(all_users_snapshot) == 1 and all_users_snapshot[0].id == uid):
-                new_role = "admin"
+            # One transactional read of the bootstrap marker instead of listing every user
+            new_role = await asyncio.to_thread(user_bootstrap.assign_initial_role, uid, email)
+            if new_role == "admin":
                 logger.info(f"User {email} is the first user. Promoting to 'admin'.")
             else:
-                new_role = "analyst"
                 logger.info(f"Assigning new user {email} the default role of 'analyst'.")
 
-            # Set the custom claim and update Firestore
+            # Set the custom claim; the user document was written with the role
             auth.set_custom_user_claims(uid, {'role': new_role})
-            user_doc_ref = users_ref.document(uid)
-            user_doc_ref.set({
-                'uid': uid,
-                'email': email,
-                'role': new_role,
-            }, merge=True)
+            user_directory.update(uid, email, new_role)
             
             role = new_role
 
@@ -92,6 +87,19 @@ def require_role(required_roles: List[str]):
         return current_user
     return role_checker
 
+def rate_limit(route: str):
+    """Factory for a dependency that applies the route's rate limit policy (RATE_LIMIT_POLICIES) per user."""
+    async def limiter(request: Request, current_user: AuthUser = Depends(get_current_user)):
+        allowed, wait = await rate_limiter.check(route, current_user.uid, current_user.role)
+        if not allowed:
+            logger.warning(f"Rate limit '{route}' exceeded by {current_user.email or request.client.host}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please slow down.",
+                headers=retry_after_header(wait),
+            )
+    return limiter
+
 # Specific role dependencies for use in other endpoints
 require_admin = require_role(["admin"])
 require_analyst = require_role(["admin", "analyst"])
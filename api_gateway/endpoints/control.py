@@ -1,47 +1,87 @@
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Depends, Request
-from pydantic import BaseModel, IPvAnyAddress
-import subprocess
-import time
-from .auth import require_role
+from pydantic import BaseModel, Field, IPvAnyAddress
+from core.config import settings
+from services.firewall import firewall
+from .auth import require_role, rate_limit
 
 # Create the dependency instance for analyst or admin
 require_analyst = require_role(["analyst", "admin"])
 
 router = APIRouter()
 
-RATE_LIMIT = {}
-async def rate_limiter(req: Request):
-    ip = req.client.host
-    now = time.time()
-    window = 10  # seconds
-    max_requests = 5
-    if ip not in RATE_LIMIT:
-        RATE_LIMIT[ip] = []
-    RATE_LIMIT[ip] = [t for t in RATE_LIMIT[ip] if now - t < window]
-    if len(RATE_LIMIT[ip]) >= max_requests:
-        raise HTTPException(status_code=429, detail="Too many requests. Please slow down.")
-    RATE_LIMIT[ip].append(now)
-
 class BlockIPRequest(BaseModel):
     ip: IPvAnyAddress
 
+class BulkBlockRequest(BaseModel):
+    ips: List[IPvAnyAddress] = Field(..., min_length=1, max_length=10000)
+    # Seconds until the block expires; FIREWALL_DEFAULT_TTL_SECONDS when omitted
+    ttl_seconds: Optional[int] = Field(default=None, ge=1)
+    # Only render the nft script
+    dry_run: bool = False
+
+class BulkUnblockRequest(BaseModel):
+    ips: List[IPvAnyAddress] = Field(..., min_length=1, max_length=10000)
+    dry_run: bool = False
+
+
+def _default_ttl(ttl_seconds: Optional[int]) -> Optional[int]:
+    return ttl_seconds or settings.FIREWALL_DEFAULT_TTL_SECONDS or None
+
+
+def _raise_on_error(result: dict):
+    if result["error"]:
+        raise HTTPException(status_code=500, detail=f"Firewall error: {result['error']}")
+
+
 @router.post("/control/block-ip", tags=["Control"])
 async def block_ip(
     request: BlockIPRequest,
     req: Request,
     user=Depends(require_analyst),
-    _: None = Depends(rate_limiter)
+    _: None = Depends(rate_limit("control"))
 ):
     """
-    Block an IP address using system firewall (iptables).
-    """
-    try:
-        # Example for Linux with iptables
-        result = subprocess.run([
-            "sudo", "iptables", "-A", "INPUT", "-s", str(request.ip), "-j", "DROP"
-        ], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"iptables error: {result.stderr}")
-        return {"status": "success", "message": f"Blocked IP {request.ip}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    Block an IP address in the firewall blocklist (nftables set).
+    """
+    result = await firewall.block([str(request.ip)], ttl=_default_ttl(None))
+    _raise_on_error(result)
+    return {"status": "success", "message": f"Blocked IP {request.ip}"}
+
+
+@router.post("/control/block", tags=["Control"])
+async def block_ips(
+    request: BulkBlockRequest,
+    user=Depends(require_analyst),
+    _: None = Depends(rate_limit("control"))
+):
+    """
+    Block many IP addresses in one atomic firewall update, optionally with a TTL.
+    With dry_run the generated nft script is returned and nothing is changed.
+    """
+    result = await firewall.block([str(ip) for ip in request.ips], ttl=_default_ttl(request.ttl_seconds),
+                                  dry_run=request.dry_run)
+    _raise_on_error(result)
+    return result
+
+
+@router.post("/control/unblock", tags=["Control"])
+async def unblock_ips(
+    request: BulkUnblockRequest,
+    user=Depends(require_analyst),
+    _: None = Depends(rate_limit("control"))
+):
+    """
+    Remove IP addresses from the blocklist in one atomic firewall update.
+    """
+    result = await firewall.unblock([str(ip) for ip in request.ips], dry_run=request.dry_run)
+    _raise_on_error(result)
+    return result
+
+
+@router.get("/control/blocked", tags=["Control"])
+async def list_blocked(user=Depends(require_analyst)):
+    """
+    List blocked IP addresses, as held by the kernel, and when their blocks expire (Unix seconds, null if permanent).
+    """
+    return {"blocked": await firewall.list_blocked()}
@@ -1,74 +1,315 @@
 # src/backend/api_gateway/endpoints/logs.py
 
 from fastapi import APIRouter, Depends, Query, HTTPException
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import csv
+import io
+import json
 import logging
 
 from api_gateway.endpoints.auth import get_current_user
-from services.database import influxdb_service
+from core.config import settings
+from services.storage_backend import storage_backend
+from services.log_query import (
+    NetworkLogFilter,
+    GROUPABLE_COLUMNS,
+    encode_cursor,
+    decode_cursor,
+    merge_aggregate_rows,
+    parse_time,
+)
+from services.query_cache import query_cache, split_time_range
 from services.network_capture import network_capture
+from services.pcap_store import pcap_store
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.get("/logs/network", response_model=List[Dict[str, Any]])
-async def get_network_logs(
-    current_user: dict = Depends(get_current_user),
-    limit: int = Query(100, ge=1, le=1000, description="Maximum number of logs to return"),
+def build_log_filter(**params) -> NetworkLogFilter:
+    """Validate query parameters into a NetworkLogFilter, raising 400 on bad input or filters the backend cannot answer."""
+    try:
+        filters = NetworkLogFilter(**{key: value for key, value in params.items() if value is not None})
+    except ValidationError as e:
+        errors = "; ".join(error["msg"] for error in e.errors())
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {errors}")
+    try:
+        storage_backend.check_filter(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+    return filters
+
+
+async def network_log_filter(
     start_time: Optional[str] = Query(None, description="Start time in ISO format (e.g., 2023-10-27T10:00:00Z)"),
     end_time: Optional[str] = Query(None, description="End time in ISO format"),
     protocol: Optional[str] = Query(None, description="Filter by protocol (TCP, UDP, ICMP)"),
     source_ip: Optional[str] = Query(None, description="Filter by source IP address"),
-    dest_ip: Optional[str] = Query(None, description="Filter by destination IP address")
+    dest_ip: Optional[str] = Query(None, description="Filter by destination IP address"),
+    ip: Optional[str] = Query(None, description="Filter by source or destination IP address"),
+    source_port: Optional[int] = Query(None, description="Filter by source port"),
+    dest_port: Optional[int] = Query(None, description="Filter by destination port"),
+    port: Optional[int] = Query(None, description="Filter by source or destination port"),
+    source_cidr: Optional[str] = Query(None, description="Filter by source network (e.g., 10.0.0.0/8)"),
+    dest_cidr: Optional[str] = Query(None, description="Filter by destination network"),
+    cidr: Optional[str] = Query(None, description="Filter by source or destination network"),
+    indicator: Optional[List[str]] = Query(None, description="Require threat indicator(s), e.g. potential_port_scan")
+) -> NetworkLogFilter:
+    """Shared query parameters for filtering network logs."""
+    return build_log_filter(
+        start_time=start_time, end_time=end_time, protocol=protocol,
+        source_ip=source_ip, dest_ip=dest_ip, ip=ip,
+        source_port=source_port, dest_port=dest_port, port=port,
+        source_cidr=source_cidr, dest_cidr=dest_cidr, cidr=cidr,
+        indicators=indicator
+    )
+
+
+def _settle_window() -> timedelta:
+    """How old a range must be before no more writes can land in it while the pipeline is healthy."""
+    seconds = settings.QUERY_CACHE_SETTLE_SECONDS + storage_backend.write_lag_seconds()
+    if settings.STREAMS_ENABLED:
+        # Packets reach storage through the persistence group's blocking reads
+        seconds += settings.STREAM_BLOCK_MS / 1000
+    return timedelta(seconds=seconds)
+
+
+def _cache_plan(filters: NetworkLogFilter) -> List[Tuple[NetworkLogFilter, bool, str]]:
+    """
+    Split filters into time segments, oldest first, as (filter, store, key) parts.
+
+    Cacheable segments are keyed by their range. Uncached parts end at a
+    moving time, so they are keyed by the request's own bounds instead,
+    which lets concurrent identical requests share one query.
+    """
+    parts = split_time_range(
+        filters,
+        datetime.now(timezone.utc),
+        timedelta(seconds=settings.QUERY_CACHE_BUCKET_SECONDS),
+        _settle_window(),
+        timedelta(seconds=settings.QUERY_CACHE_SEGMENT_SECONDS),
+        settings.QUERY_CACHE_MAX_SEGMENTS
+    )
+    # Spooled writes replayed later would change "closed" ranges, however old
+    store = not storage_backend.is_backfilling()
+    plan = []
+    for index, (part, cacheable) in enumerate(parts):
+        if cacheable:
+            key = part.model_dump_json()
+        else:
+            key = json.dumps([index, filters.model_dump_json()])
+        plan.append((part, cacheable and store, key))
+    return plan
+
+
+async def cached_network_logs(filters: NetworkLogFilter, limit: int) -> List[Dict[str, Any]]:
+    """
+    Latest `limit` logs, with closed time segments served from the query cache.
+    
+    Segments are read newest first until `limit` rows are found; rows of a
+    newer segment are always newer than those of an older one, so the
+    concatenation is exact.
+    """
+    if not settings.QUERY_CACHE_ENABLED:
+        return await asyncio.to_thread(storage_backend.query_network_logs, limit=limit, filters=filters)
+    
+    def run(part):
+        return lambda: asyncio.to_thread(storage_backend.query_network_logs, limit=limit, filters=part)
+    
+    logs: List[Dict[str, Any]] = []
+    for part, store, key in reversed(_cache_plan(filters)):
+        logs += await query_cache.get_or_compute(("network", key, limit), run(part), store=store)
+        if len(logs) >= limit:
+            break
+    return logs[:limit]
+
+
+async def cached_aggregate(
+    filters: NetworkLogFilter,
+    group_by: Optional[str] = None,
+    interval: Optional[str] = None,
+    metric: str = "packets",
+    top: Optional[int] = None,
+    exclude_zero: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    aggregate_network_logs with closed time segments served from the query cache.
+    
+    Segments are aggregated without `top`, which is applied after merging:
+    a key just below the cut in every segment can still be in the overall top N.
+    """
+    if not settings.QUERY_CACHE_ENABLED:
+        return await asyncio.to_thread(
+            storage_backend.aggregate_network_logs, filters, group_by, interval, metric, top, exclude_zero
+        )
+    
+    params = (group_by, interval, metric, None, exclude_zero)
+    
+    def run(part):
+        return lambda: asyncio.to_thread(storage_backend.aggregate_network_logs, part, *params)
+    
+    results = await asyncio.gather(*(
+        query_cache.get_or_compute(("aggregate", key, params), run(part), store=store)
+        for part, store, key in _cache_plan(filters)
+    ))
+    return merge_aggregate_rows([row for rows in results for row in rows], interval, top)
+
+
+@router.get("/logs/network", response_model=List[Dict[str, Any]])
+async def get_network_logs(
+    current_user: dict = Depends(get_current_user),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of logs to return"),
+    filters: NetworkLogFilter = Depends(network_log_filter)
 ):
     """
-    Fetch network logs from the InfluxDB time-series database.
+    Fetch network logs from the configured storage backend.
     
-    Supports filtering by time range, protocol, and IP addresses.
+    Supports filtering by time range, protocol, IP addresses, CIDR ranges,
+    ports and threat indicators. All filtering, sorting and limiting happens
+    inside the database, so the newest `limit` matching rows are returned.
+    Results over closed time buckets are cached; identical concurrent
+    requests share one query.
     Authentication required via Firebase token.
     """
     try:
-        # Validate time parameters
-        if start_time:
-            try:
-                datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid start_time format. Use ISO format.")
-        
-        if end_time:
-            try:
-                datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid end_time format. Use ISO format.")
-        
-        # Query the database
-        logs = influxdb_service.query_network_logs(
-            limit=limit,
-            start_time=start_time,
-            end_time=end_time,
-            protocol_filter=protocol
-        )
-        
-        # Apply additional filters (source_ip, dest_ip) if needed
-        if source_ip:
-            logs = [log for log in logs if log.get("source_ip") == source_ip]
-        
-        if dest_ip:
-            logs = [log for log in logs if log.get("dest_ip") == dest_ip]
-        
-        # Re-apply limit after filtering
-        logs = logs[:limit]
+        logs = await cached_network_logs(filters, limit)
         
         logger.info(f"Retrieved {len(logs)} network logs for user {current_user.get('email')}")
         return logs
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving network logs: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve network logs")
 
 
+EXPORT_COLUMNS = ["id", "timestamp", "protocol", "source_ip", "source_port", "dest_ip", "dest_port", "length", "summary"]
+
+
+def export_chunks(
+    filters: NetworkLogFilter,
+    resume_from: Optional[Tuple[datetime, int]],
+    limit: Optional[int],
+    export_format: str
+) -> Iterator[str]:
+    """
+    Render streamed logs as NDJSON or CSV, yielding roughly EXPORT_CHUNK_BYTES at a time.
+    
+    The stream always ends with a trailer stating whether the export is
+    complete and, if not, the cursor to resume from.
+    """
+    buffer = io.StringIO()
+    csv_writer = csv.writer(buffer) if export_format == "csv" else None
+    if csv_writer:
+        csv_writer.writerow(EXPORT_COLUMNS)
+    
+    sent = 0
+    last_time, same_time_count = resume_from or (None, 0)
+    complete = True
+    rows = storage_backend.stream_network_logs(filters, resume_from)
+    try:
+        for log in rows:
+            if limit is not None and sent >= limit:
+                complete = False
+                break
+            if csv_writer:
+                csv_writer.writerow([log.get(column) for column in EXPORT_COLUMNS])
+            else:
+                buffer.write(json.dumps(log) + "\n")
+            sent += 1
+            
+            timestamp = parse_time(log["timestamp"])
+            if timestamp == last_time:
+                same_time_count += 1
+            else:
+                last_time, same_time_count = timestamp, 1
+            
+            if buffer.tell() >= settings.EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        logger.error(f"Network log export interrupted after {sent} rows: {e}")
+        complete = False
+    finally:
+        rows.close()
+    
+    next_cursor = encode_cursor(last_time, same_time_count) if not complete and last_time else None
+    if csv_writer:
+        buffer.write(f"# complete={str(complete).lower()},rows={sent},next_cursor={next_cursor or ''}\n")
+    else:
+        buffer.write(json.dumps({"_export": {"complete": complete, "rows": sent, "next_cursor": next_cursor}}) + "\n")
+    yield buffer.getvalue()
+
+
+@router.get("/logs/network/export")
+async def export_network_logs(
+    current_user: dict = Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format"),
+    cursor: Optional[str] = Query(None, description="Resume cursor from a previous export's trailer"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum rows in this response; omit to export everything"),
+    filters: NetworkLogFilter = Depends(network_log_filter)
+):
+    """
+    Stream matching network logs, oldest first, as NDJSON or CSV.
+    
+    Memory use is constant regardless of result size. The last line is a
+    trailer ({"_export": {...}} for NDJSON, a "# complete=..." comment for
+    CSV) with a `next_cursor` to pass back when the export was cut short by
+    `limit` or an error.
+    """
+    resume_from = None
+    if cursor:
+        try:
+            resume_from = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    logger.info(f"Streaming network log export ({format}) for user {current_user.get('email')}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_chunks(filters, resume_from, limit, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="network-logs.{format}"'}
+    )
+
+
+@router.get("/logs/aggregate")
+async def get_logs_aggregate(
+    current_user: dict = Depends(get_current_user),
+    group_by: Optional[str] = Query(None, description=f"Group by one of: {', '.join(GROUPABLE_COLUMNS)}"),
+    interval: Optional[str] = Query(None, pattern=r"^\d+(s|m|h|d|w)$", description="Window size, e.g. 1m or 1h; omit for totals"),
+    metric: str = Query("packets", pattern="^(packets|bytes)$", description="Count packets or sum bytes"),
+    top: Optional[int] = Query(None, ge=1, le=1000, description="Keep only the N largest groups (totals only)"),
+    filters: NetworkLogFilter = Depends(network_log_filter)
+):
+    """
+    Server-side aggregation of network logs computed by the storage backend.
+    
+    Returns packet or byte counts per group (protocol, IP, port) either as
+    totals or per time window. Long ranges are served from rollups.
+    """
+    if group_by is not None and group_by not in GROUPABLE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUPABLE_COLUMNS)}")
+    try:
+        rows = await cached_aggregate(filters, group_by, interval, metric, top)
+        return {
+            "group_by": group_by,
+            "interval": interval,
+            "metric": metric,
+            "buckets": rows
+        }
+        
+    except Exception as e:
+        logger.error(f"Error aggregating network logs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to aggregate network logs")
+
+
 @router.get("/logs/summary")
 async def get_logs_summary(
     current_user: dict = Depends(get_current_user),
@@ -78,62 +319,44 @@ async def get_logs_summary(
     Get a summary of network activity for the specified time period.
     
     Returns statistics like packet count by protocol, top source/dest IPs, etc.
+    All counts are computed by the storage backend rather than over a sample of rows,
+    from the hourly or per-minute rollups when the period is long enough.
     """
     try:
         # Calculate time range
-        end_time = datetime.now()
+        end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(hours=hours)
+        # A relative range lets the query cache align and share it between requests
+        filters = NetworkLogFilter(start_time=f"-{hours}h")
+        
+        def aggregate(group_by=None, top=None, exclude_zero=False):
+            return cached_aggregate(filters, group_by, None, "packets", top, exclude_zero)
         
-        # Get logs for the time period
-        logs = influxdb_service.query_network_logs(
-            limit=10000,  # Large limit for summary analysis
-            start_time=start_time.isoformat(),
-            end_time=end_time.isoformat()
+        total, protocols, source_ips, dest_ips, ports = await asyncio.gather(
+            aggregate(),
+            aggregate("protocol"),
+            aggregate("source_ip", top=10),
+            aggregate("dest_ip", top=10),
+            aggregate("dest_port", top=10, exclude_zero=True)
         )
         
-        # Calculate summary statistics
+        def as_dict(rows):
+            return {row["key"]: row["value"] for row in rows}
+        
         summary = {
             "time_range": {
                 "start": start_time.isoformat(),
                 "end": end_time.isoformat(),
                 "hours": hours
             },
-            "total_packets": len(logs),
-            "protocols": {},
-            "top_source_ips": {},
-            "top_dest_ips": {},
-            "top_ports": {},
+            "total_packets": total[0]["value"] if total else 0,
+            "protocols": as_dict(protocols),
+            "top_source_ips": as_dict(source_ips),
+            "top_dest_ips": as_dict(dest_ips),
+            "top_ports": as_dict(ports),
             "threat_indicators": {}
         }
         
-        # Analyze logs
-        for log in logs:
-            protocol = log.get("protocol", "unknown")
-            source_ip = log.get("source_ip", "unknown")
-            dest_ip = log.get("dest_ip", "unknown")
-            dest_port = log.get("dest_port", 0)
-            
-            # Count by protocol
-            summary["protocols"][protocol] = summary["protocols"].get(protocol, 0) + 1
-            
-            # Count by source IP
-            summary["top_source_ips"][source_ip] = summary["top_source_ips"].get(source_ip, 0) + 1
-            
-            # Count by destination IP
-            summary["top_dest_ips"][dest_ip] = summary["top_dest_ips"].get(dest_ip, 0) + 1
-            
-            # Count by destination port
-            if dest_port > 0:
-                summary["top_ports"][dest_port] = summary["top_ports"].get(dest_port, 0) + 1
-        
-        # Sort and limit top items
-        summary["top_source_ips"] = dict(sorted(summary["top_source_ips"].items(), 
-                                               key=lambda x: x[1], reverse=True)[:10])
-        summary["top_dest_ips"] = dict(sorted(summary["top_dest_ips"].items(), 
-                                            key=lambda x: x[1], reverse=True)[:10])
-        summary["top_ports"] = dict(sorted(summary["top_ports"].items(), 
-                                         key=lambda x: x[1], reverse=True)[:10])
-        
         return summary
         
     except Exception as e:
@@ -154,6 +377,33 @@ async def get_capture_status(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Failed to get capture status")
 
 
+@router.get("/capture/pcap")
+async def export_pcap(
+    current_user: dict = Depends(get_current_user),
+    bidirectional: bool = Query(True, description="Include the reverse direction of the filtered flow"),
+    max_packets: int = Query(100000, ge=1, le=1000000, description="Stop after this many packets"),
+    filters: NetworkLogFilter = Depends(network_log_filter)
+):
+    """
+    Download stored full packets as a pcap file.
+    
+    Filters by time range (default: the last hour) and any part of the
+    5-tuple. Only segments overlapping the range are read, and a fully
+    specified TCP/UDP 5-tuple is matched through the flow index.
+    """
+    if not settings.PCAP_ENABLED:
+        raise HTTPException(status_code=404, detail="Packet store is disabled")
+    if filters.indicators:
+        raise HTTPException(status_code=400, detail="Threat indicator filters are not supported for pcap exports")
+    
+    logger.info(f"Starting pcap export for user {current_user.get('email')}")
+    return StreamingResponse(
+        pcap_store.export(filters, bidirectional, max_packets),
+        media_type="application/vnd.tcpdump.pcap",
+        headers={"Content-Disposition": 'attachment; filename="capture.pcap"'}
+    )
+
+
 @router.post("/capture/start")
 async def start_capture(
     current_user: dict = Depends(get_current_user),
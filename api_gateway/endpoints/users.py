@@ -1,11 +1,13 @@
 # src/backend/api_gateway/endpoints/users.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel, constr
-from typing import List
+from typing import List, Optional
 from firebase_admin import auth
+import asyncio
 
 from .auth import require_admin, AuthUser
+from services.user_directory import user_directory, user_to_record
 
 router = APIRouter()
 
@@ -14,26 +16,38 @@ class UserRecord(BaseModel):
     email: str | None = None
     role: str
 
+class UserPage(BaseModel):
+    users: List[UserRecord]
+    next_page_token: Optional[str] = None
+
 class RoleAssignmentRequest(BaseModel):
     role: constr(pattern=r"^(admin|analyst|viewer)$") # Ensure role is one of the valid types
 
-@router.get("/users", response_model=List[UserRecord], dependencies=[Depends(require_admin)])
-async def list_all_users():
+@router.get("/users", response_model=UserPage, dependencies=[Depends(require_admin)])
+async def list_all_users(
+    page_size: int = Query(100, ge=1, le=1000),
+    page_token: Optional[str] = Query(None, description="next_page_token of the previous page"),
+    role: Optional[str] = Query(None, pattern=r"^(admin|analyst|viewer)$", description="Only users with this role"),
+    q: Optional[str] = Query(None, min_length=1, max_length=128, description="Substring of the email or UID")
+):
     """
-    Lists all users in the Firebase project.
+    Lists users in the Firebase project, one page at a time.
     Requires admin privileges.
+    
+    Without filters, pages come straight from the Firebase list API. With
+    a role or search term, they come from the server-side user directory
+    cache and its role index. Page tokens only apply to the same query.
     """
     try:
-        users = auth.list_users().iterate_all()
-        user_list = []
-        for user in users:
-            claims = user.custom_claims or {}
-            user_list.append(UserRecord(
-                uid=user.uid,
-                email=user.email,
-                role=claims.get("role", "viewer") # Default to viewer if no role set
-            ))
-        return user_list
+        if role or q:
+            await user_directory.ensure_loaded()
+            records, next_token = user_directory.search(role=role, query=q, page_size=page_size, page_token=page_token)
+        else:
+            page = await asyncio.to_thread(auth.list_users, page_token=page_token, max_results=page_size)
+            records, next_token = [user_to_record(user) for user in page.users], page.next_page_token or None
+        return UserPage(users=records, next_page_token=next_token)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -50,13 +64,10 @@ async def assign_user_role(uid: str, request: RoleAssignmentRequest):
         
         # Retrieve the updated user record to confirm the change
         updated_user = auth.get_user(uid)
-        updated_claims = updated_user.custom_claims or {}
+        record = user_to_record(updated_user)
+        user_directory.update(record["uid"], record["email"], record["role"])
         
-        return UserRecord(
-            uid=updated_user.uid,
-            email=updated_user.email,
-            role=updated_claims.get("role", "viewer")
-        )
+        return UserRecord(**record)
     except auth.UserNotFoundError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     except Exception as e:
@@ -1,65 +1,350 @@
 # src/backend/api_gateway/endpoints/websockets.py
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from collections import deque
+from typing import List, Dict, Any, Awaitable, Callable, Deque, Optional, Tuple, Union
 import json
 import asyncio
 import logging
-from services.message_queue import message_queue
-from api_gateway.endpoints.auth import get_current_user
+import time
+from datetime import datetime, timezone
+from core.config import settings
+from services.codecs import JSON_CODEC, get_codec, detect_codec
+from services.connection_registry import connection_registry
+from services.fanout_hub import fanout_hub
+from services.live_filters import LiveFilter
+from services.live_metrics import live_metrics, flatten_state, diff_states
+from services.log_query import parse_time, resolve_time
+from services.packet_history import PacketHistory
+from services.storage_backend import storage_backend
+from services.token_verifier import verify_id_token
+from api_gateway.endpoints.auth import get_current_user, require_admin
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+SLOW_CLIENT_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Queue placeholder for the summary of coalesced frames
+_SUMMARY = object()
+
+
+class ClientConnection:
+    """
+    A connected WebSocket with its own bounded outbound queue and writer task.
+    
+    Producers never wait on the network: frames are queued and the writer
+    task sends them in order, so a slow client only delays itself. When the
+    queue is full the client's policy decides what happens: "drop_oldest"
+    discards the oldest data frame, "coalesce" folds the queued data frames
+    into one summary frame, and "disconnect" closes the connection. Control
+    frames (those carrying no packets) are never discarded. Discarded
+    history frames are counted separately, so that a frame built when it is
+    sent (a callable payload) can report whether the history arrived whole.
+    
+    State frames (snapshots and deltas of a client-side state, queued with a
+    `resync` function) are collapsed whatever the policy: once the queue is
+    full, every queued state frame is replaced by a single resync frame
+    built when it is sent, and later state frames are discarded until it
+    has been sent, since it already covers them.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_data: dict, codec=JSON_CODEC,
+                 policy: str = "drop_oldest", max_queue: int = 1000):
+        self.websocket = websocket
+        self.user_data = user_data
+        self.codec = codec
+        self.policy = policy
+        self.max_queue = max_queue
+        self.closed = False
+        self.connection_id: Optional[str] = None
+        self._frames: Deque[Tuple[Any, float, Optional[List[Dict[str, Any]]], bool, Optional[Callable[[], Any]]]] = deque()
+        self._resync_queued = False
+        self._summary: Optional[Dict[str, Any]] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_coalesced = 0
+        self.history_dropped = 0
+        self.state_frames_replaced = 0
+        self.max_lag_ms = 0.0
+    
+    def start(self):
+        """Start the writer task."""
+        self._task = asyncio.create_task(self._run())
+    
+    def stop(self):
+        """Stop the writer task and discard queued frames."""
+        self.closed = True
+        self._frames.clear()
+        if self._task:
+            self._task.cancel()
+    
+    def enqueue(
+        self,
+        payload: Union[bytes, str, Callable[[], bytes]],
+        packets: Optional[List[Dict[str, Any]]] = None,
+        history: bool = False,
+        resync: Optional[Callable[[], Any]] = None
+    ) -> bool:
+        """
+        Queue a frame for sending.
+        
+        Args:
+            payload: Encoded frame (bytes in the client's codec, or text), or a
+                function encoding it when it is sent
+            packets: Packets the frame carries; None marks a control frame
+            history: The frame carries history rather than live packets
+            resync: For state frames, builds a frame carrying the full current state
+            
+        Returns:
+            bool: False if the connection is closed or was closed for being too slow
+        """
+        if self.closed:
+            return False
+        if resync is not None and self._resync_queued:
+            self.state_frames_replaced += 1
+            return True
+        if len(self._frames) >= self.max_queue and not self._make_room():
+            return False
+        if resync is not None and self._resync_queued:
+            # Making room collapsed the queued state; this frame is covered by the resync
+            self.state_frames_replaced += 1
+            return True
+        self._frames.append((payload, time.monotonic(), packets, history, resync))
+        self._ready.set()
+        return True
+    
+    def _collapse_state(self) -> bool:
+        """Replace the queued state frames by one resync frame; False if there were none."""
+        kept: Deque = deque()
+        resync = None
+        for frame in self._frames:
+            if frame[4] is None:
+                kept.append(frame)
+                continue
+            if resync is None:
+                resync = frame[4]
+                # The resync frame takes the place of the first state frame it replaces
+                kept.append((resync, frame[1], None, False, resync))
+            self.state_frames_replaced += 1
+        if resync is None:
+            return False
+        self._frames = kept
+        self._resync_queued = True
+        return True
+    
+    def _make_room(self) -> bool:
+        """Apply the slow-client policy to a full queue; False if the client was disconnected."""
+        if self.policy == "disconnect":
+            self.frames_dropped += len(self._frames) + 1
+            logger.warning(f"Disconnecting slow WebSocket client {self.user_data.get('email', 'unknown')}")
+            self.stop()
+            asyncio.create_task(self.websocket.close(code=1013, reason="Client too slow"))
+            return False
+        if self._collapse_state() and len(self._frames) < self.max_queue:
+            return True
+        if self.policy == "coalesce":
+            kept: Deque = deque()
+            for frame in self._frames:
+                if frame[2] is None:
+                    kept.append(frame)
+                    continue
+                if self._summary is None:
+                    # The summary takes the place of the first frame it replaces
+                    kept.append((_SUMMARY, frame[1], None, False, None))
+                self._fold(frame)
+            self._frames = kept
+            return True
+        # drop_oldest: the head is almost always a data frame
+        for index, frame in enumerate(self._frames):
+            if frame[2] is not None:
+                del self._frames[index]
+                self.frames_dropped += 1
+                if frame[3]:
+                    self.history_dropped += 1
+                break
+        return True
+    
+    def _fold(self, frame: Tuple[Any, float, List[Dict[str, Any]], bool]):
+        """Count a discarded data frame into the pending summary."""
+        packets = frame[2]
+        if frame[3]:
+            self.history_dropped += 1
+        if self._summary is None:
+            self._summary = {"frames": 0, "packets": 0, "bytes": 0, "protocols": {}}
+        summary = self._summary
+        summary["frames"] += 1
+        summary["packets"] += len(packets)
+        for packet in packets:
+            summary["bytes"] += packet.get("length", 0) or 0
+            protocol = str(packet.get("protocol", "unknown"))
+            summary["protocols"][protocol] = summary["protocols"].get(protocol, 0) + 1
+        self.frames_coalesced += 1
+    
+    async def _run(self):
+        """Send queued frames in order until stopped or the socket fails."""
+        try:
+            while True:
+                await self._ready.wait()
+                while self._frames:
+                    payload, queued_at, _, _, resync = self._frames.popleft()
+                    if resync is not None and payload is resync:
+                        self._resync_queued = False
+                    if payload is _SUMMARY:
+                        summary, self._summary = self._summary, None
+                        payload = self.codec.encode({"type": "summary", "data": summary})
+                    elif callable(payload):
+                        payload = payload()
+                    await self._send(payload)
+                    self.frames_sent += 1
+                    self.max_lag_ms = max(self.max_lag_ms, (time.monotonic() - queued_at) * 1000)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending WebSocket message: {e}")
+            self.stop()
+    
+    async def _send(self, payload: Union[bytes, str]):
+        if isinstance(payload, str):
+            await self.websocket.send_text(payload)
+        elif self.codec.binary:
+            await self.websocket.send_bytes(payload)
+        else:
+            await self.websocket.send_text(payload.decode())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, lag and drop counters for this client."""
+        oldest = self._frames[0][1] if self._frames else None
+        return {
+            "user": self.user_data.get("email", "unknown"),
+            "connection_id": self.connection_id,
+            "policy": self.policy,
+            "codec": self.codec.name,
+            "queued": len(self._frames),
+            "lag_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_coalesced": self.frames_coalesced,
+            "history_dropped": self.history_dropped,
+            "state_frames_replaced": self.state_frames_replaced,
+        }
+
+
 class ConnectionManager:
     """Manages WebSocket connections for real-time log streaming."""
     
     def __init__(self):
         self.active_connections: List[WebSocket] = []
         self.authenticated_connections: Dict[WebSocket, dict] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
     
-    async def connect(self, websocket: WebSocket, user_data: dict):
-        """Accept a new WebSocket connection and authenticate."""
+    async def connect(self, websocket: WebSocket, user_data: dict, codec=JSON_CODEC, policy: Optional[str] = None):
+        """
+        Accept a new WebSocket connection and authenticate.
+        
+        Args:
+            websocket: WebSocket connection
+            user_data: Decoded token of the authenticated user
+            codec: Codec the client's frames are encoded with
+            policy: Slow-client policy (defaults to WS_SLOW_CLIENT_POLICY)
+        """
         await websocket.accept()
+        if policy not in SLOW_CLIENT_POLICIES:
+            policy = settings.WS_SLOW_CLIENT_POLICY
+        client = ClientConnection(websocket, user_data, codec, policy, settings.WS_SEND_QUEUE_SIZE)
+        client.start()
+        
+        async def deliver(message: Dict[str, Any]):
+            client.enqueue(client.codec.encode({"type": "direct_message", "data": message}))
+        
+        client.connection_id = connection_registry.add(user_data, websocket.url.path, deliver)
+        self.clients[websocket] = client
         self.active_connections.append(websocket)
         self.authenticated_connections[websocket] = user_data
         logger.info(f"WebSocket connected for user: {user_data.get('email', 'unknown')}")
     
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection."""
+        client = self.clients.pop(websocket, None)
+        if client:
+            client.stop()
+            connection_registry.remove(client.connection_id)
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         if websocket in self.authenticated_connections:
             del self.authenticated_connections[websocket]
         logger.info("WebSocket disconnected")
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send a message to a specific WebSocket."""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending WebSocket message: {e}")
-            self.disconnect(websocket)
+    def is_connected(self, websocket: WebSocket) -> bool:
+        """Whether the connection is registered and still writable."""
+        client = self.clients.get(websocket)
+        return client is not None and not client.closed
     
-    async def broadcast(self, message: str):
-        """Broadcast a message to all connected WebSockets."""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to WebSocket: {e}")
-                disconnected.append(connection)
+    async def send_personal_message(
+        self,
+        message: str,
+        websocket: WebSocket,
+        resync: Optional[Callable[[], str]] = None
+    ):
+        """
+        Queue a text message for a specific WebSocket.
+        
+        Args:
+            message: Text frame
+            websocket: Target connection
+            resync: For state frames (snapshots and deltas), builds a full
+                snapshot that replaces them when the client falls behind
+        """
+        client = self.clients.get(websocket)
+        if client:
+            client.enqueue(message, resync=resync)
+    
+    async def send_encoded(
+        self,
+        payload: Union[bytes, Callable[[], bytes]],
+        websocket: WebSocket,
+        packets: Optional[List[Dict[str, Any]]] = None,
+        history: bool = False
+    ):
+        """
+        Queue a frame encoded in the client's codec.
         
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection)
+        Args:
+            payload: Encoded frame, or a function encoding it when it is sent
+            websocket: Target connection
+            packets: Packets the frame carries, for the slow-client policy; None for control frames
+            history: The frame carries history rather than live packets
+        """
+        client = self.clients.get(websocket)
+        if client:
+            client.enqueue(payload, packets, history)
+    
+    async def broadcast(self, message: str):
+        """Queue a message for all connected WebSockets."""
+        for client in list(self.clients.values()):
+            client.enqueue(message)
+    
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """Per-client queue depth, lag and drop counters."""
+        return [client.get_stats() for client in self.clients.values()]
 
 
 # Global connection manager
 manager = ConnectionManager()
 
 
+class TargetedMessage(BaseModel):
+    """A message for one user's connections or for specific connections, on any worker."""
+    uid: Optional[str] = Field(None, description="Send to every connection of this user")
+    connection_ids: List[str] = Field(default_factory=list, description="Send to these connections")
+    message: Dict[str, Any]
+
+
 async def authenticate_websocket(websocket: WebSocket, token: str = None) -> dict:
     """
     Authenticate WebSocket connection using Firebase token.
@@ -80,31 +365,234 @@ async def authenticate_websocket(websocket: WebSocket, token: str = None) -> dic
     
     try:
         # Use the same authentication logic as the REST endpoints
-        from firebase_admin import auth
-        decoded_token = auth.verify_id_token(token, check_revoked=True)
+        decoded_token = await verify_id_token(token)
         return decoded_token
     except Exception as e:
         await websocket.close(code=4003, reason="Invalid authentication token")
         raise HTTPException(status_code=4003, detail="Invalid authentication token")
 
 
+async def forward_in_batches(
+    get: Callable[[], Awaitable[Tuple[Any, List[Dict[str, Any]]]]],
+    send: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+    window: float,
+    max_packets: int
+):
+    """
+    Regroup hub messages into batches of packets.
+    
+    A batch opens with the first packet after the previous one was sent and
+    is sent after `window` seconds, or earlier once it holds `max_packets`.
+    
+    Args:
+        get: Returns the next (payload, packets) hub message
+        send: Sends one batch of packets
+        window: Maximum seconds a packet waits in a batch
+        max_packets: Maximum packets per batch
+    """
+    loop = asyncio.get_running_loop()
+    batch: List[Dict[str, Any]] = []
+    deadline = 0.0
+    while True:
+        try:
+            if batch:
+                _, packets = await asyncio.wait_for(get(), max(0.0, deadline - loop.time()))
+            else:
+                _, packets = await get()
+                deadline = loop.time() + window
+        except asyncio.TimeoutError:
+            await send(batch)
+            batch = []
+            continue
+        batch.extend(packets)
+        while len(batch) >= max_packets:
+            await send(batch[:max_packets])
+            batch = batch[max_packets:]
+            deadline = loop.time() + window
+
+
+class LiveBuffer:
+    """
+    Holds live hub messages while the history before them is being sent.
+    
+    The hub's per-client queue is bounded, so it is drained here while
+    storage is read; otherwise it would fill and drop packets, leaving a gap
+    between the history and the live stream. Past `max_packets` further
+    messages are discarded and `overflowed` is set.
+    """
+    
+    def __init__(self, get: Callable[[], Awaitable[Tuple[Any, List[Dict[str, Any]]]]], max_packets: int):
+        """
+        Args:
+            get: Returns the next (payload, packets) hub message
+            max_packets: Packets held before discarding
+        """
+        self._get = get
+        self.max_packets = max_packets
+        self.overflowed = False
+        self._messages: Deque[Tuple[Any, List[Dict[str, Any]]]] = deque()
+        self._packets = 0
+        self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            payload, packets = await self._get()
+            if self._packets + len(packets) > self.max_packets:
+                self.overflowed = True
+                continue
+            self._messages.append((payload, packets))
+            self._packets += len(packets)
+    
+    async def stop(self):
+        """Stop draining; held messages stay available from get()."""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+    
+    async def get(self) -> Tuple[Any, List[Dict[str, Any]]]:
+        """Held messages first, then the hub's."""
+        if self._messages:
+            return self._messages.popleft()
+        return await self._get()
+
+
+def parse_since(since: str) -> Union[int, datetime]:
+    """
+    Parse the live stream's `since` parameter.
+    
+    Returns:
+        A packet sequence number for digits, otherwise the aware UTC time of
+        an ISO timestamp or relative offset (e.g. "-5m")
+    
+    Raises:
+        ValueError: If `since` is neither
+    """
+    if since.isdigit():
+        return int(since)
+    return resolve_time(since, datetime.now(timezone.utc))
+
+
+def read_history(history: Optional[PacketHistory], since: Union[int, datetime]) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Packets after `since` from the in-memory history.
+    
+    Returns:
+        The packets, oldest first, and whether nothing older is missing
+    """
+    if history is None:
+        return [], False
+    if isinstance(since, int):
+        return history.after_seq(since)
+    return history.after_time(since.timestamp())
+
+
+async def read_stored_history(
+    since: datetime,
+    buffered: List[Dict[str, Any]],
+    limit: int
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Stored packets from `since` up to the oldest buffered one.
+    
+    Args:
+        since: Start of the requested history
+        buffered: Packets the history buffer returned, oldest first
+        limit: Maximum packets read from storage
+    
+    Returns:
+        The packets, oldest first, and whether the range fit within `limit`
+    """
+    # Both bounds as aware UTC; naive packet timestamps are UTC, as storage reads them
+    first = buffered[0].get("timestamp") if buffered else None
+    end = parse_time(first) if first else datetime.now(timezone.utc)
+    rows = await asyncio.to_thread(
+        storage_backend.query_network_logs,
+        limit=limit,
+        start_time=since.astimezone(timezone.utc).isoformat(),
+        end_time=end.isoformat()
+    )
+    rows.reverse()
+    first_seq = buffered[0].get("seq") if buffered else None
+    if first_seq is not None:
+        # Stores that keep the sequence number can overlap the buffer at the boundary
+        rows = [row for row in rows if row.get("seq") is None or row["seq"] < first_seq]
+    return rows, len(rows) < limit
+
+
 @router.websocket("/ws/logs/network")
-async def websocket_network_logs(websocket: WebSocket, token: str = None):
+async def websocket_network_logs(
+    websocket: WebSocket,
+    token: str = None,
+    codec: str = None,
+    passthrough: bool = False,
+    slow_policy: str = None,
+    batch_ms: int = 0,
+    batch_max: int = None,
+    since: str = None
+):
     """
     WebSocket endpoint for real-time network log streaming.
     
     Client should connect with: ws://localhost:8000/api/v1/ws/logs/network?token=<firebase_token>
+    
+    Optional query parameters:
+        codec: "json" (text frames, default) or "msgpack" (binary frames)
+        passthrough: Forward bus payloads without decoding them when the channel
+            uses the same codec. Batch envelopes then arrive as a single
+            "network_log_batch" frame whose data is a list of packets, and
+            frames carry no top-level timestamp.
+        slow_policy: What to do when this client falls WS_SEND_QUEUE_SIZE frames
+            behind: "drop_oldest", "coalesce" (queued packets are replaced by a
+            "summary" frame with counts) or "disconnect"
+        batch_ms: Collect packets for this many milliseconds (clamped to
+            WS_BATCH_MIN_MS..WS_BATCH_MAX_MS) and send them as one
+            "network_log_batch" frame; 0 (default) sends a frame per packet.
+            Batching takes precedence over pass-through.
+        batch_max: Send a batch early once it holds this many packets
+            (defaults to WS_BATCH_MAX_PACKETS)
+        since: Send history before going live: the seq of the last packet the
+            client saw (e.g. after a reconnect), or an ISO timestamp or relative
+            offset such as "-5m". History comes from the process's recent
+            packet buffer, older packets from storage (up to
+            WS_BACKFILL_MAX_PACKETS), as "network_log_history" batches followed
+            by one "history_end" frame; live packets follow without gaps or
+            duplicates. "complete" in "history_end" is false if packets older
+            than what was sent are missing, if the slow-client policy dropped
+            history frames, or if more than WS_BACKFILL_MAX_PACKETS live
+            packets arrived while storage was read ("overflowed" is then
+            true and live packets resume after a gap).
+    
+    Live packets carry a monotonic "seq" the client can resume from.
+    
+    Frames are compressed with permessage-deflate when the client offers it
+    and WS_PER_MESSAGE_DEFLATE is enabled on the server.
+    
+    Clients narrow the stream by sending {"type": "filter", "filter": {...}} with
+    LiveFilter fields (protocol/protocols, ip, source_ip, dest_ip, cidr,
+    source_cidr, dest_cidr, port/ports, source_port, dest_port, indicators,
+    enrichment); an empty filter restores the full stream. Filtered clients
+    never use pass-through.
     """
     try:
         # Authenticate the WebSocket connection
         user_data = await authenticate_websocket(websocket, token)
-        await manager.connect(websocket, user_data)
+        client_codec = get_codec(codec)
+        try:
+            since_point = parse_since(since) if since else None
+        except ValueError:
+            await websocket.close(code=4000, reason=f"Invalid since: {since}")
+            return
+        await manager.connect(websocket, user_data, client_codec, slow_policy)
+        if batch_ms:
+            batch_ms = min(max(batch_ms, settings.WS_BATCH_MIN_MS), settings.WS_BATCH_MAX_MS)
+        batch_max = max(1, batch_max or settings.WS_BATCH_MAX_PACKETS)
         
         # Send initial connection confirmation
-        await manager.send_personal_message(
-            json.dumps({
+        await manager.send_encoded(
+            client_codec.encode({
                 "type": "connection",
                 "status": "connected",
+                "codec": client_codec.name,
+                "batch_ms": batch_ms,
                 "message": f"Welcome to Zizo_NetVerse live stream, {user_data.get('email', 'Agent')}"
             }),
             websocket
@@ -113,17 +601,78 @@ async def websocket_network_logs(websocket: WebSocket, token: str = None):
         # Set up Redis subscription for real-time packet data
         async def packet_handler(packet_data: Dict[str, Any]):
             """Handle incoming packet data from Redis and forward to WebSocket."""
-            message = json.dumps({
+            message = client_codec.encode({
                 "type": "network_log",
                 "data": packet_data,
                 "timestamp": packet_data.get("timestamp")
             })
-            await manager.send_personal_message(message, websocket)
+            await manager.send_encoded(message, websocket, [packet_data])
         
-        # Subscribe to the network packets channel
-        subscription_task = asyncio.create_task(
-            message_queue.subscribe_to_channel("network_packets", packet_handler)
-        )
+        async def passthrough_handler(payload: bytes, packets: List[Dict[str, Any]]):
+            """Splice an encoded bus payload into the outgoing frame without decoding it."""
+            items = client_codec.envelope_items(payload)
+            if items is not None:
+                fields = {"type": client_codec.encode("network_log_batch"), "data": items}
+            else:
+                fields = {"type": client_codec.encode("network_log"), "data": payload}
+            await manager.send_encoded(client_codec.map(fields), websocket, packets)
+        
+        async def send_batch(packets: List[Dict[str, Any]]):
+            """Encode a window's packets once, as a single frame."""
+            message = client_codec.encode({"type": "network_log_batch", "data": packets, "count": len(packets)})
+            await manager.send_encoded(message, websocket, packets)
+        
+        async def forward_packets():
+            """Forward messages the shared hub subscription queues for this client."""
+            while True:
+                payload, packets = await next_message()
+                if passthrough and payload is not None and detect_codec(payload) is client_codec:
+                    await passthrough_handler(payload, packets)
+                    continue
+                for packet_data in packets:
+                    await packet_handler(packet_data)
+        
+        # Register with the process-wide hub instead of opening a Redis subscription per client.
+        # Reading the history in the same step (no await) splits it exactly from the live queue.
+        subscription = fanout_hub.register("network_packets")
+        next_message = subscription.get
+        if since_point is not None:
+            history, complete = read_history(fanout_hub.history("network_packets"), since_point)
+            live = LiveBuffer(subscription.get, settings.WS_BACKFILL_MAX_PACKETS)
+            try:
+                if not complete and isinstance(since_point, datetime):
+                    stored, complete = await read_stored_history(since_point, history, settings.WS_BACKFILL_MAX_PACKETS)
+                    history = stored + history
+            finally:
+                await live.stop()
+            next_message = live.get
+            for start in range(0, len(history), batch_max):
+                packets = history[start:start + batch_max]
+                await manager.send_encoded(
+                    client_codec.encode({"type": "network_log_history", "data": packets, "count": len(packets)}),
+                    websocket,
+                    packets,
+                    history=True
+                )
+            client = manager.clients.get(websocket)
+            
+            def history_end() -> bytes:
+                # Encoded when sent, after every history frame was sent or dropped
+                return client_codec.encode({
+                    "type": "history_end",
+                    "count": len(history),
+                    "complete": complete and not live.overflowed and not (client and client.history_dropped),
+                    "overflowed": live.overflowed,
+                    "last_seq": history[-1].get("seq") if history else None
+                })
+            
+            await manager.send_encoded(history_end, websocket)
+        
+        if batch_ms:
+            forwarder = forward_in_batches(next_message, send_batch, batch_ms / 1000, batch_max)
+        else:
+            forwarder = forward_packets()
+        subscription_task = asyncio.create_task(forwarder)
         
         # Keep the connection alive and handle client messages
         try:
@@ -133,16 +682,26 @@ async def websocket_network_logs(websocket: WebSocket, token: str = None):
                 client_message = json.loads(data)
                 
                 if client_message.get("type") == "ping":
-                    await manager.send_personal_message(
-                        json.dumps({"type": "pong", "timestamp": client_message.get("timestamp")}),
+                    await manager.send_encoded(
+                        client_codec.encode({"type": "pong", "timestamp": client_message.get("timestamp")}),
                         websocket
                     )
                 elif client_message.get("type") == "filter":
-                    # Handle filter requests (future enhancement)
-                    await manager.send_personal_message(
-                        json.dumps({
+                    # Compiled once here; the hub only sends this client matching packets
+                    try:
+                        expression = client_message.get("filter")
+                        live_filter = LiveFilter(**expression) if expression else None
+                    except (TypeError, ValidationError) as e:
+                        await manager.send_encoded(
+                            client_codec.encode({"type": "filter_error", "message": str(e)}),
+                            websocket
+                        )
+                        continue
+                    fanout_hub.set_filter(subscription, live_filter)
+                    await manager.send_encoded(
+                        client_codec.encode({
                             "type": "filter_ack",
-                            "message": "Filter settings received (not yet implemented)"
+                            "filter": live_filter.model_dump(exclude_defaults=True) if live_filter else None
                         }),
                         websocket
                     )
@@ -150,8 +709,9 @@ async def websocket_network_logs(websocket: WebSocket, token: str = None):
         except WebSocketDisconnect:
             logger.info("WebSocket client disconnected")
         finally:
-            # Cancel the subscription task
+            # Cancel the forwarding task and leave the hub
             subscription_task.cancel()
+            fanout_hub.unregister(subscription)
             manager.disconnect(websocket)
             
     except Exception as e:
@@ -166,6 +726,12 @@ async def websocket_system_status(websocket: WebSocket, token: str = None):
     WebSocket endpoint for real-time system status updates.
     
     Provides capture statistics, system health, and other operational data.
+    The first "system_status" frame carries the full status flattened into
+    "a/b/c" paths; after that, every WS_STATUS_INTERVAL_SECONDS a
+    "system_status_delta" frame carries only the changed ("set") and removed
+    ("unset") paths, and nothing is sent when nothing changed. A client that
+    falls behind gets a fresh "system_status" frame instead of the deltas it
+    could not keep up with.
     """
     try:
         user_data = await authenticate_websocket(websocket, token)
@@ -173,19 +739,34 @@ async def websocket_system_status(websocket: WebSocket, token: str = None):
         
         from services.network_capture import network_capture
         
-        while True:
-            # Send system status every 5 seconds
-            status_data = {
+        previous: Dict[str, Any] = {}
+        
+        def status_snapshot() -> str:
+            # Built when sent, from the latest state the deltas queued after it are relative to
+            return json.dumps({
                 "type": "system_status",
-                "data": {
-                    "capture_stats": network_capture.get_capture_stats(),
-                    "timestamp": asyncio.get_event_loop().time(),
-                    "active_connections": len(manager.active_connections)
-                }
-            }
-            
-            await manager.send_personal_message(json.dumps(status_data), websocket)
-            await asyncio.sleep(5)
+                "data": previous,
+                "timestamp": asyncio.get_event_loop().time()
+            })
+        
+        while manager.is_connected(websocket):
+            current = flatten_state({
+                "capture_stats": network_capture.get_capture_stats(),
+                "active_connections": len(manager.active_connections),
+                "cluster_connections": await connection_registry.count(),
+                "live_fanout": fanout_hub.get_stats(),
+                "clients": {str(index): stats for index, stats in enumerate(manager.get_client_stats())}
+            })
+            if not previous:
+                message = {"type": "system_status", "data": current}
+            else:
+                message = {"type": "system_status_delta", **diff_states(previous, current)}
+            if not previous or message["set"] or message["unset"]:
+                message["timestamp"] = asyncio.get_event_loop().time()
+                await manager.send_personal_message(json.dumps(message), websocket, resync=status_snapshot)
+            previous = current
+            await asyncio.sleep(settings.WS_STATUS_INTERVAL_SECONDS)
+        manager.disconnect(websocket)
             
     except WebSocketDisconnect:
         logger.info("System status WebSocket disconnected")
@@ -194,3 +775,91 @@ async def websocket_system_status(websocket: WebSocket, token: str = None):
         logger.error(f"System status WebSocket error: {e}")
         if websocket in manager.active_connections:
             manager.disconnect(websocket)
+
+
+@router.websocket("/ws/metrics")
+async def websocket_metrics(websocket: WebSocket, token: str = None):
+    """
+    WebSocket endpoint for server-computed live traffic metrics.
+    
+    Sends a "metrics_snapshot" frame with the full state, then once per second a
+    "metrics_delta" frame with the changed ("set") and removed ("unset") paths;
+    apply "unset" before "set". State paths look like "1s/packets_per_sec/TCP"
+    or "10s/top_talkers/10.0.0.5" and cover packets and bytes per second by
+    protocol, totals, top talkers and threat indicator counts. Each frame has a
+    "seq"; a snapshot is resent whenever this client missed deltas, or fell
+    too far behind in sending them.
+    """
+    listener_id = None
+    try:
+        user_data = await authenticate_websocket(websocket, token)
+        await manager.connect(websocket, user_data)
+        listener_id, updates = live_metrics.register()
+        snapshot_seq = live_metrics.seq
+        
+        def metrics_snapshot() -> str:
+            # Built when sent; deltas up to its seq are then skipped
+            nonlocal snapshot_seq
+            snapshot_seq = live_metrics.seq
+            return json.dumps({"type": "metrics_snapshot", "seq": snapshot_seq, "data": live_metrics.state})
+        
+        await manager.send_personal_message(metrics_snapshot(), websocket, resync=metrics_snapshot)
+        
+        async def push_updates():
+            while True:
+                seq, delta = await updates.get()
+                if seq <= snapshot_seq:
+                    continue
+                if delta is None:
+                    message = metrics_snapshot()
+                else:
+                    message = json.dumps({"type": "metrics_delta", "seq": seq, **delta})
+                await manager.send_personal_message(message, websocket, resync=metrics_snapshot)
+        
+        push_task = asyncio.create_task(push_updates())
+        try:
+            # Nothing is expected from the client; reading notices the disconnect
+            while True:
+                await websocket.receive_text()
+        finally:
+            push_task.cancel()
+            
+    except WebSocketDisconnect:
+        logger.info("Metrics WebSocket disconnected")
+        manager.disconnect(websocket)
+    except Exception as e:
+        logger.error(f"Metrics WebSocket error: {e}")
+        if websocket in manager.active_connections:
+            manager.disconnect(websocket)
+    finally:
+        if listener_id is not None:
+            live_metrics.unregister(listener_id)
+
+
+@router.get("/ws/connections", dependencies=[Depends(require_admin)])
+async def get_connection_counts():
+    """
+    Live WebSocket connection counts across every worker.
+    
+    Returns:
+        {"total": n, "workers": {worker_id: n}}
+    """
+    return await connection_registry.count()
+
+
+@router.post("/ws/messages", dependencies=[Depends(require_admin)])
+async def send_targeted_message(request: TargetedMessage):
+    """
+    Send a "direct_message" frame to a user's or specific connections on whichever worker holds them.
+    
+    Returns:
+        Number of connections the message was routed to
+    """
+    if not request.uid and not request.connection_ids:
+        raise HTTPException(status_code=400, detail="Either uid or connection_ids is required")
+    routed = 0
+    if request.uid:
+        routed += await connection_registry.send_to_user(request.uid, request.message)
+    if request.connection_ids:
+        routed += await connection_registry.send_to_connections(request.connection_ids, request.message)
+    return {"routed": routed}
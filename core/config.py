@@ -3,6 +3,7 @@
 from pydantic_settings import BaseSettings
 from typing import List, Optional
 import os
+import socket
 
 
 class Settings(BaseSettings):
@@ -15,20 +16,158 @@ class Settings(BaseSettings):
     FIREBASE_PROJECT_ID: Optional[str] = None
     # New variable for cloud environments to hold the entire JSON content
     FIREBASE_SERVICE_ACCOUNT_JSON: Optional[str] = None
+    # ID tokens are verified locally and cached until expiry; revocation is checked in the background
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_REVOCATION_CHECK_SECONDS: int = 60
+    # Cached user directory behind role/search queries on /users; reloaded in the background when older
+    USER_DIRECTORY_TTL_SECONDS: int = 300
+    # API rate limits (GCRA): "<route>[:<role>]=<requests>/<period>", role entries override the route's;
+    # "auto" shares limits through Redis when it is reachable, "memory" keeps them per process
+    RATE_LIMIT_POLICIES: str = "control=5/10s,proxy=5/10s"
+    RATE_LIMIT_BACKEND: str = "auto"
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = 100000
+    
+    # Network log storage: "influxdb" or the embedded "sqlite" backend
+    STORAGE_BACKEND: str = "influxdb"
+    SQLITE_PATH: str = "data/netverse.db"
+    SQLITE_PARTITION_HOURS: int = 24
+    SQLITE_RETENTION_DAYS: int = 30  # 0 keeps every partition
     
     # InfluxDB Configuration
     INFLUXDB_URL: str = "http://localhost:8086"
     INFLUXDB_TOKEN: str = "your-influxdb-token-here"
     INFLUXDB_ORG: str = "zizo-netverse"
     INFLUXDB_BUCKET: str = "network-logs"
+    # "compact": bounded tags (protocol, direction, sensor), IPs as fields, enrichment once per IP
+    # "legacy": IPs as tags plus the full packet as a raw_data JSON field
+    INFLUXDB_SCHEMA: str = "compact"
+    SENSOR_ID: str = socket.gethostname()
+    ENRICHMENT_REFRESH_SECONDS: int = 86400
+    ENRICHMENT_CACHE_SIZE: int = 100000
+    
+    # InfluxDB Batched Writer
+    INFLUXDB_BATCH_SIZE: int = 5000
+    INFLUXDB_FLUSH_INTERVAL_MS: int = 1000
+    INFLUXDB_WRITE_QUEUE_SIZE: int = 100000
+    INFLUXDB_MAX_RETRIES: int = 5
+    INFLUXDB_RETRY_BACKOFF_MS: int = 200
+    INFLUXDB_GZIP: bool = True
+    
+    # Streaming export: time window per InfluxDB query and bytes per response chunk
+    EXPORT_WINDOW_SECONDS: int = 900
+    EXPORT_CHUNK_BYTES: int = 64 * 1024
     
+    # Write-ahead spool used while InfluxDB is slow or down
+    SPOOL_ENABLED: bool = True
+    SPOOL_DIR: str = "spool/influxdb"
+    SPOOL_SEGMENT_BYTES: int = 16 * 1024 * 1024
+    SPOOL_MAX_BYTES: int = 1024 * 1024 * 1024
+    SPOOL_REPLAY_BATCH_SIZE: int = 10000
+    SPOOL_REPLAY_INTERVAL_MS: int = 5000
+
+    # Downsampled rollup tiers (written by the engine) and per-tier retention
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_1M_BUCKET: str = "network-logs-1m"
+    ROLLUP_1H_BUCKET: str = "network-logs-1h"
+    ROLLUP_TOP_KEYS: int = 50
+    ROLLUP_FLUSH_INTERVAL_SECONDS: int = 5
+    RAW_RETENTION_DAYS: int = 0  # 0 leaves the raw bucket's retention unchanged
+    ROLLUP_1M_RETENTION_DAYS: int = 30
+    ROLLUP_1H_RETENTION_DAYS: int = 400
+
+    # Query result cache: results over closed, segment-aligned time ranges are kept until evicted.
+    # A range is closed once it is older than the write pipeline's worst-case lag (stream read,
+    # writer flush and retries) plus QUERY_CACHE_SETTLE_SECONDS; nothing is stored while spooling.
+    # Segments are QUERY_CACHE_SEGMENT_SECONDS wide, doubled until a range spans at most
+    # QUERY_CACHE_MAX_SEGMENTS (wide segments still read from the rollup tiers)
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_BUCKET_SECONDS: int = 60
+    QUERY_CACHE_SETTLE_SECONDS: int = 10
+    QUERY_CACHE_SEGMENT_SECONDS: int = 3600
+    QUERY_CACHE_MAX_SEGMENTS: int = 12
+    QUERY_CACHE_MAX_ROWS: int = 200000
+
     # Redis Configuration
     REDIS_URL: str = "redis://localhost:6379"
     
+    # Message bus transport: "redis", "memory" (in-process, single node) or "auto"
+    # ("auto" uses the in-process bus while Redis is unreachable)
+    MESSAGE_BUS: str = "auto"
+    BUS_HEALTHCHECK_SECONDS: int = 5
+    MEMORY_BUS_QUEUE_SIZE: int = 10000
+    
+    # Pub/sub publishing: messages linger briefly and go out as one pipelined batch
+    # "envelope" packs each channel's batch into one message, "pipeline" keeps one PUBLISH each.
+    # Envelopes are only used on ENVELOPE_CHANNELS (comma-separated), whose subscribers unpack them;
+    # every other channel (e.g. security_alerts, read by external consumers) keeps one message per PUBLISH
+    PUBLISH_BATCHING_ENABLED: bool = True
+    PUBLISH_MODE: str = "envelope"
+    ENVELOPE_CHANNELS: str = "network_packets"
+    PUBLISH_LINGER_MS: float = 5
+    PUBLISH_MAX_BATCH: int = 500
+    PUBLISH_QUEUE_SIZE: int = 50000
+    # Per-channel bus codec, e.g. "network_packets=msgpack"; unlisted channels use json
+    CHANNEL_CODECS: str = ""
+    
+    # Redis Streams transport (consumer groups), alongside pub/sub for live views
+    STREAMS_ENABLED: bool = True
+    PACKET_STREAM: str = "stream:network_packets"
+    STREAM_MAXLEN: int = 1000000
+    STREAM_READ_COUNT: int = 500
+    STREAM_BLOCK_MS: int = 1000
+    STREAM_CLAIM_IDLE_MS: int = 60000
+    STREAM_CONSUMER_NAME: str = socket.gethostname()
+    STREAM_PERSISTENCE_GROUP: str = "persistence"
+    STREAM_ALERTING_GROUP: str = "alerting"
+    # Entry ID both groups resume after on startup; applied once per deployment
+    # (recorded under stream:replayed:<stream>:<group> - delete it to replay the same ID again)
+    STREAM_REPLAY_FROM: Optional[str] = None
+    
+    # Live WebSocket fan-out: messages queued per client before drops
+    WS_CLIENT_QUEUE_SIZE: int = 1000
+    # Outbound frames queued per WebSocket client, and what to do when a client falls that far behind:
+    # "drop_oldest", "coalesce" (summarize the queued packets) or "disconnect"
+    WS_SEND_QUEUE_SIZE: int = 1000
+    WS_SLOW_CLIENT_POLICY: str = "drop_oldest"
+    # Batched live frames (?batch_ms=) and permessage-deflate (uvicorn --ws-per-message-deflate)
+    WS_BATCH_MIN_MS: int = 50
+    WS_BATCH_MAX_MS: int = 1000
+    WS_BATCH_MAX_PACKETS: int = 500
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    # Server-computed live metrics (/ws/metrics) and status push interval
+    LIVE_METRICS_TOP_TALKERS: int = 10
+    LIVE_METRICS_LISTENER_QUEUE: int = 30
+    WS_STATUS_INTERVAL_SECONDS: int = 5
+    # Live stream backfill (?since=): packets kept in memory per process, and the most read from storage
+    WS_HISTORY_SIZE: int = 10000
+    WS_BACKFILL_MAX_PACKETS: int = 5000
+    # Worker processes for `python main.py` (0 = one per core). With more than one, the connection
+    # registry, counts and targeted messages go through Redis and only one worker captures packets.
+    WS_WORKERS: int = 1
+    WS_REGISTRY_HEARTBEAT_SECONDS: int = 5
+    
     # Network Capture Configuration
     NETWORK_INTERFACE: str = "eth0"
     CAPTURE_ENABLED: bool = True
     
+    # Rolling full-packet store for retrospective pcap export
+    PCAP_ENABLED: bool = True
+    PCAP_DIR: str = "pcap"
+    PCAP_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    PCAP_SEGMENT_SECONDS: int = 300
+    PCAP_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+    PCAP_MAX_AGE_HOURS: int = 24
+    PCAP_QUEUE_SIZE: int = 50000
+    PCAP_SNAPLEN: int = 65535
+    
+    # Blocklist firewall: nftables sets in "inet <FIREWALL_TABLE>"; dry-run only renders the scripts.
+    # FIREWALL_DEFAULT_TTL_SECONDS applies to blocks without a TTL (0 = permanent).
+    FIREWALL_TABLE: str = "netverse"
+    FIREWALL_USE_SUDO: bool = True
+    FIREWALL_DRY_RUN: bool = False
+    FIREWALL_DEFAULT_TTL_SECONDS: int = 0
+    
     # CORS Origins (comma-separated string)
     BACKEND_CORS_ORIGINS: str = "http://localhost:3000,http://localhost:9002"
     
@@ -18,8 +18,18 @@ from api_gateway.endpoints import (
 )
 from core.config import settings
 from services import firebase_admin
+from services.storage_backend import storage_backend
 from services.message_queue import message_queue
 from services.network_capture import network_capture
+from services.pcap_store import pcap_store
+from services.query_cache import query_cache
+from services.fanout_hub import fanout_hub
+from services.live_metrics import live_metrics
+from services.connection_registry import connection_registry
+from services.token_verifier import token_verifier
+from services.rate_limiter import rate_limiter
+from services.firewall import firewall
+from services.stream_consumers import start_stream_consumers
 from starlette.middleware.cors import CORSMiddleware
 import asyncio
 import logging
@@ -38,13 +48,42 @@ async def lifespan(app: FastAPI):
     """
     # Startup
     logger.info("🔥 Starting Zizo_NetVerse Backend Engine...")
+    stream_consumers = []
     try:
         await message_queue.initialize()
         logger.info("✅ Message queue initialized")
         
-        if settings.CAPTURE_ENABLED:
+        await asyncio.to_thread(storage_backend.prepare)
+        asyncio.create_task(storage_backend.run_maintenance())
+        logger.info(f"✅ Storage backend ({settings.STORAGE_BACKEND}) prepared")
+        
+        if settings.STREAMS_ENABLED and message_queue.is_available():
+            stream_consumers = start_stream_consumers()
+            logger.info(f"✅ Stream consumer groups started on {settings.PACKET_STREAM}")
+        
+        if settings.WS_HISTORY_SIZE > 0:
+            # Record recent packets from startup so live clients can backfill (?since=)
+            fanout_hub.enable_history("network_packets", settings.WS_HISTORY_SIZE)
+        
+        await connection_registry.start()
+        token_verifier.start()
+        if settings.WS_WORKERS != 1 and not message_queue.redis_client:
+            logger.warning("⚠️ Several workers without Redis: each worker only sees its own connections and packets")
+        
+        def start_capture():
             logger.info("🎯 Starting packet capture service...")
             asyncio.create_task(network_capture.start_capture())
+        
+        # Every worker runs this lifespan; one capture per cluster (or per host
+        # without Redis) is enough. The others retry the lock on each registry
+        # heartbeat and take over when the capturing worker dies; a worker that
+        # finds its lock taken over stops capturing.
+        if settings.CAPTURE_ENABLED and settings.WS_WORKERS != 1 and not await connection_registry.acquire_lock(
+            "capture", on_acquired=start_capture, on_lost=network_capture.stop_capture
+        ):
+            logger.info("📊 Packet capture runs in another worker.")
+        elif settings.CAPTURE_ENABLED:
+            start_capture()
         else:
             logger.info("📊 Packet capture disabled in configuration.")
             
@@ -61,7 +100,16 @@ async def lifespan(app: FastAPI):
     try:
         if network_capture.is_capturing:
             network_capture.stop_capture()
+        for task in stream_consumers:
+            task.cancel()
+        await asyncio.gather(*stream_consumers, return_exceptions=True)
+        await live_metrics.close()
+        await connection_registry.close()
+        await token_verifier.close()
+        await fanout_hub.close()
         await message_queue.close()
+        await asyncio.to_thread(storage_backend.close)
+        await asyncio.to_thread(pcap_store.close)
         logger.info("✅ Clean shutdown completed")
     except Exception as e:
         logger.error(f"❌ Error during shutdown: {e}")
@@ -99,13 +147,29 @@ async def read_root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint for monitoring."""
+    write_stats = storage_backend.get_write_stats()
+    database_status = "ready" if storage_backend.is_ready() else "unavailable"
+    if write_stats.get("degraded"):
+        database_status = "degraded"
     return {
         "status": "healthy",
         "services": {
             "firebase": "connected" if firebase_admin._apps else "disconnected",
             "capture": "ready" if network_capture else "unavailable",
-            "message_queue": "ready" if message_queue.redis_client else "unavailable"
-        }
+            "message_queue": message_queue.backend,
+            "database": database_status,
+            "spool": write_stats.get("spool") or "disabled"
+        },
+        "write_pipeline": write_stats,
+        "publisher": message_queue.get_publish_stats(),
+        "memory_bus": message_queue.memory_bus.get_stats() if message_queue.memory_active else "inactive",
+        "streams": await message_queue.get_stream_stats(settings.PACKET_STREAM) if settings.STREAMS_ENABLED else "disabled",
+        "query_cache": query_cache.get_stats(),
+        "live_fanout": fanout_hub.get_stats(),
+        "connections": connection_registry.get_stats(),
+        "auth_cache": token_verifier.get_stats(),
+        "rate_limits": rate_limiter.get_stats(),
+        "firewall": firewall.get_stats()
     }
 
 
@@ -125,11 +189,16 @@ app.include_router(users.router, prefix=settings.API_V1_STR, tags=["User Managem
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
+    workers = settings.WS_WORKERS or os.cpu_count() or 1
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        # uvicorn cannot reload with several workers
+        reload=workers == 1,
+        workers=workers,
+        log_level="info",
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
     )
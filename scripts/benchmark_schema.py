@@ -0,0 +1,112 @@
+# src/backend/scripts/benchmark_schema.py
+
+import sys
+import os
+import gzip
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Add the project root to the Python path to allow importing from 'services'
+# This assumes the script is run from the `src/backend` directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.line_protocol import (
+    encode_network_log,
+    encode_compact_network_log,
+    encode_ip_enrichment,
+)
+
+SENSOR = "sensor-bench"
+
+
+def make_enrichment(ip: str) -> dict:
+    """A typical enrichment blob as produced by DataEnrichmentService."""
+    return {
+        "geoip": {"country": "US", "region": "California", "city": "Mountain View", "org": "AS15169 Google LLC", "asn": None},
+        "asn_org": "AS15169 Google LLC",
+        "reverse_dns": f"host-{ip.replace('.', '-')}.example.net",
+        "tor_exit_node": False,
+    }
+
+
+def generate_packets(count: int, external_hosts: int, seed: int = 42):
+    """Generate synthetic packets between a small LAN and many public hosts."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    lan = [f"192.168.1.{i}" for i in range(1, 51)]
+    public = [f"{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+              for _ in range(external_hosts)]
+    for i in range(count):
+        source, dest = rng.choice(lan), rng.choice(public)
+        if rng.random() < 0.5:
+            source, dest = dest, source
+        protocol = rng.choice(["TCP", "TCP", "TCP", "UDP", "ICMP"])
+        yield {
+            "id": f"pkt-{i}",
+            "timestamp": (start + timedelta(microseconds=i * 250)).isoformat(),
+            "length": rng.randint(60, 1500),
+            "summary": f"IP / {protocol} {source} > {dest}",
+            "protocol": protocol,
+            "source_ip": source,
+            "source_port": rng.randint(1024, 65535),
+            "dest_ip": dest,
+            "dest_port": rng.choice([53, 80, 443, 8080, 22]),
+            "flags": ["SYN"] if protocol == "TCP" else [],
+            "raw_data": "<repr of the packet>" * 10,
+            "source_ip_enrichment": make_enrichment(source),
+            "dest_ip_enrichment": make_enrichment(dest),
+            "threat_indicators": [],
+        }
+
+
+def series_key(line: str) -> str:
+    """The series key is everything before the first unescaped space."""
+    index = 0
+    while True:
+        index = line.index(" ", index)
+        if line[index - 1] != "\\":
+            return line[:index]
+        index += 1
+
+
+def run(count: int, external_hosts: int):
+    legacy_lines, compact_lines = [], []
+    enriched = set()
+    timestamp = 0
+    for packet in generate_packets(count, external_hosts):
+        legacy_lines.append(encode_network_log(packet))
+        for ip_key in ("source_ip", "dest_ip"):
+            ip = packet[ip_key]
+            if ip not in enriched:
+                enriched.add(ip)
+                timestamp += 1
+                compact_lines.append(encode_ip_enrichment(ip, packet[f"{ip_key}_enrichment"], SENSOR, timestamp))
+        compact_lines.append(encode_compact_network_log(packet, SENSOR))
+
+    results = {}
+    for name, lines in (("legacy", legacy_lines), ("compact", compact_lines)):
+        payload = "\n".join(lines).encode("utf-8")
+        results[name] = {
+            "bytes": len(payload),
+            "gzip_bytes": len(gzip.compress(payload)),
+            "series": len({series_key(line) for line in lines}),
+        }
+
+    print(f"{count} packets, {external_hosts} external hosts\n")
+    print(f"{'schema':<10}{'bytes':>14}{'bytes/pkt':>12}{'gzip bytes':>14}{'series':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['bytes']:>14}{result['bytes'] / count:>12.1f}"
+              f"{result['gzip_bytes']:>14}{result['series']:>10}")
+    legacy, compact = results["legacy"], results["compact"]
+    print(f"\nWrite size reduction: {100 * (1 - compact['bytes'] / legacy['bytes']):.1f}% "
+          f"(gzip: {100 * (1 - compact['gzip_bytes'] / legacy['gzip_bytes']):.1f}%)")
+    print(f"Series count: {legacy['series']} -> {compact['series']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare legacy and compact InfluxDB schemas")
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--hosts", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.packets, args.hosts)
@@ -0,0 +1,167 @@
+# src/backend/scripts/benchmark_storage.py
+
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+# Add the project root to the Python path to allow importing from 'services'
+# This assumes the script is run from the `src/backend` directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import settings
+from services.log_query import NetworkLogFilter
+
+
+def generate_packets(count: int, external_hosts: int, span: timedelta, seed: int = 42):
+    """Generate synthetic packets spread evenly over the `span` ending now."""
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - span
+    step = span / count
+    lan = [f"192.168.1.{i}" for i in range(1, 51)]
+    public = [f"{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+              for _ in range(external_hosts)]
+    for i in range(count):
+        source, dest = rng.choice(lan), rng.choice(public)
+        if rng.random() < 0.5:
+            source, dest = dest, source
+        protocol = rng.choice(["TCP", "TCP", "TCP", "UDP", "ICMP"])
+        yield {
+            "timestamp": (start + i * step).isoformat(),
+            "length": rng.randint(60, 1500),
+            "summary": f"IP / {protocol} {source} > {dest}",
+            "protocol": protocol,
+            "source_ip": source,
+            "source_port": rng.randint(1024, 65535),
+            "dest_ip": dest,
+            "dest_port": rng.choice([53, 80, 443, 8080, 22]),
+            "flags": ["SYN"] if protocol == "TCP" else [],
+            "threat_indicators": ["port_scan"] if rng.random() < 0.01 else [],
+        }
+
+
+@contextmanager
+def temporary_influxdb_buckets():
+    """
+    Point the InfluxDB settings at throwaway raw and rollup buckets, deleted afterwards.
+
+    Must run before services.database is imported, so that no writer is
+    ever bound to the production buckets (or their spool).
+    """
+    from influxdb_client import InfluxDBClient
+
+    suffix = uuid.uuid4().hex[:8]
+    names = {
+        "INFLUXDB_BUCKET": f"benchmark-{suffix}",
+        "ROLLUP_1M_BUCKET": f"benchmark-{suffix}-1m",
+        "ROLLUP_1H_BUCKET": f"benchmark-{suffix}-1h",
+    }
+    client = InfluxDBClient(url=settings.INFLUXDB_URL, token=settings.INFLUXDB_TOKEN, org=settings.INFLUXDB_ORG)
+    buckets_api = client.buckets_api()
+    created = []
+    try:
+        for name in names.values():
+            created.append(buckets_api.create_bucket(bucket_name=name, org=settings.INFLUXDB_ORG))
+        for setting, name in names.items():
+            setattr(settings, setting, name)
+        settings.SPOOL_ENABLED = False
+        yield names["INFLUXDB_BUCKET"]
+    finally:
+        for bucket in created:
+            try:
+                buckets_api.delete_bucket(bucket)
+            except Exception as e:
+                print(f"Failed to delete benchmark bucket {bucket.name}: {e}")
+        client.close()
+
+
+def create_backend(name: str, directory: str):
+    if name == "sqlite":
+        from services.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(os.path.join(directory, "benchmark.db"), retention_days=0)
+    from services.database import InfluxDBService
+    return InfluxDBService()
+
+
+def is_available(name: str, backend) -> bool:
+    """Whether the backend can actually be reached (is_ready only checks the client was built)."""
+    if not backend.is_ready():
+        return False
+    if name == "influxdb":
+        try:
+            return backend.client.ping()
+        except Exception:
+            return False
+    return True
+
+
+def timed(fn, repeat: int):
+    """Run fn `repeat` times; return (median milliseconds, last result)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def run(backend_names, count: int, external_hosts: int, hours: int, repeat: int):
+    span = timedelta(hours=hours)
+    packets = list(generate_packets(count, external_hosts, span))
+    window = NetworkLogFilter(start_time=f"-{hours + 1}h")
+    ip = packets[count // 2]["source_ip"]
+    queries = {
+        "latest 100": lambda b: b.query_network_logs(limit=100, filters=window),
+        "latest 100 by ip": lambda b: b.query_network_logs(limit=100, filters=window.model_copy(update={"ip": ip})),
+        "latest 100 by cidr": lambda b: b.query_network_logs(
+            limit=100, filters=window.model_copy(update={"cidr": "192.168.1.0/28"})
+        ),
+        "count by protocol": lambda b: b.aggregate_network_logs(window, group_by="protocol"),
+        "top 10 sources": lambda b: b.aggregate_network_logs(window, group_by="source_ip", top=10),
+        "bytes per 5m": lambda b: b.aggregate_network_logs(window, interval="5m", metric="bytes"),
+    }
+
+    print(f"{count} packets over {hours}h, {external_hosts} external hosts, median of {repeat} runs\n")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in backend_names:
+            with ExitStack() as stack:
+                if name == "influxdb":
+                    try:
+                        bucket = stack.enter_context(temporary_influxdb_buckets())
+                    except Exception as e:
+                        print(f"{name}: backend unavailable ({e}), skipped\n")
+                        continue
+                    print(f"[{name}] writing to temporary bucket {bucket}")
+                backend = create_backend(name, directory)
+                if not is_available(name, backend):
+                    print(f"{name}: backend unavailable, skipped\n")
+                    backend.close()
+                    continue
+                started = time.perf_counter()
+                backend.write_batch(packets)
+                flushed = backend.flush(timeout=300)
+                elapsed = time.perf_counter() - started
+                print(f"[{name}] write: {count / elapsed:,.0f} packets/s ({elapsed:.2f}s){'' if flushed else ' (flush timed out)'}")
+                for label, query in queries.items():
+                    median, result = timed(lambda: query(backend), repeat)
+                    print(f"[{name}] {label:<20}{median:>10.1f} ms{len(result):>8} rows")
+                backend.close()
+                print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare write and query performance of the storage backends")
+    parser.add_argument("--backend", choices=["influxdb", "sqlite", "both"], default="both")
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--hosts", type=int, default=5000)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    names = ["influxdb", "sqlite"] if args.backend == "both" else [args.backend]
+    run(names, args.packets, args.hosts, args.hours, args.repeat)
@@ -0,0 +1,137 @@
+# src/backend/scripts/ws_load_test.py
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+import websockets
+import redis.asyncio as redis
+
+
+def percentile(samples, fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def publish_packets(redis_url: str, rate: int, stop: asyncio.Event):
+    """Publish synthetic packets stamped with the current time at `rate` per second."""
+    client = redis.from_url(redis_url)
+    sent, started = 0, time.perf_counter()
+    try:
+        while not stop.is_set():
+            packet = {
+                "id": f"load-{sent}",
+                "seq": sent,
+                "timestamp": datetime.now().isoformat(),
+                "length": 512,
+                "protocol": "TCP",
+                "source_ip": "192.168.1.10",
+                "source_port": 50000,
+                "dest_ip": "10.0.0.1",
+                "dest_port": 443,
+                "flags": ["ACK"],
+                "threat_indicators": [],
+            }
+            await client.publish("network_packets", json.dumps(packet))
+            sent += 1
+            # Pace against the start time so slow iterations catch up
+            delay = sent / rate - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+    finally:
+        await client.aclose()
+    return sent
+
+
+async def run_client(url: str, ready: asyncio.Event, stop: asyncio.Event, latencies, counts):
+    """Receive frames until `stop`, recording capture-to-client latency per packet."""
+    try:
+        async with websockets.connect(url, max_size=None, compression="deflate") as ws:
+            await ws.recv()  # connection frame
+            ready.set()
+            while not stop.is_set():
+                try:
+                    frame = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = datetime.now()
+                message = json.loads(frame)
+                packets = message.get("data")
+                if message.get("type") == "network_log":
+                    packets = [packets]
+                elif message.get("type") != "network_log_batch":
+                    continue
+                for packet in packets:
+                    counts[0] += 1
+                    latencies.append((received - datetime.fromisoformat(packet["timestamp"])).total_seconds() * 1000)
+    except Exception as e:
+        counts[1] += 1
+        print(f"client error: {e}", file=sys.stderr)
+
+
+async def run_step(base_url: str, connections: int, duration: float, args) -> dict:
+    """Hold `connections` clients open for `duration` seconds and measure what they receive."""
+    query = f"token={args.token}"
+    if args.batch_ms:
+        query += f"&batch_ms={args.batch_ms}"
+    url = f"{base_url}/api/v1/ws/logs/network?{query}"
+    stop = asyncio.Event()
+    latencies, counts = [], [0, 0]
+    clients = []
+    for _ in range(connections):
+        ready = asyncio.Event()
+        clients.append(asyncio.create_task(run_client(url, ready, stop, latencies, counts)))
+        # Opening connections one by one keeps the handshake burst from skewing the first samples
+        await asyncio.wait([asyncio.create_task(ready.wait()), clients[-1]], timeout=10, return_when=asyncio.FIRST_COMPLETED)
+    # Only count what arrives during the measured window
+    latencies.clear()
+    counts[0] = 0
+    publisher = asyncio.create_task(publish_packets(args.redis_url, args.rate, stop)) if args.rate else None
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    published = await publisher if publisher else None
+    await asyncio.gather(*clients)
+    latencies.sort()
+    return {
+        "connections": connections,
+        "published": published,
+        "received": counts[0],
+        "errors": counts[1],
+        "throughput": counts[0] / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+async def main(args):
+    steps = [int(step) for step in args.connections.split(",")]
+    print(f"{args.rate or 'live'} packets/s for {args.duration}s per step against {args.url}\n")
+    print(f"{'clients':>8}{'received':>12}{'msgs/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for connections in steps:
+        result = await run_step(args.url, connections, args.duration, args)
+        print(
+            f"{result['connections']:>8}{result['received']:>12,}{result['throughput']:>12,.0f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure live stream throughput and capture-to-client latency as WebSocket clients grow"
+    )
+    parser.add_argument("--url", default="ws://localhost:8000", help="Server base URL")
+    parser.add_argument("--token", required=True, help="Firebase ID token the clients connect with")
+    parser.add_argument("--connections", default="10,100,500,1000", help="Comma-separated client counts, one step each")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds measured per step")
+    parser.add_argument("--rate", type=int, default=1000,
+                        help="Synthetic packets published per second (0 to measure live capture traffic)")
+    parser.add_argument("--redis-url", default="redis://localhost:6379", help="Redis the server's workers share")
+    parser.add_argument("--batch-ms", type=int, default=0, help="Ask for batched frames (?batch_ms=)")
+    asyncio.run(main(parser.parse_args()))
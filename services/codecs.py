@@ -0,0 +1,172 @@
+# src/backend/services/codecs.py
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from core.config import settings
+
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON, falls back to the standard library
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: binary codec, unavailable without the package
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Key of the envelope that carries several bus messages in one payload
+ENVELOPE_KEY = "__batch__"
+
+Payload = Union[bytes, str]
+
+
+class JSONCodec:
+    """
+    Compact JSON codec (orjson when installed). Frames are sent as text.
+    """
+
+    name = "json"
+    binary = False
+
+    def encode(self, obj: Any) -> bytes:
+        """Encode an object to UTF-8 JSON bytes."""
+        if orjson:
+            try:
+                return orjson.dumps(obj, default=str)
+            except TypeError:
+                # Non-string keys or integers wider than 64 bits
+                pass
+        return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+    def decode(self, payload: Payload) -> Any:
+        """Decode JSON bytes or text."""
+        return orjson.loads(payload) if orjson else json.loads(payload)
+
+    def array(self, items: List[bytes]) -> bytes:
+        """Join already-encoded values into an encoded array."""
+        return b"[" + b",".join(items) + b"]"
+
+    def map(self, fields: Dict[str, bytes]) -> bytes:
+        """Build an encoded map from string keys and already-encoded values."""
+        return b"{" + b",".join(self.encode(key) + b":" + value for key, value in fields.items()) + b"}"
+
+    def envelope_items(self, payload: bytes) -> Optional[bytes]:
+        """Return the encoded item array of an envelope, or None if `payload` is not one."""
+        prefix = b'{"%s":' % ENVELOPE_KEY.encode()
+        if payload.startswith(prefix) and payload.endswith(b"}"):
+            return payload[len(prefix):-1]
+        return None
+
+
+class MsgpackCodec:
+    """
+    MessagePack codec. Frames are sent as binary.
+    """
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, obj: Any) -> bytes:
+        """Encode an object to MessagePack."""
+        return msgpack.packb(obj, default=str, use_bin_type=True)
+
+    def decode(self, payload: Payload) -> Any:
+        """Decode MessagePack bytes."""
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+    @staticmethod
+    def _header(count: int, fix: int, short: bytes, long: bytes) -> bytes:
+        if count < 16:
+            return bytes([fix | count])
+        if count < 1 << 16:
+            return short + count.to_bytes(2, "big")
+        return long + count.to_bytes(4, "big")
+
+    def array(self, items: List[bytes]) -> bytes:
+        """Join already-encoded values into an encoded array."""
+        return self._header(len(items), 0x90, b"\xdc", b"\xdd") + b"".join(items)
+
+    def map(self, fields: Dict[str, bytes]) -> bytes:
+        """Build an encoded map from string keys and already-encoded values."""
+        header = self._header(len(fields), 0x80, b"\xde", b"\xdf")
+        return header + b"".join(self.encode(key) + value for key, value in fields.items())
+
+    def envelope_items(self, payload: bytes) -> Optional[bytes]:
+        """Return the encoded item array of an envelope, or None if `payload` is not one."""
+        prefix = b"\x81" + self.encode(ENVELOPE_KEY)
+        return payload[len(prefix):] if payload.startswith(prefix) else None
+
+
+JSON_CODEC = JSONCodec()
+CODECS = {"json": JSON_CODEC}
+if msgpack:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def get_codec(name: Optional[str]):
+    """
+    Look up a codec by name.
+
+    Args:
+        name: "json" or "msgpack"; None selects JSON
+
+    Returns:
+        The codec, or the JSON codec if the name is unknown or its package is missing
+    """
+    if not name:
+        return JSON_CODEC
+    codec = CODECS.get(name.lower())
+    if not codec:
+        logger.warning(f"Codec {name} is not available, using json")
+        return JSON_CODEC
+    return codec
+
+
+def _channel_codecs() -> Dict[str, str]:
+    pairs = (item.split("=", 1) for item in settings.CHANNEL_CODECS.split(",") if "=" in item)
+    return {channel.strip(): codec.strip() for channel, codec in pairs}
+
+
+_CHANNEL_CODECS = _channel_codecs()
+
+
+def channel_codec(channel: str):
+    """Codec used to publish on a channel or stream (CHANNEL_CODECS, JSON by default)."""
+    return get_codec(_CHANNEL_CODECS.get(channel))
+
+
+_ENVELOPE_CHANNELS = {channel.strip() for channel in settings.ENVELOPE_CHANNELS.split(",") if channel.strip()}
+
+
+def uses_envelopes(channel: str) -> bool:
+    """Whether batches on a channel may be packed into envelopes (ENVELOPE_CHANNELS)."""
+    return channel in _ENVELOPE_CHANNELS
+
+
+def detect_codec(payload: Payload):
+    """
+    Codec that produced a bus payload.
+
+    Publishers only ever send maps or arrays, so JSON payloads start with "{"
+    or "[" and anything else is MessagePack. This lets subscribers read
+    channels whose codec was changed while messages were in flight.
+    """
+    if isinstance(payload, str) or payload[:1] in (b"{", b"[") or "msgpack" not in CODECS:
+        return JSON_CODEC
+    return CODECS["msgpack"]
+
+
+def pack_envelope(codec, messages: List[bytes]) -> bytes:
+    """Wrap already-encoded messages in a single batch envelope."""
+    return codec.map({ENVELOPE_KEY: codec.array(messages)})
+
+
+def unpack_messages(data: Any) -> List[Any]:
+    """Return the messages carried by a decoded payload (one unless it is an envelope)."""
+    if isinstance(data, dict) and ENVELOPE_KEY in data:
+        return data[ENVELOPE_KEY]
+    return [data]
@@ -0,0 +1,398 @@
+# src/backend/services/connection_registry.py
+
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from core.config import settings
+from services.message_queue import message_queue
+
+logger = logging.getLogger(__name__)
+
+# Redis keys; {worker} is a worker ID, {uid} a user ID
+WORKERS_KEY = "ws:workers"
+CONNECTIONS_KEY = "ws:connections:{worker}"
+USER_KEY = "ws:user:{uid}"
+INBOX_CHANNEL = "ws:inbox:{worker}"
+LOCK_KEY = "ws:lock:{name}"
+
+# Extend or delete a lock only while this worker still holds it (KEYS[1] lock, ARGV[1] worker, ARGV[2] TTL)
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+Deliver = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ConnectionRegistry:
+    """
+    Cluster-wide registry of live WebSocket connections.
+
+    Every worker keeps its own connections locally and mirrors them into
+    Redis: a hash of connections per worker, a set of connection IDs per
+    user, and a sorted set of workers scored by their last heartbeat.
+    Workers whose heartbeat is older than three intervals are considered
+    dead and ignored. A message for a user is routed to the inbox channel
+    of each worker holding one of their connections, and that worker
+    delivers it locally. Without Redis the registry only knows its own
+    worker's connections, and locks fall back to file locks shared by the
+    workers of this host.
+    """
+
+    def __init__(self, heartbeat_seconds: int = 5, lock_dir: Optional[str] = None):
+        """
+        Args:
+            heartbeat_seconds: How often the worker refreshes its registration
+            lock_dir: Directory of the file locks used without Redis (defaults to the temp directory)
+        """
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_seconds = heartbeat_seconds
+        self.ttl = heartbeat_seconds * 3
+        self._connections: Dict[str, Dict[str, Any]] = {}
+        self._handlers: Dict[str, Deliver] = {}
+        self.lock_dir = lock_dir or tempfile.gettempdir()
+        self._locks: Set[str] = set()
+        # Lock name -> (on_acquired, on_lost) callbacks
+        self._wanted: Dict[str, Tuple[Optional[Callable[[], Any]], Optional[Callable[[], Any]]]] = {}
+        # Lock name -> monotonic time it was last confirmed in Redis
+        self._lock_confirmed: Dict[str, float] = {}
+        self._lock_files: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[asyncio.Task] = set()
+        self.messages_routed = 0
+        self.messages_delivered = 0
+
+    @property
+    def redis(self):
+        return message_queue.redis_client
+
+    def _spawn(self, coroutine: Awaitable):
+        task = asyncio.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def start(self):
+        """Register this worker and start heartbeating and reading its inbox."""
+        if self._tasks:
+            return
+        await self._heartbeat_once()
+        self._tasks = [asyncio.create_task(self._heartbeat()), asyncio.create_task(self._listen())]
+        logger.info(f"Connection registry started for worker {self.worker_id}")
+
+    def add(self, user_data: dict, endpoint: str, deliver: Deliver) -> str:
+        """
+        Register a connection.
+
+        Args:
+            user_data: Decoded token of the connected user
+            endpoint: WebSocket path the client connected to
+            deliver: Called with each message targeted at this connection
+
+        Returns:
+            Cluster-unique connection ID (for `remove`)
+        """
+        connection_id = f"{self.worker_id}/{next(self._ids)}"
+        info = {
+            "uid": user_data.get("uid"),
+            "email": user_data.get("email"),
+            "endpoint": endpoint,
+            "connected_at": time.time(),
+        }
+        self._connections[connection_id] = info
+        self._handlers[connection_id] = deliver
+        if self.redis:
+            self._spawn(self._publish_connection(connection_id, info))
+        return connection_id
+
+    def remove(self, connection_id: str):
+        """Forget a connection."""
+        info = self._connections.pop(connection_id, None)
+        self._handlers.pop(connection_id, None)
+        if info and self.redis:
+            self._spawn(self._retract_connection(connection_id, info))
+
+    async def _publish_connection(self, connection_id: str, info: Dict[str, Any]):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(CONNECTIONS_KEY.format(worker=self.worker_id), connection_id, json.dumps(info))
+            if info["uid"]:
+                pipe.sadd(USER_KEY.format(uid=info["uid"]), connection_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to register connection {connection_id}: {e}")
+
+    async def _retract_connection(self, connection_id: str, info: Dict[str, Any]):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hdel(CONNECTIONS_KEY.format(worker=self.worker_id), connection_id)
+            if info["uid"]:
+                pipe.srem(USER_KEY.format(uid=info["uid"]), connection_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to unregister connection {connection_id}: {e}")
+
+    async def _heartbeat_once(self):
+        await self._refresh_locks()
+        if not self.redis:
+            return
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(WORKERS_KEY, {self.worker_id: now})
+            pipe.zremrangebyscore(WORKERS_KEY, "-inf", now - self.ttl)
+            # Re-mirror local state so it survives a Redis restart or a transport switch
+            key = CONNECTIONS_KEY.format(worker=self.worker_id)
+            pipe.delete(key)
+            if self._connections:
+                pipe.hset(key, mapping={cid: json.dumps(info) for cid, info in self._connections.items()})
+                for cid, info in self._connections.items():
+                    if info["uid"]:
+                        pipe.sadd(USER_KEY.format(uid=info["uid"]), cid)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Connection registry heartbeat failed: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self._heartbeat_once()
+
+    async def _listen(self):
+        """Keep this worker's inbox subscribed, resubscribing after failures."""
+        while True:
+            await message_queue.subscribe_to_channel(INBOX_CHANNEL.format(worker=self.worker_id), self._deliver)
+            await asyncio.sleep(1)
+
+    async def _deliver(self, envelope: Dict[str, Any]):
+        """Hand an inbox message to the local connections it names."""
+        for connection_id in envelope.get("connection_ids", ()):
+            handler = self._handlers.get(connection_id)
+            if handler:
+                try:
+                    await handler(envelope["message"])
+                    self.messages_delivered += 1
+                except Exception as e:
+                    logger.error(f"Failed to deliver message to {connection_id}: {e}")
+
+    async def live_workers(self) -> List[str]:
+        """IDs of workers with a recent heartbeat (just this one without Redis)."""
+        if not self.redis:
+            return [self.worker_id]
+        try:
+            workers = await self.redis.zrangebyscore(WORKERS_KEY, time.time() - self.ttl, "+inf")
+            return [worker.decode() if isinstance(worker, bytes) else worker for worker in workers]
+        except Exception as e:
+            logger.error(f"Failed to list workers: {e}")
+            return [self.worker_id]
+
+    async def count(self) -> Dict[str, Any]:
+        """
+        Count live connections across the cluster.
+
+        Returns:
+            {"total": n, "workers": {worker_id: n}}
+        """
+        workers = {self.worker_id: len(self._connections)}
+        if self.redis:
+            try:
+                others = [worker for worker in await self.live_workers() if worker != self.worker_id]
+                pipe = self.redis.pipeline(transaction=False)
+                for worker in others:
+                    pipe.hlen(CONNECTIONS_KEY.format(worker=worker))
+                workers.update(zip(others, await pipe.execute()))
+            except Exception as e:
+                logger.error(f"Failed to count connections: {e}")
+        return {"total": sum(workers.values()), "workers": workers}
+
+    async def send_to_user(self, uid: str, message: Dict[str, Any]) -> int:
+        """
+        Send a message to every connection of a user, wherever it is.
+
+        Returns:
+            Number of connections the message was routed to
+        """
+        connection_ids = [cid for cid, info in self._connections.items() if info["uid"] == uid]
+        if self.redis:
+            try:
+                members = await self.redis.smembers(USER_KEY.format(uid=uid))
+                connection_ids = [member.decode() if isinstance(member, bytes) else member for member in members]
+            except Exception as e:
+                logger.error(f"Failed to look up connections of {uid}: {e}")
+        return await self.send_to_connections(connection_ids, message, uid)
+
+    async def send_to_connections(self, connection_ids: List[str], message: Dict[str, Any], uid: Optional[str] = None) -> int:
+        """
+        Send a message to specific connections, routing each to its worker.
+
+        Args:
+            connection_ids: Cluster connection IDs
+            message: JSON-serializable message
+            uid: Owner of the connections, to prune IDs of dead workers
+
+        Returns:
+            Number of connections the message was routed to
+        """
+        by_worker: Dict[str, List[str]] = {}
+        for connection_id in connection_ids:
+            by_worker.setdefault(connection_id.rsplit("/", 1)[0], []).append(connection_id)
+        remote = [worker for worker in by_worker if worker != self.worker_id]
+        live = set(await self.live_workers()) if remote else set()
+        live.add(self.worker_id)
+        routed = 0
+        for worker, ids in by_worker.items():
+            if worker not in live:
+                if uid and self.redis:
+                    self._spawn(self.redis.srem(USER_KEY.format(uid=uid), *ids))
+                continue
+            envelope = {"connection_ids": ids, "message": message}
+            if worker == self.worker_id:
+                await self._deliver(envelope)
+            elif not await message_queue.publish_packet_data(INBOX_CHANNEL.format(worker=worker), envelope):
+                continue
+            routed += len(ids)
+        self.messages_routed += routed
+        return routed
+
+    async def acquire_lock(
+        self,
+        name: str,
+        on_acquired: Optional[Callable[[], Any]] = None,
+        on_lost: Optional[Callable[[], Any]] = None
+    ) -> bool:
+        """
+        Take a cluster-wide lock held for as long as this worker heartbeats.
+
+        A lock that is not free is retried on every heartbeat, so a worker
+        takes over once the holder stops refreshing it (or, without Redis,
+        once the holding process exits).
+
+        Args:
+            name: Lock name
+            on_acquired: Called when a later heartbeat takes the lock
+            on_lost: Called when a heartbeat finds the lock taken over (or
+                unconfirmed for longer than its TTL); stop the guarded work here
+
+        Returns:
+            True if this worker holds the lock now
+        """
+        self._wanted[name] = (on_acquired, on_lost)
+        acquired = await self._take_lock(name)
+        if acquired:
+            self._locks.add(name)
+        return acquired
+
+    async def _refresh_locks(self):
+        """Retry wanted locks and extend held ones."""
+        for name, (on_acquired, on_lost) in list(self._wanted.items()):
+            held = await self._take_lock(name)
+            if held and name not in self._locks:
+                self._locks.add(name)
+                logger.info(f"Worker {self.worker_id} took over lock {name}")
+                self._run_callback(name, on_acquired)
+            elif not held and name in self._locks:
+                self._locks.discard(name)
+                logger.warning(f"Worker {self.worker_id} lost lock {name}")
+                self._run_callback(name, on_lost)
+
+    @staticmethod
+    def _run_callback(name: str, callback: Optional[Callable[[], Any]]):
+        if not callback:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Lock {name} callback failed: {e}")
+
+    async def _take_lock(self, name: str) -> bool:
+        """Take or extend a lock in Redis, or as a file lock without it."""
+        if not self.redis:
+            return self._take_file_lock(name)
+        try:
+            key = LOCK_KEY.format(name=name)
+            acquired = await self.redis.set(key, self.worker_id, nx=True, ex=self.ttl)
+            if not acquired:
+                # Compare-and-expire in one step, so a lock another worker just took is never extended
+                acquired = await self.redis.eval(EXTEND_LOCK_SCRIPT, 1, key, self.worker_id, self.ttl)
+            if acquired:
+                self._lock_confirmed[name] = time.monotonic()
+            return bool(acquired)
+        except Exception as e:
+            logger.error(f"Failed to acquire lock {name}: {e}")
+            # Keep a held lock through a Redis hiccup, but no longer than others wait for it to expire
+            confirmed = self._lock_confirmed.get(name)
+            return name in self._locks and confirmed is not None and time.monotonic() - confirmed < self.ttl
+
+    def _take_file_lock(self, name: str) -> bool:
+        """Hold an exclusive flock; the OS releases it when the process exits."""
+        if name in self._lock_files:
+            return True
+        path = os.path.join(self.lock_dir, f"netverse-{name}.lock")
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.error(f"Failed to open lock file {path}: {e}")
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_files[name] = fd
+        return True
+
+    async def close(self):
+        """Stop heartbeating and remove this worker from the registry."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._pending, return_exceptions=True)
+        self._tasks = []
+        self._wanted.clear()
+        for fd in self._lock_files.values():
+            os.close(fd)
+        self._lock_files.clear()
+        if not self.redis:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrem(WORKERS_KEY, self.worker_id)
+            pipe.delete(CONNECTIONS_KEY.format(worker=self.worker_id))
+            for cid, info in self._connections.items():
+                if info["uid"]:
+                    pipe.srem(USER_KEY.format(uid=info["uid"]), cid)
+            for name in self._locks:
+                pipe.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY.format(name=name), self.worker_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to unregister worker {self.worker_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get this worker's registry counters."""
+        return {
+            "worker_id": self.worker_id,
+            "connections": len(self._connections),
+            "locks": sorted(self._locks),
+            "messages_routed": self.messages_routed,
+            "messages_delivered": self.messages_delivered,
+        }
+
+
+# Global instance
+connection_registry = ConnectionRegistry(heartbeat_seconds=settings.WS_REGISTRY_HEARTBEAT_SECONDS)
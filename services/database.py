@@ -1,15 +1,49 @@
 # src/backend/services/database.py
 
-from influxdb_client import InfluxDBClient, Point, WritePrecision
+from influxdb_client import InfluxDBClient, WritePrecision, BucketRetentionRules
 from influxdb_client.client.write_api import SYNCHRONOUS
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from influxdb_client.rest import ApiException
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import asyncio
+import functools
 import json
 import logging
+import os
+import time
 from core.config import settings
+from services.influx_writer import BatchingWriter
+from services.line_protocol import (
+    LEGACY_MEASUREMENT,
+    COMPACT_MEASUREMENT,
+    ENRICHMENT_MEASUREMENT,
+    encode_network_log,
+    encode_compact_network_log,
+    encode_ip_enrichment,
+)
+from services.spool import WriteAheadSpool
+from services.log_query import NetworkLogFilter, floor_time, merge_aggregate_rows, parse_interval, resolve_time
+from services.rollups import RollupAggregator, ROLLUP_DIMENSIONS, TIERS, OTHER_KEY, select_rollup_tier
+from services.flux_query import (
+    flux_string,
+    build_network_logs_query,
+    build_export_query,
+    build_aggregate_query,
+    build_rollup_query,
+    check_filter_supported,
+)
 
 logger = logging.getLogger(__name__)
 
+
+def _is_retryable(error: Exception) -> bool:
+    """Client errors (bad line protocol, auth) will not succeed on retry; 429 will."""
+    if isinstance(error, ApiException) and error.status:
+        return error.status == 429 or error.status >= 500
+    return True
+
+
 class InfluxDBService:
     """
     Service for handling InfluxDB operations for network log data.
@@ -19,6 +53,12 @@ class InfluxDBService:
         self.client = None
         self.write_api = None
         self.query_api = None
+        self.writer = None
+        self.rollup_writers: Dict[str, BatchingWriter] = {}
+        self.rollups: Optional[RollupAggregator] = None
+        # ip -> monotonic time its enrichment was last written (compact schema)
+        self._enriched_ips: "OrderedDict[str, float]" = OrderedDict()
+        self._last_enrichment_ts = 0
         self.initialize_client()
     
     def initialize_client(self):
@@ -27,69 +67,225 @@ class InfluxDBService:
             self.client = InfluxDBClient(
                 url=settings.INFLUXDB_URL,
                 token=settings.INFLUXDB_TOKEN,
-                org=settings.INFLUXDB_ORG
+                org=settings.INFLUXDB_ORG,
+                enable_gzip=settings.INFLUXDB_GZIP
             )
+            # Synchronous writes are only issued from the batching writer's thread
             self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
             self.query_api = self.client.query_api()
+            self.writer = self._create_writer(settings.INFLUXDB_BUCKET, settings.SPOOL_DIR, "influx-writer")
+            if settings.ROLLUPS_ENABLED:
+                # Each tier has its own bucket (and retention), so its own writer and spool
+                for tier in TIERS:
+                    self.rollup_writers[tier] = self._create_writer(
+                        self._rollup_bucket(tier), f"{settings.SPOOL_DIR}-{tier}", f"influx-rollup-{tier}"
+                    )
+                self.rollups = RollupAggregator(
+                    emit=self._emit_rollup,
+                    sensor=settings.SENSOR_ID,
+                    top_keys=settings.ROLLUP_TOP_KEYS,
+                    # Each worker only aggregates the packets its stream consumer receives
+                    worker=str(os.getpid()) if settings.WS_WORKERS != 1 else None
+                )
             logger.info("InfluxDB client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize InfluxDB client: {e}")
             self.client = None
     
+    def _create_writer(self, bucket: str, spool_dir: str, name: str) -> BatchingWriter:
+        """Start a batching writer (with its own spool, if enabled) for one bucket."""
+        spool = None
+        if settings.SPOOL_ENABLED:
+            directory, adopt_from = spool_dir, None
+            if settings.WS_WORKERS != 1:
+                # Workers never share segment files; each takes over the spools of exited ones
+                directory, adopt_from = os.path.join(spool_dir, f"worker-{os.getpid()}"), spool_dir
+            try:
+                spool = WriteAheadSpool(
+                    directory=directory,
+                    segment_bytes=settings.SPOOL_SEGMENT_BYTES,
+                    max_bytes=settings.SPOOL_MAX_BYTES,
+                    adopt_from=adopt_from
+                )
+            except OSError as e:
+                logger.error(f"Failed to open spool {directory}, writing without one: {e}")
+        writer = BatchingWriter(
+            write_fn=functools.partial(self._write_batch, bucket),
+            batch_size=settings.INFLUXDB_BATCH_SIZE,
+            flush_interval=settings.INFLUXDB_FLUSH_INTERVAL_MS / 1000,
+            max_queue_size=settings.INFLUXDB_WRITE_QUEUE_SIZE,
+            max_retries=settings.INFLUXDB_MAX_RETRIES,
+            retry_backoff=settings.INFLUXDB_RETRY_BACKOFF_MS / 1000,
+            name=name,
+            spool=spool,
+            replay_batch_size=settings.SPOOL_REPLAY_BATCH_SIZE,
+            replay_interval=settings.SPOOL_REPLAY_INTERVAL_MS / 1000,
+            is_retryable=_is_retryable
+        )
+        writer.start()
+        return writer
+
+    @staticmethod
+    def _rollup_bucket(tier: str) -> str:
+        return {"1m": settings.ROLLUP_1M_BUCKET, "1h": settings.ROLLUP_1H_BUCKET}[tier]
+
+    def _emit_rollup(self, tier: str, lines: List[str]):
+        """Queue a closed rollup bucket on its tier's writer."""
+        writer = self.rollup_writers[tier]
+        for line in lines:
+            writer.submit(line)
+
+    def _write_batch(self, bucket: str, lines: List[str]):
+        """Send a batch of line protocol records to InfluxDB (raises on failure)."""
+        self.write_api.write(
+            bucket=bucket,
+            org=settings.INFLUXDB_ORG,
+            record="\n".join(lines),
+            write_precision=WritePrecision.US
+        )
+
+    def _encode_enrichment(self, log_data: Dict[str, Any]) -> List[str]:
+        """
+        Encode enrichment for IPs not written within the refresh window.
+        
+        Timestamps are kept strictly increasing so records from the same
+        sensor never overwrite each other.
+        """
+        lines = []
+        now = time.monotonic()
+        for ip_key, enrichment_key in (("source_ip", "source_ip_enrichment"), ("dest_ip", "dest_ip_enrichment")):
+            ip = log_data.get(ip_key)
+            enrichment = log_data.get(enrichment_key)
+            if not ip or not enrichment:
+                continue
+            written_at = self._enriched_ips.get(ip)
+            if written_at is not None and now - written_at < settings.ENRICHMENT_REFRESH_SECONDS:
+                continue
+            self._enriched_ips[ip] = now
+            self._enriched_ips.move_to_end(ip)
+            if len(self._enriched_ips) > settings.ENRICHMENT_CACHE_SIZE:
+                self._enriched_ips.popitem(last=False)
+            self._last_enrichment_ts = max(int(time.time() * 1_000_000), self._last_enrichment_ts + 1)
+            lines.append(encode_ip_enrichment(ip, enrichment, settings.SENSOR_ID, self._last_enrichment_ts))
+        return lines
+
+    def write_batch(self, logs: List[Dict[str, Any]]) -> bool:
+        """
+        Queue several network log entries for batched writing.
+        
+        Returns:
+            bool: True if every entry was queued
+        """
+        queued = [self.write_network_log(log_data) for log_data in logs]
+        return all(queued)
+    
     def write_network_log(self, log_data: Dict[str, Any]) -> bool:
         """
-        Write a network log entry to InfluxDB.
+        Queue a network log entry for batched writing to InfluxDB.
+        
+        The record is serialized to line protocol immediately and written
+        by the background writer, so this never blocks on the network.
+        INFLUXDB_SCHEMA selects the legacy layout (IP tags plus a raw_data
+        JSON blob) or the compact one (bounded tags, enrichment written
+        once per IP to the ip_enrichment measurement).
         
         Args:
             log_data: Dictionary containing packet information
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if queued, False otherwise
         """
-        if not self.client or not self.write_api:
+        if not self.client or not self.writer:
             logger.error("InfluxDB client not initialized")
             return False
             
         try:
-            point = (
-                Point("network_traffic")
-                .tag("protocol", log_data.get("protocol", "unknown"))
-                .tag("source_ip", log_data.get("source_ip", "unknown"))
-                .tag("dest_ip", log_data.get("dest_ip", "unknown"))
-                .field("source_port", log_data.get("source_port", 0))
-                .field("dest_port", log_data.get("dest_port", 0))
-                .field("length", log_data.get("length", 0))
-                .field("summary", log_data.get("summary", ""))
-                .field("raw_data", json.dumps(log_data))
-                .time(datetime.fromisoformat(log_data.get("timestamp")), WritePrecision.MS)
-            )
+            if self.rollups:
+                self.rollups.record(log_data)
+            if settings.INFLUXDB_SCHEMA == "legacy":
+                return self.writer.submit(encode_network_log(log_data))
+            for line in self._encode_enrichment(log_data):
+                self.writer.submit(line)
+            return self.writer.submit(encode_compact_network_log(log_data, settings.SENSOR_ID))
+        except Exception as e:
+            logger.error(f"Failed to queue network log for InfluxDB: {e}")
+            return False
+    
+    @staticmethod
+    def _record_to_log(record) -> Dict[str, Any]:
+        """
+        Map a pivoted record to the API log entry shape.
+        
+        IPs come from tags in the legacy schema and from fields in the
+        compact one; after the pivot both are plain columns.
+        """
+        return {
+            "id": f"log-{record.get_time().timestamp()}",
+            "timestamp": record.get_time().isoformat(),
+            "protocol": record.values.get("protocol", "unknown"),
+            "source_ip": record.values.get("source_ip", "unknown"),
+            "source_port": record.values.get("source_port", 0),
+            "dest_ip": record.values.get("dest_ip", "unknown"),
+            "dest_port": record.values.get("dest_port", 0),
+            "length": record.values.get("length", 0),
+            "summary": record.values.get("summary", ""),
+        }
+    
+    def query_ip_enrichment(self, ip: str, lookback: str = "-30d") -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent enrichment stored for an IP (compact schema).
+        
+        Args:
+            ip: IP address to look up
+            lookback: Flux duration to search back from now
             
-            self.write_api.write(
-                bucket=settings.INFLUXDB_BUCKET,
-                org=settings.INFLUXDB_ORG,
-                record=point
-            )
-            return True
+        Returns:
+            Enrichment dictionary or None if not found
+        """
+        if not self.client or not self.query_api:
+            logger.error("InfluxDB client not initialized")
+            return None
+            
+        try:
+            query = f'''
+            from(bucket: "{settings.INFLUXDB_BUCKET}")
+                |> range(start: {lookback})
+                |> filter(fn: (r) => r._measurement == "{ENRICHMENT_MEASUREMENT}")
+                |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+                |> filter(fn: (r) => r.ip == {flux_string(ip)})
+                |> group()
+                |> last(column: "data")
+            '''
+            result = self.query_api.query(org=settings.INFLUXDB_ORG, query=query)
+            for table in result:
+                for record in table.records:
+                    return json.loads(record.values.get("data", "{}"))
+            return None
             
         except Exception as e:
-            logger.error(f"Failed to write to InfluxDB: {e}")
-            return False
+            logger.error(f"Failed to query IP enrichment: {e}")
+            return None
     
     def query_network_logs(
         self, 
         limit: int = 100, 
         start_time: Optional[str] = None,
         end_time: Optional[str] = None,
-        protocol_filter: Optional[str] = None
+        protocol_filter: Optional[str] = None,
+        filters: Optional[NetworkLogFilter] = None
     ) -> List[Dict[str, Any]]:
         """
-        Query network logs from InfluxDB.
+        Query the latest network logs from InfluxDB, newest first.
+        
+        Every filter, the sort and the limit are evaluated inside Flux, so
+        exactly `limit` rows come back whenever that many match.
         
         Args:
             limit: Maximum number of records to return
             start_time: Start time in RFC3339 format
             end_time: End time in RFC3339 format
             protocol_filter: Filter by protocol (TCP, UDP, etc.)
+            filters: Additional IP/port/CIDR/indicator filters
             
         Returns:
             List of log entries
@@ -99,46 +295,18 @@ class InfluxDBService:
             return []
             
         try:
-            # Build the Flux query
-            time_range = ""
-            if start_time and end_time:
-                time_range = f'|> range(start: {start_time}, stop: {end_time})'
-            elif start_time:
-                time_range = f'|> range(start: {start_time})'
-            else:
-                time_range = '|> range(start: -1h)'  # Default to last hour
-            
-            protocol_filter_query = ""
-            if protocol_filter:
-                protocol_filter_query = f'|> filter(fn: (r) => r.protocol == "{protocol_filter}")'
-            
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                {time_range}
-                |> filter(fn: (r) => r._measurement == "network_traffic")
-                {protocol_filter_query}
-                |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-                |> limit(n: {limit})
-                |> sort(columns: ["_time"], desc: true)
-            '''
+            overrides = {"start_time": start_time, "end_time": end_time, "protocol": protocol_filter}
+            filters = (filters or NetworkLogFilter()).model_copy(
+                update={key: value for key, value in overrides.items() if value is not None}
+            )
+            query = build_network_logs_query(settings.INFLUXDB_BUCKET, filters, limit)
             
             result = self.query_api.query(org=settings.INFLUXDB_ORG, query=query)
             
             logs = []
             for table in result:
                 for record in table.records:
-                    log_entry = {
-                        "id": f"log-{record.get_time().timestamp()}",
-                        "timestamp": record.get_time().isoformat(),
-                        "protocol": record.values.get("protocol", "unknown"),
-                        "source_ip": record.values.get("source_ip", "unknown"),
-                        "source_port": record.values.get("source_port", 0),
-                        "dest_ip": record.values.get("dest_ip", "unknown"),
-                        "dest_port": record.values.get("dest_port", 0),
-                        "length": record.values.get("length", 0),
-                        "summary": record.values.get("summary", ""),
-                    }
-                    logs.append(log_entry)
+                    logs.append(self._record_to_log(record))
             
             return logs
             
@@ -146,8 +314,305 @@ class InfluxDBService:
             logger.error(f"Failed to query InfluxDB: {e}")
             return []
     
+    def stream_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        resume_from: Optional[Tuple[datetime, int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every matching network log, oldest first, in constant memory.
+        
+        The time range is walked in EXPORT_WINDOW_SECONDS windows, each read
+        through the client's streaming query API, so neither the engine nor
+        InfluxDB has to hold the whole result. Unlike the other query
+        methods, errors are raised so callers can tell a truncated stream
+        from a complete one.
+        
+        Args:
+            filters: Which logs to include (defaults to the last hour, up to now)
+            resume_from: (timestamp, rows already sent with that timestamp) from a cursor
+            
+        Yields:
+            Log entries in the same shape as query_network_logs
+        """
+        if not self.client or not self.query_api:
+            raise RuntimeError("InfluxDB client not initialized")
+        
+        now = datetime.now(timezone.utc)
+        start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+        end = resolve_time(filters.end_time, now) if filters.end_time else now
+        skip_time, skip = resume_from or (None, 0)
+        if skip_time:
+            start = max(start, skip_time)
+        window = timedelta(seconds=settings.EXPORT_WINDOW_SECONDS)
+        
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + window, end)
+            query = build_export_query(
+                settings.INFLUXDB_BUCKET,
+                filters.model_copy(update={"start_time": window_start.isoformat(), "end_time": window_end.isoformat()})
+            )
+            for record in self.query_api.query_stream(query=query, org=settings.INFLUXDB_ORG):
+                if skip and record.get_time() == skip_time:
+                    skip -= 1
+                    continue
+                skip = 0
+                yield self._record_to_log(record)
+            window_start = window_end
+    
+    def aggregate_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        group_by: Optional[str] = None,
+        interval: Optional[str] = None,
+        metric: str = "packets",
+        top: Optional[int] = None,
+        exclude_zero: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Compute packet or byte counts inside InfluxDB.
+        
+        Reads the coarsest rollup tier that fits when the filter is a plain
+        time range and the grouping is one of the rolled-up dimensions, and
+        raw data otherwise.
+        
+        Args:
+            filters: Which logs to include
+            group_by: Column to group by (protocol, source_ip, dest_port, ...) or None
+            interval: Window duration for a time series (e.g. "1m"), or None for totals
+            metric: "packets" or "bytes"
+            top: Keep only the N largest groups (totals only)
+            exclude_zero: Skip rows where the group_by column is 0
+            
+        Returns:
+            List of {"time", "key", "value"} rows; time is None for totals
+        """
+        tier = None
+        row_filters = set(filters.model_dump(exclude_defaults=True)) - {"start_time", "end_time"}
+        if self.rollups and not row_filters and (group_by is None or group_by in ROLLUP_DIMENSIONS):
+            now = datetime.now(timezone.utc)
+            start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+            end = resolve_time(filters.end_time, now) if filters.end_time else now
+            tier = select_rollup_tier(end - start, parse_interval(interval) if interval else None)
+        if tier:
+            return self.aggregate_rollups(tier, filters, group_by, interval, metric, top, exclude_zero)
+        return self._aggregate_raw(filters, group_by, interval, metric, top, exclude_zero)
+    
+    def _aggregate_raw(
+        self,
+        filters: NetworkLogFilter,
+        group_by: Optional[str] = None,
+        interval: Optional[str] = None,
+        metric: str = "packets",
+        top: Optional[int] = None,
+        exclude_zero: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Compute packet or byte counts inside InfluxDB from raw per-packet data.
+        
+        Args:
+            filters: Which logs to include
+            group_by: Column to group by (protocol, source_ip, dest_port, ...) or None
+            interval: Window duration for a time series (e.g. "1m"), or None for totals
+            metric: "packets" or "bytes"
+            top: Keep only the N largest groups (totals only)
+            exclude_zero: Skip rows where the group_by column is 0
+            
+        Returns:
+            List of {"time", "key", "value"} rows; time is None for totals
+        """
+        if not self.client or not self.query_api:
+            logger.error("InfluxDB client not initialized")
+            return []
+            
+        try:
+            query = build_aggregate_query(
+                settings.INFLUXDB_BUCKET, filters, group_by, interval, metric, top, exclude_zero
+            )
+            result = self.query_api.query(org=settings.INFLUXDB_ORG, query=query)
+            
+            rows = []
+            for table in result:
+                for record in table.records:
+                    rows.append({
+                        "time": record.get_time().isoformat() if interval else None,
+                        "key": record.values.get(group_by) if group_by else None,
+                        "value": record.get_value() or 0,
+                    })
+            return rows
+            
+        except Exception as e:
+            logger.error(f"Failed to aggregate InfluxDB logs: {e}")
+            return []
+    
+    def aggregate_rollups(
+        self,
+        tier: str,
+        filters: NetworkLogFilter,
+        group_by: Optional[str] = None,
+        interval: Optional[str] = None,
+        metric: str = "packets",
+        top: Optional[int] = None,
+        exclude_zero: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Same as aggregate_network_logs, but read mostly from a rollup tier.
+        
+        Whole tier buckets inside the range come from the rollup bucket; the
+        unaligned head and the tail not yet rolled up are read raw, and the
+        pieces are merged. Only time filters are honoured (rollups carry no
+        per-packet columns), and keys folded into 'other' are left out of
+        top-N results.
+        
+        Args:
+            tier: Rollup tier name ("1m" or "1h")
+            filters: Time range to aggregate over
+            group_by: protocol, dest_port, source_ip, dest_ip or None
+            interval: Window duration, a multiple of the tier width, or None for totals
+            metric: "packets" or "bytes"
+            top: Keep only the N largest groups (totals only)
+            exclude_zero: Skip rows where the group_by column is 0
+            
+        Returns:
+            List of {"time", "key", "value"} rows; time is None for totals
+        """
+        if not self.client or not self.query_api:
+            logger.error("InfluxDB client not initialized")
+            return []
+            
+        try:
+            width = TIERS[tier]
+            now = datetime.now(timezone.utc)
+            start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+            end = resolve_time(filters.end_time, now) if filters.end_time else now
+            # Closed buckets reach InfluxDB a flush cycle after they close
+            lag = timedelta(seconds=settings.ROLLUP_FLUSH_INTERVAL_SECONDS + settings.INFLUXDB_FLUSH_INTERVAL_MS / 1000)
+            rollup_start = floor_time(start - timedelta(microseconds=1), width) + width
+            rollup_end = max(floor_time(min(end, now - lag), width), rollup_start)
+            
+            rows = []
+            for raw_start, raw_end in ((start, min(rollup_start, end)), (max(rollup_end, start), end)):
+                if raw_start < raw_end:
+                    raw_filters = filters.model_copy(
+                        update={"start_time": raw_start.isoformat(), "end_time": raw_end.isoformat()}
+                    )
+                    # Pieces are cut to the top N only after merging, or keys spread over them are lost
+                    rows += self._aggregate_raw(raw_filters, group_by, interval, metric, None, exclude_zero)
+            if rollup_start < rollup_end:
+                query = build_rollup_query(
+                    self._rollup_bucket(tier), rollup_start.isoformat(), rollup_end.isoformat(),
+                    group_by or "protocol", grouped=group_by is not None, every=interval, metric=metric
+                )
+                result = self.query_api.query(org=settings.INFLUXDB_ORG, query=query)
+                for table in result:
+                    for record in table.records:
+                        key = record.values.get("key") if group_by else None
+                        if key == OTHER_KEY and top:
+                            continue
+                        if group_by == "dest_port" and key != OTHER_KEY:
+                            key = int(key)
+                        rows.append({
+                            "time": record.get_time().isoformat() if interval else None,
+                            "key": key,
+                            "value": record.get_value() or 0,
+                        })
+            return merge_aggregate_rows(rows, interval, top)
+            
+        except Exception as e:
+            logger.error(f"Failed to aggregate InfluxDB rollups: {e}")
+            return []
+    
+    def apply_retention_policies(self):
+        """
+        Create the rollup buckets if needed and apply each tier's retention.
+        
+        The raw bucket's retention is only changed when RAW_RETENTION_DAYS
+        is set, so an existing deployment keeps its data by default.
+        """
+        if not self.client:
+            logger.error("InfluxDB client not initialized")
+            return
+        
+        policies = [(settings.INFLUXDB_BUCKET, settings.RAW_RETENTION_DAYS)]
+        if settings.ROLLUPS_ENABLED:
+            policies += [
+                (settings.ROLLUP_1M_BUCKET, settings.ROLLUP_1M_RETENTION_DAYS),
+                (settings.ROLLUP_1H_BUCKET, settings.ROLLUP_1H_RETENTION_DAYS),
+            ]
+        buckets_api = self.client.buckets_api()
+        for bucket_name, days in policies:
+            if bucket_name == settings.INFLUXDB_BUCKET and not days:
+                continue
+            try:
+                rules = BucketRetentionRules(type="expire", every_seconds=days * 86400)
+                bucket = buckets_api.find_bucket_by_name(bucket_name)
+                if bucket is None:
+                    buckets_api.create_bucket(bucket_name=bucket_name, retention_rules=rules, org=settings.INFLUXDB_ORG)
+                    logger.info(f"Created bucket {bucket_name} with {days}d retention")
+                elif [rule.every_seconds for rule in bucket.retention_rules or []] != [rules.every_seconds]:
+                    bucket.retention_rules = [rules]
+                    buckets_api.update_bucket(bucket=bucket)
+                    logger.info(f"Set retention of bucket {bucket_name} to {days}d")
+            except Exception as e:
+                logger.error(f"Failed to apply retention policy to bucket {bucket_name}: {e}")
+    
+    def prepare(self):
+        """Create buckets and apply retention at startup."""
+        self.apply_retention_policies()
+    
+    async def run_maintenance(self):
+        """Close rollup buckets on time even when traffic stops."""
+        while self.rollups:
+            await asyncio.sleep(settings.ROLLUP_FLUSH_INTERVAL_SECONDS)
+            try:
+                self.rollups.flush_due()
+            except Exception as e:
+                logger.error(f"Failed to flush rollups: {e}")
+    
+    def check_filter(self, filters: NetworkLogFilter):
+        """Raise ValueError for filters Flux cannot express (IPv6 networks)."""
+        check_filter_supported(filters)
+
+    def is_ready(self) -> bool:
+        """Whether the client was initialized."""
+        return self.client is not None
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every record queued so far has been handed to InfluxDB or the spool."""
+        writers = [self.writer] + list(self.rollup_writers.values()) if self.writer else []
+        return all([writer.drain(timeout) for writer in writers])
+    
+    def is_backfilling(self) -> bool:
+        """True while writes are being spooled or replayed, so recent history may still change."""
+        if not self.writer:
+            return False
+        return self.writer.degraded or bool(self.writer.spool and self.writer.spool.has_pending())
+    
+    def write_lag_seconds(self) -> float:
+        """Worst-case delay of the raw writer, retries included."""
+        return self.writer.max_write_delay() if self.writer else 0.0
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """Get batched writer metrics (flush latency, batch sizes, drops, spool depth)."""
+        if not self.writer:
+            return {}
+        stats = self.writer.get_stats()
+        if self.rollup_writers:
+            stats["rollups"] = {
+                "buckets_emitted": self.rollups.buckets_emitted,
+                "writers": {tier: writer.get_stats() for tier, writer in self.rollup_writers.items()},
+            }
+        return stats
+    
     def close(self):
-        """Close the InfluxDB client connection."""
+        """Flush pending writes and close the InfluxDB client connection."""
+        if self.rollups:
+            self.rollups.close()
+        for writer in self.rollup_writers.values():
+            writer.close()
+        if self.writer:
+            self.writer.close()
         if self.client:
             self.client.close()
 
@@ -0,0 +1,189 @@
+# src/backend/services/fanout_hub.py
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from services.codecs import detect_codec, unpack_messages
+from services.live_filters import FilterIndex, LiveFilter
+from services.message_queue import message_queue
+from services.packet_history import PacketHistory
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A registered consumer of a hub channel.
+
+    Each queue item is a `(payload, packets)` tuple: the encoded bus payload
+    as received (for pass-through) and the packets it carries, decoded once
+    by the hub for every subscriber. The payload is None on the in-process
+    bus and for filtered subscriptions, which only receive matching packets.
+    """
+
+    def __init__(self, channel: str, subscription_id: int, maxsize: int):
+        self.channel = channel
+        self.id = subscription_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    async def get(self) -> Tuple[Optional[bytes], List[Dict[str, Any]]]:
+        """Wait for the next message."""
+        return await self.queue.get()
+
+
+class FanoutHub:
+    """
+    In-process fan-out of bus channels to many local consumers.
+
+    Each channel has a single Redis subscription per process no matter how
+    many WebSocket clients are connected; every message is decoded once and
+    handed to each registered subscription's bounded queue. Subscriptions
+    with a filter are looked up through the channel's FilterIndex and only
+    receive the packets that match. Channels with history enabled also keep
+    their most recent packets for clients that backfill before going live.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        """
+        Args:
+            queue_size: Default per-subscription queue bound; messages for a
+                full queue are dropped for that subscriber only
+        """
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Dict[int, Subscription]] = {}
+        self._indexes: Dict[str, FilterIndex] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._history: Dict[str, PacketHistory] = {}
+        self._ids = itertools.count(1)
+        self.messages_received = 0
+        self.decode_errors = 0
+
+    def register(self, channel: str, maxsize: Optional[int] = None) -> Subscription:
+        """
+        Register a consumer for a channel, starting the channel's subscriber if needed.
+
+        Args:
+            channel: Bus channel name
+            maxsize: Queue bound for this subscription (defaults to the hub's)
+
+        Returns:
+            The subscription; pass it to `unregister` when done
+        """
+        subscription = Subscription(channel, next(self._ids), maxsize or self.queue_size)
+        self._subscriptions.setdefault(channel, {})[subscription.id] = subscription
+        self._indexes.setdefault(channel, FilterIndex()).add(subscription.id)
+        self._ensure_running(channel)
+        return subscription
+    
+    def enable_history(self, channel: str, capacity: int):
+        """
+        Keep the channel's most recent packets, subscribing to it right away.
+        
+        Args:
+            channel: Bus channel name
+            capacity: Number of packets kept
+        """
+        if channel not in self._history:
+            self._history[channel] = PacketHistory(capacity)
+        self._ensure_running(channel)
+    
+    def history(self, channel: str) -> Optional[PacketHistory]:
+        """
+        The channel's packet history, if enabled.
+        
+        Reading it and calling `register` without awaiting in between
+        splits the stream exactly: every packet is either in the history
+        or queued for the new subscription, never both.
+        """
+        return self._history.get(channel)
+    
+    def _ensure_running(self, channel: str):
+        task = self._tasks.get(channel)
+        if not task or task.done():
+            self._tasks[channel] = asyncio.create_task(self._run(channel))
+
+    def unregister(self, subscription: Subscription):
+        """Remove a subscription; the channel's subscriber keeps running for later clients."""
+        self._subscriptions.get(subscription.channel, {}).pop(subscription.id, None)
+        self._indexes.get(subscription.channel, FilterIndex()).remove(subscription.id)
+    
+    def set_filter(self, subscription: Subscription, live_filter: Optional[LiveFilter]):
+        """
+        Replace a subscription's filter; None delivers every packet again.
+        
+        Args:
+            subscription: Registered subscription
+            live_filter: Validated filter, compiled once here
+        """
+        if subscription.id in self._subscriptions.get(subscription.channel, {}):
+            self._indexes[subscription.channel].add(subscription.id, live_filter)
+
+    async def _run(self, channel: str):
+        """Keep one subscription to the channel open, resubscribing after failures."""
+        while True:
+            await message_queue.subscribe_to_channel(channel, lambda payload: self._dispatch(channel, payload), raw=True)
+            # subscribe_to_channel returns when the bus switches transport or the connection drops
+            await asyncio.sleep(1)
+
+    async def _dispatch(self, channel: str, payload: Any):
+        """Decode a payload once and queue it for every subscriber of the channel."""
+        self.messages_received += 1
+        if not isinstance(payload, (bytes, str)):
+            # The in-process bus hands over the original object
+            item = (None, [payload])
+        else:
+            try:
+                item = (payload, unpack_messages(detect_codec(payload).decode(payload)))
+            except ValueError as e:
+                self.decode_errors += 1
+                logger.error(f"Failed to decode message on {channel}: {e}")
+                return
+        history = self._history.get(channel)
+        if history is not None:
+            history.extend(item[1])
+        subscriptions = self._subscriptions.get(channel, {})
+        index = self._indexes.get(channel)
+        if not index:
+            return
+        deliveries = [(subscriptions[subscription_id], item) for subscription_id in index.unfiltered]
+        if index.has_filters():
+            matched: Dict[int, List[Dict[str, Any]]] = {}
+            for packet in item[1]:
+                for subscription_id in index.match(packet):
+                    matched.setdefault(subscription_id, []).append(packet)
+            deliveries.extend((subscriptions[subscription_id], (None, packets)) for subscription_id, packets in matched.items())
+        for subscription, delivery in deliveries:
+            try:
+                subscription.queue.put_nowait(delivery)
+            except asyncio.QueueFull:
+                subscription.dropped += 1
+
+    async def close(self):
+        """Stop every channel subscriber."""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-channel subscriber counts and drop totals."""
+        return {
+            "messages_received": self.messages_received,
+            "decode_errors": self.decode_errors,
+            "channels": {
+                channel: {
+                    "subscribers": len(subscriptions),
+                    "filtered": len(subscriptions) - len(self._indexes[channel].unfiltered),
+                    "dropped": sum(subscription.dropped for subscription in subscriptions.values())
+                }
+                for channel, subscriptions in self._subscriptions.items()
+            }
+        }
+
+
+# Global instance
+fanout_hub = FanoutHub(queue_size=settings.WS_CLIENT_QUEUE_SIZE)
@@ -0,0 +1,320 @@
+# src/backend/services/firewall.py
+
+import asyncio
+import ipaddress
+import json
+import logging
+import subprocess
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds around an element's expiry during which the kernel may or may not still hold it
+EXPIRY_MARGIN_SECONDS = 1.0
+
+# Runs argv with stdin text and returns (exit code, stdout, stderr)
+CommandRunner = Callable[[List[str], Optional[str]], Tuple[int, str, str]]
+
+
+def run_command(argv: List[str], stdin: Optional[str] = None) -> Tuple[int, str, str]:
+    """Run a command without a shell."""
+    result = subprocess.run(argv, input=stdin, capture_output=True, text=True, timeout=30)
+    return result.returncode, result.stdout, result.stderr
+
+
+def parse_set_elements(listing: str, now: float) -> Dict[str, Optional[float]]:
+    """
+    Read the elements of `nft -j list set` output.
+
+    Returns:
+        Address to expiry time (Unix seconds), None for elements without a timeout
+    """
+    elements: Dict[str, Optional[float]] = {}
+    for item in json.loads(listing).get("nftables", []):
+        for element in item.get("set", {}).get("elem", []):
+            if isinstance(element, dict) and "elem" in element:
+                detail = element["elem"]
+                expires = detail.get("expires")
+                elements[str(detail["val"])] = now + expires if expires is not None else None
+            else:
+                elements[str(element)] = None
+    return elements
+
+
+class FirewallManager:
+    """
+    Blocklist kept in nftables sets instead of one iptables rule per address.
+
+    Blocked IPv4 and IPv6 addresses live in two hash sets of the table
+    `table`, matched by one rule each, so lookup cost does not grow with the
+    blocklist. Every block or unblock call is rendered into one nft script
+    and applied with a single `nft -f -`, which the kernel commits
+    atomically. Addresses blocked with a TTL carry an element timeout and
+    are expired by the kernel itself.
+
+    The kernel's sets are the source of truth: every batch and every
+    listing re-reads them first, so changes made by other workers (or by
+    hand) are seen. A batch that fails because the sets changed between
+    the read and the commit is re-read and retried once.
+
+    In dry-run mode scripts are only rendered (and the in-memory state
+    updated as if they had been applied), so the ruleset can be tested
+    without root.
+    """
+
+    def __init__(
+        self,
+        table: str = "netverse",
+        dry_run: bool = False,
+        use_sudo: bool = True,
+        runner: CommandRunner = run_command,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            table: Name of the inet table holding the sets and the input chain
+            dry_run: Render scripts without running nft
+            use_sudo: Prefix nft commands with sudo
+            runner: Runs a command (blocking; run in a thread)
+            clock: Current Unix time
+        """
+        self.table = table
+        self.dry_run = dry_run
+        self.prefix = ["sudo", "-n"] if use_sudo else []
+        self.runner = runner
+        self.clock = clock
+        # Address -> expiry (Unix seconds), None if permanent; as last read from the kernel
+        self._blocked: Dict[str, Optional[float]] = {}
+        self._ready = False
+        self._lock = asyncio.Lock()
+        self.last_script: Optional[str] = None
+        self.batches_applied = 0
+        self.failures = 0
+
+    @staticmethod
+    def _set_name(address: str) -> str:
+        return "blocked_v6" if ":" in address else "blocked_v4"
+
+    def render_setup(self) -> str:
+        """Script creating the table, sets and input chain; existing set elements are kept."""
+        table = f"inet {self.table}"
+        return "\n".join([
+            f"add table {table}",
+            f"add set {table} blocked_v4 {{ type ipv4_addr; flags timeout; }}",
+            f"add set {table} blocked_v6 {{ type ipv6_addr; flags timeout; }}",
+            f"add chain {table} input {{ type filter hook input priority -10; policy accept; }}",
+            # Rules are recreated so that reruns never duplicate them
+            f"flush chain {table} input",
+            f"add rule {table} input ip saddr @blocked_v4 drop",
+            f"add rule {table} input ip6 saddr @blocked_v6 drop",
+        ]) + "\n"
+
+    def render_update(self, add: Dict[str, Optional[int]], delete: Iterable[str]) -> str:
+        """
+        Script applying one batch of changes.
+
+        Args:
+            add: Address to TTL in seconds (None for no expiry)
+            delete: Addresses to remove; they must be in the set
+
+        Returns:
+            nft script, deletions first
+        """
+        lines = []
+        grouped_delete: Dict[str, List[str]] = {}
+        for address in delete:
+            grouped_delete.setdefault(self._set_name(address), []).append(address)
+        for name, addresses in sorted(grouped_delete.items()):
+            lines.append(f"delete element inet {self.table} {name} {{ {', '.join(addresses)} }}")
+        grouped_add: Dict[str, List[str]] = {}
+        for address, ttl in add.items():
+            grouped_add.setdefault(self._set_name(address), []).append(f"{address} timeout {ttl}s" if ttl else address)
+        for name, elements in sorted(grouped_add.items()):
+            lines.append(f"add element inet {self.table} {name} {{ {', '.join(elements)} }}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    @staticmethod
+    def normalize(addresses: Iterable[str]) -> List[str]:
+        """
+        Validate and canonicalize addresses, dropping duplicates.
+
+        Raises:
+            ValueError: For anything that is not a single IPv4 or IPv6 address
+        """
+        return list(dict.fromkeys(str(ipaddress.ip_address(str(address))) for address in addresses))
+
+    def _prune(self, now: float):
+        expired = [address for address, expires in self._blocked.items() if expires is not None and expires <= now]
+        for address in expired:
+            del self._blocked[address]
+
+    async def _run(self, argv: List[str], stdin: Optional[str] = None) -> Tuple[bool, str]:
+        code, stdout, stderr = await asyncio.to_thread(self.runner, self.prefix + argv, stdin)
+        if code != 0:
+            return False, stderr.strip() or stdout.strip()
+        return True, stdout
+
+    async def _ensure_ready(self) -> Optional[str]:
+        """Create the table on first use; returns an error or None."""
+        if self._ready:
+            return None
+        if not self.dry_run:
+            ok, output = await self._run(["nft", "-f", "-"], self.render_setup())
+            if not ok:
+                return output
+        self._ready = True
+        return None
+
+    async def _load(self) -> Optional[str]:
+        """Replace the in-memory state with the kernel's set elements; returns an error or None."""
+        if self.dry_run:
+            return None
+        now = self.clock()
+        blocked: Dict[str, Optional[float]] = {}
+        for name in ("blocked_v4", "blocked_v6"):
+            ok, output = await self._run(["nft", "-j", "list", "set", "inet", self.table, name])
+            if not ok:
+                return output
+            blocked.update(parse_set_elements(output, now))
+        self._blocked = blocked
+        return None
+
+    async def _settle(self, addresses: Iterable[str]):
+        """Wait out expiries so close that the kernel and our state could disagree."""
+        now = self.clock()
+        pending = [
+            expires - now for address in addresses
+            if (expires := self._blocked.get(address)) is not None and now < expires <= now + EXPIRY_MARGIN_SECONDS
+        ]
+        if pending:
+            await asyncio.sleep(max(pending) + 0.05)
+
+    async def apply(
+        self,
+        block: Iterable[str] = (),
+        unblock: Iterable[str] = (),
+        ttl: Optional[int] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Block and unblock addresses in one atomic batch.
+
+        Blocking an address that is already blocked replaces its TTL;
+        unblocking one that is not blocked is a no-op.
+
+        Args:
+            block: Addresses to block
+            unblock: Addresses to unblock
+            ttl: Seconds until the blocked addresses expire (None for never)
+            dry_run: Only render the script; nothing is run or recorded
+
+        Returns:
+            {"applied": bool, "script": str, "blocked": n, "unblocked": n, "error": str|None}
+
+        Raises:
+            ValueError: For invalid addresses
+        """
+        to_block, to_unblock = self.normalize(block), self.normalize(unblock)
+        async with self._lock:
+            setup_pending = not self._ready
+            error = None if dry_run else await self._ensure_ready()
+            if error:
+                self.failures += 1
+                logger.error(f"Failed to set up nftables table {self.table}: {error}")
+                return {"applied": False, "script": self.render_setup(), "blocked": 0, "unblocked": 0, "error": error}
+            result = await self._apply_batch(to_block, to_unblock, ttl, dry_run, setup_pending)
+            if result["error"] and not (dry_run or self.dry_run):
+                # Another worker may have changed the sets since they were read
+                result = await self._apply_batch(to_block, to_unblock, ttl, dry_run, setup_pending)
+            if result["error"]:
+                self.failures += 1
+                logger.error(f"nft batch failed: {result['error']}")
+            return result
+
+    async def _apply_batch(
+        self,
+        to_block: List[str],
+        to_unblock: List[str],
+        ttl: Optional[int],
+        dry_run: bool,
+        setup_pending: bool
+    ) -> Dict[str, Any]:
+        """Read the sets, then render and run one batch; the caller holds the lock."""
+        # A dry run before setup has no table to read; it renders against an empty one
+        error = await self._load() if self._ready else None
+        if error:
+            return {"applied": False, "script": "", "blocked": 0, "unblocked": 0, "error": error}
+        await self._settle(to_block + to_unblock)
+        now = self.clock()
+        self._prune(now)
+        # nft cannot refresh an element's timeout in place, so re-blocked addresses are deleted first
+        delete = [address for address in to_block + to_unblock if address in self._blocked]
+        add = {address: ttl for address in to_block}
+        script = self.render_update(add, dict.fromkeys(delete))
+        if setup_pending and (dry_run or self.dry_run):
+            # Rendered scripts show the complete ruleset a fresh host would get
+            script = self.render_setup() + script
+        result = {
+            "applied": False,
+            "script": script,
+            "blocked": len(add),
+            "unblocked": len([address for address in to_unblock if address in self._blocked]),
+            "error": None,
+        }
+        if dry_run:
+            return result
+        if not (add or delete):
+            return {**result, "applied": True}
+        self.last_script = script
+        if not self.dry_run:
+            ok, output = await self._run(["nft", "-f", "-"], script)
+            if not ok:
+                return {**result, "error": output}
+        for address in to_unblock:
+            self._blocked.pop(address, None)
+        for address in to_block:
+            self._blocked[address] = now + ttl if ttl else None
+        self.batches_applied += 1
+        return {**result, "applied": True}
+
+    async def block(self, addresses: Iterable[str], ttl: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Block addresses, optionally for `ttl` seconds; see `apply`."""
+        return await self.apply(block=addresses, ttl=ttl, dry_run=dry_run)
+
+    async def unblock(self, addresses: Iterable[str], dry_run: bool = False) -> Dict[str, Any]:
+        """Unblock addresses; see `apply`."""
+        return await self.apply(unblock=addresses, dry_run=dry_run)
+
+    async def list_blocked(self) -> List[Dict[str, Any]]:
+        """Currently blocked addresses with their expiry, as read from the kernel."""
+        async with self._lock:
+            error = await self._ensure_ready() or await self._load()
+        if error:
+            logger.error(f"Failed to list nftables sets of {self.table}: {error}")
+            return []
+        self._prune(self.clock())
+        return [
+            {"ip": address, "expires_at": expires}
+            for address, expires in sorted(self._blocked.items())
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get blocklist size and batch counters."""
+        return {
+            "table": self.table,
+            "dry_run": self.dry_run,
+            "blocked": len(self._blocked),
+            "batches_applied": self.batches_applied,
+            "failures": self.failures,
+        }
+
+
+# Global instance
+firewall = FirewallManager(
+    table=settings.FIREWALL_TABLE,
+    dry_run=settings.FIREWALL_DRY_RUN,
+    use_sudo=settings.FIREWALL_USE_SUDO
+)
@@ -0,0 +1,283 @@
+# src/backend/services/flux_query.py
+
+import ipaddress
+import re
+from typing import List, Optional
+
+from services.line_protocol import LEGACY_MEASUREMENT, COMPACT_MEASUREMENT
+from services.log_query import NetworkLogFilter, RELATIVE_TIME_PATTERN, GROUPABLE_COLUMNS, parse_time
+
+# Columns that are tags in every schema, so they can be filtered and grouped before the pivot
+TAG_COLUMNS = ("protocol", "direction")
+
+AGGREGATE_FUNCTIONS = {"packets": "count", "bytes": "sum"}
+
+WINDOW_PATTERN = re.compile(r"^\d+(s|m|h|d|w)$")
+
+
+def flux_string(value) -> str:
+    """Render a value as a Flux string literal, escaping quotes, backslashes and interpolation."""
+    escaped = (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("${", "\\${")
+        .replace("\n", "\\n")
+    )
+    return f'"{escaped}"'
+
+
+def flux_time(value: str) -> str:
+    """Render an ISO timestamp or relative offset (e.g. -1h) as a Flux time expression."""
+    if RELATIVE_TIME_PATTERN.match(value):
+        return value
+    return f"time(v: {flux_string(parse_time(value).strftime('%Y-%m-%dT%H:%M:%S.%fZ'))})"
+
+
+def ipv4_cidr_regex(cidr: str) -> str:
+    """
+    Build an anchored regex matching dotted-quad addresses inside an IPv4 network.
+
+    Flux has no CIDR functions, so the partially-masked octet is expanded
+    into an alternation of its possible values.
+    """
+    network = ipaddress.ip_network(cidr, strict=False)
+    if network.version != 4:
+        if network.prefixlen == network.max_prefixlen:
+            return "^" + str(network.network_address).replace(".", r"\.") + "$"
+        raise ValueError("IPv6 CIDR filters are not supported by the InfluxDB backend")
+    octets = str(network.network_address).split(".")
+    full, partial = divmod(network.prefixlen, 8)
+    parts = octets[:full]
+    if partial:
+        low = int(octets[full])
+        high = low + 2 ** (8 - partial) - 1
+        parts.append("(?:" + "|".join(str(n) for n in range(low, high + 1)) + ")")
+    parts += [r"\d{1,3}"] * (4 - len(parts))
+    return "^" + r"\.".join(parts) + "$"
+
+
+def check_filter_supported(filters: NetworkLogFilter):
+    """
+    Reject filters the Flux queries cannot express.
+
+    Raises:
+        ValueError: For IPv6 networks other than single addresses
+    """
+    for cidr in (filters.source_cidr, filters.dest_cidr, filters.cidr):
+        if cidr:
+            ipv4_cidr_regex(cidr)
+
+
+def _indicator_predicate(indicator: str) -> str:
+    # Compact rows carry a comma-joined field; legacy rows only have the raw_data JSON blob
+    return (
+        f'((exists r.threat_indicators and r.threat_indicators =~ /(^|,){indicator}(,|$)/) or '
+        f'(exists r.raw_data and r.raw_data =~ /"threat_indicators": \\[[^\\]]*"{indicator}"/))'
+    )
+
+
+def row_predicates(filters: NetworkLogFilter) -> List[str]:
+    """Predicates evaluated on pivoted rows (IPs and ports may be fields or tags)."""
+    predicates = []
+    if filters.source_ip:
+        predicates.append(f"r.source_ip == {flux_string(filters.source_ip)}")
+    if filters.dest_ip:
+        predicates.append(f"r.dest_ip == {flux_string(filters.dest_ip)}")
+    if filters.ip:
+        ip = flux_string(filters.ip)
+        predicates.append(f"(r.source_ip == {ip} or r.dest_ip == {ip})")
+    if filters.source_port is not None:
+        predicates.append(f"r.source_port == {filters.source_port}")
+    if filters.dest_port is not None:
+        predicates.append(f"r.dest_port == {filters.dest_port}")
+    if filters.port is not None:
+        predicates.append(f"(r.source_port == {filters.port} or r.dest_port == {filters.port})")
+    if filters.source_cidr:
+        predicates.append(f"r.source_ip =~ /{ipv4_cidr_regex(filters.source_cidr)}/")
+    if filters.dest_cidr:
+        predicates.append(f"r.dest_ip =~ /{ipv4_cidr_regex(filters.dest_cidr)}/")
+    if filters.cidr:
+        pattern = ipv4_cidr_regex(filters.cidr)
+        predicates.append(f"(r.source_ip =~ /{pattern}/ or r.dest_ip =~ /{pattern}/)")
+    for indicator in filters.indicators:
+        predicates.append(_indicator_predicate(indicator))
+    return predicates
+
+
+def _source(bucket: str, filters: NetworkLogFilter, measurements: Optional[List[str]] = None) -> List[str]:
+    """from/range/measurement/tag filters shared by every network log query."""
+    measurements = measurements or [LEGACY_MEASUREMENT, COMPACT_MEASUREMENT]
+    start = flux_time(filters.start_time) if filters.start_time else "-1h"
+    stop = f", stop: {flux_time(filters.end_time)}" if filters.end_time else ""
+    measurement_predicate = " or ".join(f"r._measurement == {flux_string(m)}" for m in measurements)
+    lines = [
+        f"from(bucket: {flux_string(bucket)})",
+        f"|> range(start: {start}{stop})",
+        f"|> filter(fn: (r) => {measurement_predicate})",
+    ]
+    if filters.protocol:
+        lines.append(f"|> filter(fn: (r) => r.protocol == {flux_string(filters.protocol)})")
+    return lines
+
+
+def _pivoted(bucket: str, filters: NetworkLogFilter, fields: Optional[List[str]] = None) -> List[str]:
+    """Source lines plus pivot and row-level filters, optionally reading only `fields`."""
+    lines = _source(bucket, filters)
+    if fields:
+        field_set = ", ".join(flux_string(field) for field in fields)
+        lines.append(f"|> filter(fn: (r) => contains(value: r._field, set: [{field_set}]))")
+    elif not filters.indicators:
+        # raw_data is only needed to match indicators on legacy rows
+        lines.append('|> filter(fn: (r) => r._field != "raw_data")')
+    lines.append('|> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")')
+    predicates = row_predicates(filters)
+    if predicates:
+        lines.append(f"|> filter(fn: (r) => {' and '.join(predicates)})")
+    return lines
+
+
+def build_network_logs_query(bucket: str, filters: NetworkLogFilter, limit: int) -> str:
+    """
+    Build a query returning the latest `limit` matching logs, newest first.
+
+    Each series is trimmed to its own latest rows before the tables are
+    merged, so the final sort only sees at most limit * series rows.
+    """
+    lines = _pivoted(bucket, filters)
+    lines += [
+        '|> drop(fn: (column) => column == "raw_data")' if filters.indicators else None,
+        f'|> top(n: {limit}, columns: ["_time"])',
+        "|> group()",
+        f'|> top(n: {limit}, columns: ["_time"])',
+    ]
+    return "\n    ".join(line for line in lines if line)
+
+
+def build_export_query(bucket: str, filters: NetworkLogFilter) -> str:
+    """
+    Build a query returning every matching log in ascending time order.
+
+    Ties on _time are broken by the remaining identifying columns so the
+    order is stable across requests, which cursor resumption relies on.
+    """
+    lines = _pivoted(bucket, filters)
+    lines += [
+        '|> drop(fn: (column) => column == "raw_data")' if filters.indicators else None,
+        "|> group()",
+        '|> sort(columns: ["_time", "source_ip", "dest_ip", "source_port", "dest_port"])',
+    ]
+    return "\n    ".join(line for line in lines if line)
+
+
+def build_rollup_query(
+    bucket: str,
+    start: str,
+    stop: str,
+    dimension: str,
+    grouped: bool = True,
+    every: Optional[str] = None,
+    metric: str = "packets",
+    top: Optional[int] = None
+) -> str:
+    """
+    Build an aggregation over traffic_rollup records in a rollup tier bucket.
+
+    Args:
+        bucket: Rollup tier bucket
+        start: Inclusive ISO start time (aligned to the tier)
+        stop: Exclusive ISO stop time (aligned to the tier)
+        dimension: Rollup dimension to read (protocol, dest_port, source_ip, dest_ip)
+        grouped: Group by the dimension's key; False sums everything (use "protocol" for totals)
+        every: Window duration for a time series, or None for totals
+        metric: "packets" or "bytes"
+        top: Keep only the N largest groups (totals only)
+
+    The result has a `_value` column, plus `key` and `_time` where applicable.
+    Keys are read from the `key` field (older records carry it as a tag).
+    Points of different workers (the `worker` tag) are summed like any other.
+    """
+    if metric not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Unknown metric {metric}")
+    if every and not WINDOW_PATTERN.match(every):
+        raise ValueError(f"Invalid interval {every}")
+    group_columns = '["key"]' if grouped else "[]"
+    lines = [
+        f"from(bucket: {flux_string(bucket)})",
+        f"|> range(start: {flux_time(start)}, stop: {flux_time(stop)})",
+        f'|> filter(fn: (r) => r._measurement == "traffic_rollup" and r.dimension == {flux_string(dimension)} '
+        f'and (r._field == {flux_string(metric)} or r._field == "key"))',
+        '|> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")',
+        f"|> map(fn: (r) => ({{_start: r._start, _stop: r._stop, _time: r._time, key: r.key, _value: r.{metric}}}))",
+        f"|> group(columns: {group_columns})",
+        f"|> aggregateWindow(every: {every}, fn: sum, createEmpty: false)" if every else "|> sum()",
+        "|> group()",
+    ]
+    if every:
+        lines.append('|> sort(columns: ["_time"])')
+    elif top:
+        lines.append(f'|> top(n: {top}, columns: ["_value"])')
+    return "\n    ".join(lines)
+
+
+def build_aggregate_query(
+    bucket: str,
+    filters: NetworkLogFilter,
+    group_by: Optional[str] = None,
+    every: Optional[str] = None,
+    metric: str = "packets",
+    top: Optional[int] = None,
+    exclude_zero: bool = False
+) -> str:
+    """
+    Build a server-side aggregation over network logs.
+
+    Args:
+        bucket: Bucket to read from
+        filters: Which logs to include
+        group_by: Column to group by, or None for a grand total
+        every: Window duration (e.g. "1m") for a time series, or None for totals
+        metric: "packets" (row count) or "bytes" (sum of length)
+        top: Keep only the N largest groups (totals only)
+        exclude_zero: Skip rows where the group_by column is 0 (e.g. portless ICMP)
+
+    The result always has a `_value` column, plus `group_by` and `_time`
+    (window stop) where applicable.
+    """
+    if group_by is not None and group_by not in GROUPABLE_COLUMNS:
+        raise ValueError(f"Cannot group by {group_by}")
+    if metric not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Unknown metric {metric}")
+    if every and not WINDOW_PATTERN.match(every):
+        raise ValueError(f"Invalid interval {every}")
+    fn = AGGREGATE_FUNCTIONS[metric]
+    group_columns = f'["{group_by}"]' if group_by else "[]"
+
+    if not row_predicates(filters) and (group_by is None or group_by in TAG_COLUMNS):
+        # Everything needed is a tag: aggregate the length field directly, no pivot
+        lines = _source(bucket, filters) + ['|> filter(fn: (r) => r._field == "length")']
+        value_column = "_value"
+    else:
+        fields = ["length", "source_ip", "dest_ip", "source_port", "dest_port"]
+        if filters.indicators:
+            fields += ["threat_indicators", "raw_data"]
+        lines = _pivoted(bucket, filters, fields)
+        value_column = "length"
+    if exclude_zero and group_by:
+        lines.append(f"|> filter(fn: (r) => r.{group_by} != 0)")
+
+    lines.append(f"|> group(columns: {group_columns})")
+    if every:
+        lines.append(
+            f'|> aggregateWindow(every: {every}, fn: {fn}, column: "{value_column}", createEmpty: false)'
+        )
+    else:
+        lines.append(f'|> {fn}(column: "{value_column}")')
+    if value_column != "_value":
+        lines.append(f'|> rename(columns: {{{value_column}: "_value"}})')
+    lines.append("|> group()")
+    if every:
+        lines.append('|> sort(columns: ["_time"])')
+    elif top:
+        lines.append(f'|> top(n: {top}, columns: ["_value"])')
+    return "\n    ".join(lines)
@@ -0,0 +1,319 @@
+# src/backend/services/influx_writer.py
+
+import queue
+import random
+import threading
+import time
+import logging
+from typing import Callable, List, Dict, Any, Optional
+
+from services.metrics import Histogram, LATENCY_MS_BUCKETS, BATCH_SIZE_BUCKETS
+from services.spool import WriteAheadSpool
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchingWriter:
+    """
+    Background writer that groups line protocol records into batches.
+
+    Records are queued without blocking the caller and flushed from a
+    dedicated thread whenever `batch_size` records are pending or
+    `flush_interval` seconds have passed since the first pending record.
+
+    With a spool attached, batches that cannot be written (database down,
+    or the queue backing up past its high watermark) are appended to disk
+    instead of being dropped, and replayed in large batches on recovery.
+    Records that overflow the queue are spooled from a separate thread, so
+    `submit` never touches the disk.
+    """
+
+    def __init__(
+        self,
+        write_fn: Callable[[List[str]], None],
+        batch_size: int = 5000,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 100000,
+        max_retries: int = 5,
+        retry_backoff: float = 0.2,
+        name: str = "influx-writer",
+        spool: Optional[WriteAheadSpool] = None,
+        replay_batch_size: int = 10000,
+        replay_interval: float = 5.0,
+        is_retryable: Callable[[Exception], bool] = lambda e: True
+    ):
+        """
+        Args:
+            write_fn: Callable that sends a batch of lines, raising on failure
+            batch_size: Maximum number of records per batch
+            flush_interval: Maximum seconds a record waits before being flushed
+            max_queue_size: Maximum number of queued records before dropping
+            max_retries: Retries per batch before it is given up
+            retry_backoff: Base delay in seconds for exponential backoff
+            name: Name of the background thread
+            spool: Optional on-disk spool for outages and backpressure
+            replay_batch_size: Records per write when draining the spool
+            replay_interval: Seconds between replay attempts while degraded
+            is_retryable: Returns False for errors where retrying cannot help
+        """
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.name = name
+        self.spool = spool
+        self.replay_batch_size = replay_batch_size
+        self.replay_interval = replay_interval
+        self.is_retryable = is_retryable
+        self.high_watermark = int(max_queue_size * 0.8)
+        self.degraded = False
+        self._rejected = False
+        self._next_replay_at = 0.0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._flush_requested = threading.Event()
+        # Records that overflowed the queue, waiting for the spool thread
+        self.max_overflow = max_queue_size
+        self._overflow: List[str] = []
+        self._overflow_lock = threading.Lock()
+        self._overflow_ready = threading.Condition(self._overflow_lock)
+        self._overflow_busy = False
+        self._spool_thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.flush_latency_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.records_written = 0
+        self.records_dropped = 0
+        self.failed_batches = 0
+        self.retries = 0
+
+    def start(self):
+        """Start the background flush thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        if self.spool:
+            self._stopping = False
+            self._spool_thread = threading.Thread(target=self._run_spooler, name=f"{self.name}-spool", daemon=True)
+            self._spool_thread.start()
+
+    def submit(self, line: str) -> bool:
+        """
+        Queue a line protocol record for writing.
+
+        Returns:
+            bool: True if queued or spooled, False if the record was dropped
+        """
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            if self.spool:
+                with self._overflow_lock:
+                    if len(self._overflow) < self.max_overflow:
+                        self._overflow.append(line)
+                        self._overflow_ready.notify()
+                        return True
+            self.records_dropped += 1
+            return False
+
+    def flush(self):
+        """Ask the background thread to flush pending records now."""
+        self._flush_requested.set()
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """
+        Flush and wait until every record queued so far is written, spooled or dropped.
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks or self._overflow or self._overflow_busy:
+            if time.monotonic() >= deadline:
+                return False
+            self.flush()
+            time.sleep(0.005)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Flush pending records and stop the background thread."""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        if self._spool_thread:
+            with self._overflow_lock:
+                self._stopping = True
+                self._overflow_ready.notify()
+            self._spool_thread.join(timeout)
+            self._spool_thread = None
+        if self.spool:
+            self.spool.close()
+
+    def _run_spooler(self):
+        """Append records that overflowed the queue to the spool until stopped."""
+        while True:
+            with self._overflow_lock:
+                while not self._overflow and not self._stopping:
+                    self._overflow_ready.wait()
+                if not self._overflow:
+                    return
+                lines, self._overflow = self._overflow, []
+                self._overflow_busy = True
+            try:
+                self._spool(lines)
+            finally:
+                with self._overflow_lock:
+                    self._overflow_busy = False
+
+    def _run(self):
+        """Collect records into batches and flush them until stopped."""
+        batch: List[str] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.spool and self.spool.has_pending():
+                replay_wait = max(0.0, self._next_replay_at - time.monotonic())
+                timeout = replay_wait if timeout is None else min(timeout, replay_wait)
+            if self._flush_requested.is_set():
+                timeout = 0.0
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                self._task_done(len(batch) + 1)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if len(batch) >= self.batch_size or (batch and (due or item is None)):
+                self._flush(batch)
+                self._task_done(len(batch))
+                batch = []
+                deadline = None
+            if item is None:
+                self._flush_requested.clear()
+            self._maybe_replay()
+
+    def _task_done(self, count: int):
+        """Mark queued records as handled, for drain()."""
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _spool(self, batch: List[str]) -> bool:
+        """Append a batch to the on-disk spool."""
+        try:
+            self.spool.append(batch)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to spool {len(batch)} records: {e}")
+            self.records_dropped += len(batch)
+            return False
+
+    def _flush(self, batch: List[str]) -> bool:
+        """Write a batch, spooling it while degraded or backed up."""
+        if not batch:
+            return True
+        if self.spool and (self.degraded or self._queue.qsize() >= self.high_watermark):
+            return self._spool(batch)
+        if self._write_with_retries(batch):
+            return True
+        if self.spool and not self._rejected:
+            self.degraded = True
+            self._next_replay_at = time.monotonic() + self.replay_interval
+            logger.warning("Database writes failing, spooling to disk until it recovers")
+            return self._spool(batch)
+        self.records_dropped += len(batch)
+        return False
+
+    def _maybe_replay(self):
+        """Drain the oldest spool segment when live traffic allows it."""
+        if not self.spool or not self.spool.has_pending():
+            return
+        if time.monotonic() < self._next_replay_at or self._queue.qsize() > self.batch_size:
+            return
+        try:
+            segment = self.spool.read_oldest()
+        except OSError as e:
+            logger.error(f"Failed to read spool segment for replay: {e}")
+            self.spool.discard_replaying()
+            return
+        if not segment:
+            return
+        path, lines = segment
+        try:
+            for start in range(0, len(lines), self.replay_batch_size):
+                self._timed_write(lines[start:start + self.replay_batch_size])
+        except Exception as e:
+            if self.is_retryable(e):
+                self.degraded = True
+                self._next_replay_at = time.monotonic() + self.replay_interval
+                return
+            logger.error(f"Discarding spool segment rejected by the database: {e}")
+            lines = []
+        self.spool.commit(path, len(lines))
+        if self.degraded:
+            logger.info("Database writes recovered, replaying spool")
+        self.degraded = False
+
+    def _timed_write(self, batch: List[str]):
+        """Write a batch once, recording latency and size metrics."""
+        started = time.perf_counter()
+        self.write_fn(batch)
+        self.flush_latency_ms.observe((time.perf_counter() - started) * 1000)
+        self.batch_sizes.observe(len(batch))
+        self.records_written += len(batch)
+
+    def _write_with_retries(self, batch: List[str]) -> bool:
+        """Write a batch, retrying with exponential backoff and jitter."""
+        self._rejected = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._timed_write(batch)
+                return True
+            except Exception as e:
+                if not self.is_retryable(e):
+                    logger.error(f"Database rejected batch of {len(batch)} records: {e}")
+                    self._rejected = True
+                    break
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to write batch of {len(batch)} records: {e}")
+                    break
+                self.retries += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+        self.failed_batches += 1
+        return False
+
+    def max_write_delay(self) -> float:
+        """Longest a record can wait before its write succeeds or is given up: a flush interval plus every retry's backoff and jitter."""
+        return self.flush_interval + sum(1.5 * self.retry_backoff * 2 ** attempt for attempt in range(self.max_retries))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer throughput, latency and batch-size metrics."""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "overflow_depth": len(self._overflow),
+            "degraded": self.degraded,
+            "records_written": self.records_written,
+            "records_dropped": self.records_dropped,
+            "failed_batches": self.failed_batches,
+            "retries": self.retries,
+            "flush_latency_ms": self.flush_latency_ms.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "spool": self.spool.get_stats() if self.spool else None,
+        }
@@ -0,0 +1,181 @@
+# src/backend/services/line_protocol.py
+
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+import ipaddress
+import json
+
+# Measurement names for the two selectable schemas
+LEGACY_MEASUREMENT = "network_traffic"
+COMPACT_MEASUREMENT = "network_traffic_v2"
+ENRICHMENT_MEASUREMENT = "ip_enrichment"
+
+# Escape tables defined by the InfluxDB line protocol reference
+_MEASUREMENT_ESCAPES = str.maketrans({",": r"\,", " ": r"\ ", "\n": r"\n"})
+_KEY_ESCAPES = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n"})
+_STRING_FIELD_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"'})
+
+
+def escape_measurement(value: str) -> str:
+    """Escape a measurement name."""
+    return value.translate(_MEASUREMENT_ESCAPES)
+
+
+def escape_key(value: str) -> str:
+    """Escape a tag key, tag value or field key."""
+    return value.translate(_KEY_ESCAPES)
+
+
+def format_field_value(value: Any) -> str:
+    """Format a Python value as a line protocol field value."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).translate(_STRING_FIELD_ESCAPES) + '"'
+
+
+def timestamp_us(value: Optional[str]) -> int:
+    """
+    Convert an ISO timestamp to epoch microseconds.
+    Naive timestamps are treated as UTC, matching influxdb_client's Point.
+    """
+    moment = datetime.fromisoformat(value) if value else datetime.now(timezone.utc)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    delta = moment - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def classify_direction(source_ip: str, dest_ip: str) -> str:
+    """Classify traffic as inbound, outbound, internal or external from the sensor's point of view."""
+    try:
+        source_private = ipaddress.ip_address(source_ip).is_private
+        dest_private = ipaddress.ip_address(dest_ip).is_private
+    except ValueError:
+        return "unknown"
+    if source_private and dest_private:
+        return "internal"
+    if dest_private:
+        return "inbound"
+    if source_private:
+        return "outbound"
+    return "external"
+
+
+def encode_line(
+    measurement: str,
+    tags: Dict[str, Any],
+    fields: Dict[str, Any],
+    timestamp: int
+) -> str:
+    """
+    Serialize a single record to line protocol.
+
+    Tags with empty values and fields with None values are skipped,
+    and tags are sorted by key as recommended for write performance.
+    """
+    line = escape_measurement(measurement)
+    for key in sorted(tags):
+        value = tags[key]
+        if value is None or value == "":
+            continue
+        line += f",{escape_key(key)}={escape_key(str(value))}"
+    field_set = ",".join(
+        f"{escape_key(key)}={format_field_value(value)}"
+        for key, value in fields.items()
+        if value is not None
+    )
+    return f"{line} {field_set} {timestamp}"
+
+
+def encode_network_log(log_data: Dict[str, Any]) -> str:
+    """
+    Serialize a parsed packet to the legacy network_traffic record.
+
+    IPs are tags and the whole packet (including enrichment) is stored
+    as a JSON raw_data field.
+
+    Args:
+        log_data: Dictionary containing packet information
+
+    Returns:
+        str: One line of line protocol with microsecond precision
+    """
+    return encode_line(
+        LEGACY_MEASUREMENT,
+        tags={
+            "protocol": log_data.get("protocol", "unknown"),
+            "source_ip": log_data.get("source_ip", "unknown"),
+            "dest_ip": log_data.get("dest_ip", "unknown"),
+        },
+        fields={
+            "source_port": log_data.get("source_port", 0),
+            "dest_port": log_data.get("dest_port", 0),
+            "length": log_data.get("length", 0),
+            "summary": log_data.get("summary", ""),
+            "raw_data": json.dumps(log_data),
+        },
+        timestamp=timestamp_us(log_data.get("timestamp")),
+    )
+
+
+def encode_compact_network_log(log_data: Dict[str, Any], sensor: str) -> str:
+    """
+    Serialize a parsed packet to the low-cardinality network_traffic_v2 record.
+
+    Only protocol, direction and sensor are tags, so the series count stays
+    bounded no matter how many hosts are seen. IPs become fields and
+    enrichment is written separately, once per IP (see encode_ip_enrichment).
+
+    Args:
+        log_data: Dictionary containing packet information
+        sensor: Identifier of the capturing sensor
+
+    Returns:
+        str: One line of line protocol with microsecond precision
+    """
+    source_ip = log_data.get("source_ip", "unknown")
+    dest_ip = log_data.get("dest_ip", "unknown")
+    return encode_line(
+        COMPACT_MEASUREMENT,
+        tags={
+            "protocol": log_data.get("protocol", "unknown"),
+            "direction": classify_direction(source_ip, dest_ip),
+            "sensor": sensor,
+        },
+        fields={
+            "source_ip": source_ip,
+            "dest_ip": dest_ip,
+            "source_port": log_data.get("source_port", 0),
+            "dest_port": log_data.get("dest_port", 0),
+            "length": log_data.get("length", 0),
+            "summary": log_data.get("summary", ""),
+            "flags": ",".join(log_data.get("flags", [])) or None,
+            "threat_indicators": ",".join(log_data.get("threat_indicators", [])) or None,
+        },
+        timestamp=timestamp_us(log_data.get("timestamp")),
+    )
+
+
+def encode_ip_enrichment(ip: str, enrichment: Dict[str, Any], sensor: str, timestamp: int) -> str:
+    """
+    Serialize enrichment data for a single IP to the ip_enrichment record.
+
+    Args:
+        ip: The enriched IP address
+        enrichment: Enrichment dictionary from DataEnrichmentService
+        sensor: Identifier of the capturing sensor
+        timestamp: Epoch microseconds; must be unique per sensor to avoid overwrites
+
+    Returns:
+        str: One line of line protocol with microsecond precision
+    """
+    return encode_line(
+        ENRICHMENT_MEASUREMENT,
+        tags={"sensor": sensor},
+        fields={"ip": ip, "data": json.dumps(enrichment)},
+        timestamp=timestamp,
+    )
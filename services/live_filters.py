@@ -0,0 +1,224 @@
+# src/backend/services/live_filters.py
+
+import ipaddress
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from pydantic import Field, field_validator
+
+from services.log_query import NetworkLogFilter
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+class LiveFilter(NetworkLogFilter):
+    """
+    Filter a live stream client subscribes with.
+
+    Accepts the same fields as the REST log filter (time bounds are ignored)
+    plus multi-valued protocol and port lists and enrichment matches. Every
+    given condition must hold; list fields match if any value matches.
+    """
+    protocols: List[str] = Field(default_factory=list, description="Matches any of these protocols")
+    ports: List[int] = Field(default_factory=list, description="Matches any of these ports on either side")
+    enrichment: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Dotted enrichment path to value, e.g. {\"geoip.country\": \"US\"}, on either side"
+    )
+
+    @field_validator("protocols")
+    @classmethod
+    def _validate_protocols(cls, value: List[str]) -> List[str]:
+        for protocol in value:
+            if not re.fullmatch(r"[A-Za-z0-9_-]{1,16}", protocol):
+                raise ValueError(f"Invalid protocol: {protocol}")
+        return value
+
+    @field_validator("ports")
+    @classmethod
+    def _validate_ports(cls, value: List[int]) -> List[int]:
+        for port in value:
+            if not 0 <= port <= 65535:
+                raise ValueError(f"Invalid port: {port}")
+        return value
+
+    @field_validator("enrichment")
+    @classmethod
+    def _validate_enrichment(cls, value: Dict[str, str]) -> Dict[str, str]:
+        for path in value:
+            if not re.fullmatch(r"[a-z_]{1,32}(\.[a-z_]{1,32}){0,3}", path):
+                raise ValueError(f"Invalid enrichment field: {path}")
+        return value
+
+    def protocol_set(self) -> Set[str]:
+        """Upper-cased protocols this filter is restricted to (empty if unrestricted)."""
+        protocols = set(self.protocols) | ({self.protocol} if self.protocol else set())
+        return {protocol.upper() for protocol in protocols}
+
+    def port_set(self) -> Set[int]:
+        """Ports at least one of which a matching packet must use (empty if unrestricted)."""
+        # Every port condition must hold, so any one of them bounds the packet's ports
+        for port in (self.port, self.dest_port, self.source_port):
+            if port is not None:
+                return {port}
+        return set(self.ports)
+
+
+@lru_cache(maxsize=65536)
+def _address(value: Any):
+    try:
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+
+def _lookup(enrichment: Any, path: List[str]) -> Any:
+    for part in path:
+        if not isinstance(enrichment, dict):
+            return None
+        enrichment = enrichment.get(part)
+    return enrichment
+
+
+def packet_protocol(packet: Dict[str, Any]) -> str:
+    """Normalized protocol name of a packet ("TCP", "UDP", "6", ...)."""
+    return str(packet.get("protocol", "")).upper()
+
+
+def compile_filter(live_filter: LiveFilter) -> Predicate:
+    """
+    Turn a filter into a predicate over packet dicts.
+
+    All parsing (addresses, networks, sets) happens here once, so evaluating
+    the predicate per packet is only comparisons.
+
+    Args:
+        live_filter: Validated filter
+
+    Returns:
+        Function returning True if a packet matches
+    """
+    checks: List[Predicate] = []
+
+    protocols = live_filter.protocol_set()
+    if protocols:
+        checks.append(lambda packet: packet_protocol(packet) in protocols)
+
+    def address_check(field: Optional[str], value: Optional[str]):
+        if value:
+            address = ipaddress.ip_address(value)
+            sides = (field,) if field else ("source_ip", "dest_ip")
+            checks.append(lambda packet: any(_address(packet.get(side)) == address for side in sides))
+
+    address_check("source_ip", live_filter.source_ip)
+    address_check("dest_ip", live_filter.dest_ip)
+    address_check(None, live_filter.ip)
+
+    def network_check(field: Optional[str], value: Optional[str]):
+        if value:
+            network = ipaddress.ip_network(value, strict=False)
+            sides = (field,) if field else ("source_ip", "dest_ip")
+
+            def check(packet: Dict[str, Any]) -> bool:
+                for side in sides:
+                    address = _address(packet.get(side))
+                    if address is not None and address.version == network.version and address in network:
+                        return True
+                return False
+            checks.append(check)
+
+    network_check("source_ip", live_filter.source_cidr)
+    network_check("dest_ip", live_filter.dest_cidr)
+    network_check(None, live_filter.cidr)
+
+    if live_filter.source_port is not None:
+        checks.append(lambda packet: packet.get("source_port") == live_filter.source_port)
+    if live_filter.dest_port is not None:
+        checks.append(lambda packet: packet.get("dest_port") == live_filter.dest_port)
+    for ports in ({live_filter.port} if live_filter.port is not None else None, set(live_filter.ports) or None):
+        if ports:
+            checks.append(lambda packet, ports=ports: packet.get("source_port") in ports or packet.get("dest_port") in ports)
+
+    if live_filter.indicators:
+        required = set(live_filter.indicators)
+        checks.append(lambda packet: required.issubset(packet.get("threat_indicators") or ()))
+
+    for path, expected in live_filter.enrichment.items():
+        parts, wanted = path.split("."), expected.lower()
+        checks.append(lambda packet, parts=parts, wanted=wanted: any(
+            str(_lookup(packet.get(side), parts)).lower() == wanted
+            for side in ("source_ip_enrichment", "dest_ip_enrichment")
+        ))
+
+    if not checks:
+        return lambda packet: True
+    if len(checks) == 1:
+        return checks[0]
+    return lambda packet: all(check(packet) for check in checks)
+
+
+class FilterIndex:
+    """
+    Index of subscriber filters for one stream.
+
+    Filters restricted to protocols are indexed by protocol, otherwise
+    filters pinned to a set of ports are indexed by port; only the rest are
+    evaluated against every packet. Matching a packet therefore touches its
+    protocol's and ports' subscribers plus the unindexed ones, not every
+    subscriber.
+    """
+
+    def __init__(self):
+        self.unfiltered: Set[int] = set()
+        self._predicates: Dict[int, Predicate] = {}
+        self._by_protocol: Dict[str, Set[int]] = {}
+        self._by_port: Dict[int, Set[int]] = {}
+        self._unindexed: Set[int] = set()
+        self._keys: Dict[int, tuple] = {}
+
+    def add(self, subscriber_id: int, live_filter: Optional[LiveFilter] = None):
+        """Register (or re-register) a subscriber, optionally with a filter."""
+        self.remove(subscriber_id)
+        if live_filter is None:
+            self.unfiltered.add(subscriber_id)
+            return
+        self._predicates[subscriber_id] = compile_filter(live_filter)
+        protocols, ports = live_filter.protocol_set(), live_filter.port_set()
+        if protocols:
+            for protocol in protocols:
+                self._by_protocol.setdefault(protocol, set()).add(subscriber_id)
+            self._keys[subscriber_id] = ("protocol", protocols)
+        elif ports:
+            for port in ports:
+                self._by_port.setdefault(port, set()).add(subscriber_id)
+            self._keys[subscriber_id] = ("port", ports)
+        else:
+            self._unindexed.add(subscriber_id)
+
+    def remove(self, subscriber_id: int):
+        """Forget a subscriber."""
+        self.unfiltered.discard(subscriber_id)
+        self._unindexed.discard(subscriber_id)
+        self._predicates.pop(subscriber_id, None)
+        kind, keys = self._keys.pop(subscriber_id, (None, ()))
+        index = self._by_protocol if kind == "protocol" else self._by_port
+        for key in keys:
+            members = index.get(key)
+            if members:
+                members.discard(subscriber_id)
+                if not members:
+                    del index[key]
+
+    def has_filters(self) -> bool:
+        """Whether any subscriber has a filter."""
+        return bool(self._predicates)
+
+    def match(self, packet: Dict[str, Any]) -> Iterable[int]:
+        """IDs of filtered subscribers whose filter matches the packet."""
+        candidates = set(self._unindexed)
+        candidates.update(self._by_protocol.get(packet_protocol(packet), ()))
+        if self._by_port:
+            candidates.update(self._by_port.get(packet.get("source_port"), ()))
+            candidates.update(self._by_port.get(packet.get("dest_port"), ()))
+        return [subscriber_id for subscriber_id in candidates if self._predicates[subscriber_id](packet)]
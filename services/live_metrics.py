@@ -0,0 +1,194 @@
+# src/backend/services/live_metrics.py
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from core.config import settings
+from services.fanout_hub import fanout_hub
+
+logger = logging.getLogger(__name__)
+
+# Separator of flattened state paths; IP addresses contain dots and colons but never slashes
+PATH_SEPARATOR = "/"
+
+
+def flatten_state(state: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested dicts into {"a/b/c": value} leaves."""
+    flat: Dict[str, Any] = {}
+    for key, value in state.items():
+        path = f"{prefix}{PATH_SEPARATOR}{key}" if prefix else str(key)
+        if isinstance(value, dict) and value:
+            flat.update(flatten_state(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def diff_states(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Delta between two flattened states.
+
+    Returns:
+        {"set": {path: value}} for new or changed leaves and {"unset": [path]}
+        for leaves that disappeared; both empty if nothing changed
+    """
+    changed = {path: value for path, value in current.items() if path not in previous or previous[path] != value}
+    removed = [path for path in previous if path not in current]
+    return {"set": changed, "unset": removed}
+
+
+class _Window:
+    """Counters for one second of traffic."""
+
+    __slots__ = ("packets", "bytes", "talkers", "indicators")
+
+    def __init__(self):
+        self.packets: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self.talkers: Counter = Counter()
+        self.indicators: Counter = Counter()
+
+
+class LiveMetrics:
+    """
+    Live traffic rates computed once per process from the packet stream.
+
+    Packets are counted into one-second windows; every second the last
+    window and the last ten are summarized as per-second rates by protocol,
+    top talkers (by bytes sent or received) and threat indicator counts.
+    Listeners get the delta from the previous state once per second; a
+    listener that falls behind is sent a marker to resynchronize from the
+    full state instead.
+    """
+
+    def __init__(self, top_talkers: int = 10, history_seconds: int = 10):
+        """
+        Args:
+            top_talkers: Number of talkers listed per summary
+            history_seconds: Length of the longer summary window
+        """
+        self.top_talkers = top_talkers
+        self.history: Deque[_Window] = deque(maxlen=history_seconds)
+        self.current = _Window()
+        self.state: Dict[str, Any] = {}
+        self.seq = 0
+        self._listeners: Dict[int, asyncio.Queue] = {}
+        self._next_listener = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def observe(self, packets: List[Dict[str, Any]]):
+        """Count packets into the current one-second window."""
+        window = self.current
+        for packet in packets:
+            protocol = str(packet.get("protocol", "unknown"))
+            length = packet.get("length", 0) or 0
+            window.packets[protocol] += 1
+            window.bytes[protocol] += length
+            for side in ("source_ip", "dest_ip"):
+                address = packet.get(side)
+                if address and address != "unknown":
+                    window.talkers[address] += length
+            for indicator in packet.get("threat_indicators") or ():
+                window.indicators[indicator] += 1
+
+    def _summarize(self, windows: List[_Window]) -> Dict[str, Any]:
+        seconds = max(len(windows), 1)
+        packets, bytes_, talkers, indicators = Counter(), Counter(), Counter(), Counter()
+        for window in windows:
+            packets.update(window.packets)
+            bytes_.update(window.bytes)
+            talkers.update(window.talkers)
+            indicators.update(window.indicators)
+        return {
+            "packets_per_sec": {key: round(value / seconds, 2) for key, value in packets.items()},
+            "bytes_per_sec": {key: round(value / seconds, 2) for key, value in bytes_.items()},
+            "total_packets_per_sec": round(sum(packets.values()) / seconds, 2),
+            "total_bytes_per_sec": round(sum(bytes_.values()) / seconds, 2),
+            "top_talkers": {
+                address: round(value / seconds, 2) for address, value in talkers.most_common(self.top_talkers)
+            },
+            "indicators": dict(indicators),
+        }
+
+    def tick(self) -> Dict[str, Any]:
+        """
+        Close the current window and recompute the summaries.
+
+        Returns:
+            The delta from the previous state
+        """
+        self.history.append(self.current)
+        self.current = _Window()
+        state = flatten_state({
+            "1s": self._summarize([self.history[-1]]),
+            f"{self.history.maxlen}s": self._summarize(list(self.history)),
+        })
+        delta = diff_states(self.state, state)
+        self.state = state
+        if delta["set"] or delta["unset"]:
+            self.seq += 1
+        return delta
+
+    def register(self) -> Tuple[int, asyncio.Queue]:
+        """
+        Register a listener for per-second deltas, starting the engine if needed.
+
+        Returns:
+            Listener ID (for `unregister`) and a queue of (seq, delta) updates;
+            a None delta means updates were lost and `state` must be resent
+        """
+        self.start()
+        self._next_listener += 1
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.LIVE_METRICS_LISTENER_QUEUE)
+        self._listeners[self._next_listener] = queue
+        return self._next_listener, queue
+
+    def unregister(self, listener_id: int):
+        """Remove a listener."""
+        self._listeners.pop(listener_id, None)
+
+    def start(self):
+        """Start consuming the packet stream and ticking (idempotent)."""
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        self._tasks = [asyncio.create_task(self._consume()), asyncio.create_task(self._tick_loop())]
+
+    async def _consume(self):
+        subscription = fanout_hub.register("network_packets")
+        try:
+            while True:
+                _, packets = await subscription.get()
+                self.observe(packets)
+        finally:
+            fanout_hub.unregister(subscription)
+
+    async def _tick_loop(self):
+        next_tick = time.monotonic() + 1
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += 1
+            delta = self.tick()
+            if not delta["set"] and not delta["unset"]:
+                continue
+            for queue in self._listeners.values():
+                try:
+                    queue.put_nowait((self.seq, delta))
+                except asyncio.QueueFull:
+                    # Deltas only apply in order, so replace the backlog with a resync marker
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait((self.seq, None))
+
+    async def close(self):
+        """Stop the engine."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global instance
+live_metrics = LiveMetrics(top_talkers=settings.LIVE_METRICS_TOP_TALKERS)
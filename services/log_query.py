@@ -0,0 +1,157 @@
+# src/backend/services/log_query.py
+
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import ipaddress
+import json
+import re
+
+# Relative time offsets accepted in place of ISO timestamps (e.g. "-1h", "-30m")
+RELATIVE_TIME_PATTERN = re.compile(r"^-\d+(ns|us|ms|s|m|h|d|w|mo|y)$")
+
+# Lengths of relative time units; months and years are approximated
+RELATIVE_TIME_UNITS = {
+    "ns": timedelta(microseconds=0.001), "us": timedelta(microseconds=1), "ms": timedelta(milliseconds=1),
+    "s": timedelta(seconds=1), "m": timedelta(minutes=1), "h": timedelta(hours=1), "d": timedelta(days=1),
+    "w": timedelta(weeks=1), "mo": timedelta(days=30), "y": timedelta(days=365),
+}
+
+# Columns network logs can be grouped by in aggregate queries
+GROUPABLE_COLUMNS = ("protocol", "source_ip", "dest_ip", "source_port", "dest_port", "direction")
+
+
+def parse_time(value: str) -> datetime:
+    """Parse an ISO timestamp (with optional trailing Z) into an aware UTC datetime."""
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def resolve_time(value: str, now: datetime) -> datetime:
+    """Resolve an ISO timestamp or relative offset (e.g. -1h) to an aware UTC datetime."""
+    match = RELATIVE_TIME_PATTERN.match(value)
+    if match:
+        return now - int(value[1:-len(match.group(1))]) * RELATIVE_TIME_UNITS[match.group(1)]
+    return parse_time(value)
+
+
+def floor_time(moment: datetime, width: timedelta) -> datetime:
+    """Round an aware datetime down to a multiple of width since the epoch."""
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + ((moment - epoch) // width) * width
+
+
+def parse_interval(interval: str) -> timedelta:
+    """Convert a window duration such as 5m or 1h to a timedelta."""
+    match = re.fullmatch(r"(\d+)(s|m|h|d|w)", interval)
+    if not match:
+        raise ValueError(f"Invalid interval {interval}")
+    return int(match.group(1)) * RELATIVE_TIME_UNITS[match.group(2)]
+
+
+def merge_aggregate_rows(
+    rows: List[Dict[str, Any]],
+    interval: Optional[str] = None,
+    top: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Sum aggregate rows (from several time ranges) describing the same window and key.
+    
+    aggregateWindow stamps a window cut short by the range stop with the
+    stop time, so times are first moved to their window's true end.
+    """
+    every = parse_interval(interval) if interval else None
+    merged: Dict[Tuple[Optional[str], Any], Any] = {}
+    for row in rows:
+        time_key = row["time"]
+        if every:
+            moment = datetime.fromisoformat(time_key)
+            time_key = (floor_time(moment - timedelta(microseconds=1), every) + every).isoformat()
+        merged[(time_key, row["key"])] = merged.get((time_key, row["key"]), 0) + row["value"]
+    result = [{"time": time_key, "key": key, "value": value} for (time_key, key), value in merged.items()]
+    if every:
+        result.sort(key=lambda row: row["time"])
+    else:
+        result.sort(key=lambda row: row["value"], reverse=True)
+        if top:
+            result = result[:top]
+    return result
+
+
+def encode_cursor(timestamp: datetime, skip: int) -> str:
+    """
+    Build an opaque resume cursor.
+
+    The cursor is the timestamp of the last row sent plus how many rows
+    with exactly that timestamp were already sent.
+    """
+    payload = json.dumps({"t": timestamp.isoformat(), "n": skip}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return parse_time(payload["t"]), int(payload["n"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class NetworkLogFilter(BaseModel):
+    """
+    Backend-neutral description of which network logs to read.
+
+    Validation happens here so that every storage backend can render the
+    filter into its own query language without re-checking user input.
+    """
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    protocol: Optional[str] = None
+    source_ip: Optional[str] = None
+    dest_ip: Optional[str] = None
+    ip: Optional[str] = Field(None, description="Matches either source or destination")
+    source_port: Optional[int] = Field(None, ge=0, le=65535)
+    dest_port: Optional[int] = Field(None, ge=0, le=65535)
+    port: Optional[int] = Field(None, ge=0, le=65535, description="Matches either source or destination")
+    source_cidr: Optional[str] = None
+    dest_cidr: Optional[str] = None
+    cidr: Optional[str] = Field(None, description="Matches either source or destination")
+    indicators: List[str] = Field(default_factory=list, description="All listed threat indicators must be present")
+
+    @field_validator("start_time", "end_time")
+    @classmethod
+    def _validate_time(cls, value: Optional[str]) -> Optional[str]:
+        if value is None or RELATIVE_TIME_PATTERN.match(value):
+            return value
+        parse_time(value)
+        return value
+
+    @field_validator("protocol")
+    @classmethod
+    def _validate_protocol(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not re.fullmatch(r"[A-Za-z0-9_-]{1,16}", value):
+            raise ValueError("Invalid protocol")
+        return value
+
+    @field_validator("source_ip", "dest_ip", "ip")
+    @classmethod
+    def _validate_ip(cls, value: Optional[str]) -> Optional[str]:
+        return str(ipaddress.ip_address(value)) if value else value
+
+    @field_validator("source_cidr", "dest_cidr", "cidr")
+    @classmethod
+    def _validate_cidr(cls, value: Optional[str]) -> Optional[str]:
+        return str(ipaddress.ip_network(value, strict=False)) if value else value
+
+    @field_validator("indicators")
+    @classmethod
+    def _validate_indicators(cls, value: List[str]) -> List[str]:
+        for indicator in value:
+            if not re.fullmatch(r"[a-z0-9_]{1,64}", indicator):
+                raise ValueError(f"Invalid threat indicator: {indicator}")
+        return value
@@ -0,0 +1,107 @@
+# src/backend/services/memory_bus.py
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryBus:
+    """
+    In-process broadcast bus used when Redis is unavailable or not wanted.
+
+    Messages are handed to subscribers as the original objects, without any
+    serialization, so subscribers must treat them as read-only. Every
+    channel subscriber and stream consumer group has its own bounded queue;
+    nothing survives a restart.
+    """
+
+    def __init__(self, queue_size: int = 10000):
+        """
+        Args:
+            queue_size: Bound of each subscriber and consumer group queue
+        """
+        self.queue_size = queue_size
+        self._channels: Dict[str, Dict[int, asyncio.Queue]] = {}
+        self._groups: Dict[str, Dict[str, asyncio.Queue]] = {}
+        self._ids = itertools.count(1)
+        self.messages_published = 0
+        self.messages_dropped = 0
+        self.entries_appended = 0
+        self.entries_rejected = 0
+
+    def subscribe(self, channel: str) -> Tuple[int, asyncio.Queue]:
+        """
+        Register a channel subscriber.
+
+        Returns:
+            The subscriber ID (for `unsubscribe`) and its message queue
+        """
+        subscriber_id = next(self._ids)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._channels.setdefault(channel, {})[subscriber_id] = queue
+        return subscriber_id, queue
+
+    def unsubscribe(self, channel: str, subscriber_id: int):
+        """Remove a channel subscriber."""
+        self._channels.get(channel, {}).pop(subscriber_id, None)
+
+    def publish(self, channel: str, message: Any) -> int:
+        """
+        Deliver a message to every subscriber of a channel.
+
+        Returns:
+            Number of subscribers that received it; full queues miss the message
+        """
+        delivered = 0
+        for queue in self._channels.get(channel, {}).values():
+            try:
+                queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self.messages_dropped += 1
+        self.messages_published += 1
+        return delivered
+
+    def group_queue(self, stream: str, group: str) -> asyncio.Queue:
+        """Get (creating if needed) the queue a consumer group reads a stream from."""
+        groups = self._groups.setdefault(stream, {})
+        if group not in groups:
+            groups[group] = asyncio.Queue(maxsize=self.queue_size)
+        return groups[group]
+
+    def append(self, stream: str, message: Any) -> Optional[str]:
+        """
+        Append a message to a stream, delivering it to every consumer group.
+
+        The message is accepted by all groups or by none, so a caller that
+        falls back on rejection never produces a duplicate.
+
+        Returns:
+            A sequence ID, or None if the stream has no groups or a group queue is full
+        """
+        groups = self._groups.get(stream)
+        if not groups or any(queue.full() for queue in groups.values()):
+            self.entries_rejected += 1
+            return None
+        self.entries_appended += 1
+        entry_id = f"{self.entries_appended}-0"
+        for queue in groups.values():
+            queue.put_nowait((entry_id, message))
+        return entry_id
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depths and delivery counters."""
+        return {
+            "messages_published": self.messages_published,
+            "messages_dropped": self.messages_dropped,
+            "entries_appended": self.entries_appended,
+            "entries_rejected": self.entries_rejected,
+            "subscribers": {channel: len(queues) for channel, queues in self._channels.items()},
+            "groups": {
+                stream: {group: queue.qsize() for group, queue in groups.items()}
+                for stream, groups in self._groups.items()
+            }
+        }
@@ -1,64 +1,336 @@
 # src/backend/services/message_queue.py
 
 import asyncio
-import json
 import logging
-from typing import Dict, Any, Callable, Optional
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 from core.config import settings
+from services.codecs import channel_codec, detect_codec, pack_envelope, unpack_messages, uses_envelopes
+from services.memory_bus import InMemoryBus
+from services.metrics import Histogram, FINE_LATENCY_MS_BUCKETS, BATCH_SIZE_BUCKETS
 
 logger = logging.getLogger(__name__)
 
+_STOP = object()
+
+# Last STREAM_REPLAY_FROM position applied to a consumer group, shared by every worker
+REPLAY_MARKER_KEY = "stream:replayed:{stream}:{group}"
+
+# Persists packets whose stream append failed some other way (e.g. storage_backend.write_batch)
+StreamFallback = Callable[[List[Dict[str, Any]]], Any]
+
+
+class BatchingPublisher:
+    """
+    Gathers pub/sub messages for a short linger window and sends them together.
+
+    The first queued message opens a batch; it is sent once `max_batch`
+    messages are waiting or `linger` seconds have passed, so a busy
+    publisher pays one Redis round trip per batch instead of per message.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[Tuple[str, bytes]]], Awaitable[None]],
+        linger: float = 0.005,
+        max_batch: int = 500,
+        max_queue_size: int = 50000
+    ):
+        """
+        Args:
+            send: Coroutine function sending a batch of (channel, message) pairs
+            linger: Maximum seconds a message waits for others to join its batch
+            max_batch: Maximum messages per batch
+            max_queue_size: Maximum queued messages before dropping
+        """
+        self.send = send
+        self.linger = linger
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+        self.publish_latency_ms = Histogram(FINE_LATENCY_MS_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.messages_published = 0
+        self.messages_dropped = 0
+        self.failed_batches = 0
+
+    def start(self):
+        """Start the background send task on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, channel: str, message: bytes) -> bool:
+        """
+        Queue an encoded message for publishing.
+
+        Returns:
+            bool: True if queued, False if the queue was full and it was dropped
+        """
+        try:
+            self._queue.put_nowait((channel, message, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            self.messages_dropped += 1
+            return False
+
+    async def close(self, timeout: float = 5.0):
+        """Send whatever is queued and stop the background task."""
+        if not self._task:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Timed out flushing queued pub/sub messages")
+        self._task = None
+
+    async def _run(self):
+        """Collect messages into batches and send them until stopped."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, bytes, float]]):
+        """Send one batch and record its size and per-message latency."""
+        self.batch_sizes.observe(len(batch))
+        try:
+            await self.send([(channel, message) for channel, message, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            self.messages_dropped += len(batch)
+            logger.error(f"Failed to publish batch of {len(batch)} messages: {e}")
+            return
+        sent_at = time.perf_counter()
+        for _, _, queued_at in batch:
+            self.publish_latency_ms.observe((sent_at - queued_at) * 1000)
+        self.messages_published += len(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get publisher counters plus latency and batch-size histograms."""
+        return {
+            "queued": self._queue.qsize(),
+            "messages_published": self.messages_published,
+            "messages_dropped": self.messages_dropped,
+            "failed_batches": self.failed_batches,
+            "publish_latency_ms": self.publish_latency_ms.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+        }
+
+
 class MessageQueueService:
     """
     Redis-based message queue service for handling packet data pipeline.
+    
+    MESSAGE_BUS selects the transport: "redis", "memory" (an in-process bus
+    for single-node deployments and tests) or "auto", which uses Redis when
+    it is reachable and the in-process bus otherwise, switching back and
+    forth as Redis goes down and comes back.
     """
     
     def __init__(self):
         self.redis_client: Optional[redis.Redis] = None
         self.subscribers = {}
+        self.publisher: Optional[BatchingPublisher] = None
+        # Batched XADDs, one pipelined round trip per batch (see append_to_stream)
+        self.stream_publisher: Optional[BatchingPublisher] = None
+        self.memory_bus = InMemoryBus(queue_size=settings.MEMORY_BUS_QUEUE_SIZE)
+        self.memory_active = False
+        self.stream_stats = {"published": 0, "publish_failures": 0}
+        self.group_stats: Dict[str, Dict[str, int]] = {}
+        self._watch_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
-        """Initialize Redis connection."""
+        """Initialize Redis connection (or the in-process bus, per MESSAGE_BUS)."""
+        if self.redis_client or self.memory_active:
+            return
+        if settings.MESSAGE_BUS == "memory":
+            await self._use_memory()
+            return
+            
         try:
-            self.redis_client = redis.from_url(settings.REDIS_URL)
-            await self.redis_client.ping()
+            client = redis.from_url(settings.REDIS_URL)
+            await client.ping()
+            await self._use_redis(client)
             logger.info("Redis connection established successfully")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
             self.redis_client = None
+            if settings.MESSAGE_BUS == "auto":
+                await self._use_memory()
+        if settings.MESSAGE_BUS == "auto" and not self._watch_task:
+            self._watch_task = asyncio.create_task(self._watch_redis())
+    
+    @property
+    def backend(self) -> str:
+        """Active transport: "redis", "memory" or "unavailable"."""
+        if self.memory_active:
+            return "memory"
+        return "redis" if self.redis_client else "unavailable"
+    
+    def is_available(self) -> bool:
+        """Whether messages can currently be published."""
+        return self.backend != "unavailable"
+    
+    async def _use_redis(self, client: redis.Redis):
+        """Make Redis the active transport."""
+        self.redis_client = client
+        self.memory_active = False
+        if settings.PUBLISH_BATCHING_ENABLED and not self.publisher:
+            self.publisher = BatchingPublisher(
+                self._send_batch,
+                linger=settings.PUBLISH_LINGER_MS / 1000,
+                max_batch=settings.PUBLISH_MAX_BATCH,
+                max_queue_size=settings.PUBLISH_QUEUE_SIZE
+            )
+            self.publisher.start()
+        if settings.PUBLISH_BATCHING_ENABLED and settings.STREAMS_ENABLED and not self.stream_publisher:
+            self.stream_publisher = BatchingPublisher(
+                self._send_stream_batch,
+                linger=settings.PUBLISH_LINGER_MS / 1000,
+                max_batch=settings.PUBLISH_MAX_BATCH,
+                max_queue_size=settings.PUBLISH_QUEUE_SIZE
+            )
+            self.stream_publisher.start()
+    
+    async def _use_memory(self):
+        """Make the in-process bus the active transport."""
+        self.memory_active = True
+        publisher, self.publisher = self.publisher, None
+        stream_publisher, self.stream_publisher = self.stream_publisher, None
+        client, self.redis_client = self.redis_client, None
+        if publisher:
+            await publisher.close(timeout=1.0)
+        if stream_publisher:
+            await stream_publisher.close(timeout=1.0)
+        if client:
+            try:
+                await client.close()
+            except Exception:
+                pass
+        logger.warning("Message bus running in-process; live data is not shared with other processes")
+    
+    async def _watch_redis(self):
+        """In "auto" mode, move between Redis and the in-process bus as Redis comes and goes."""
+        while True:
+            await asyncio.sleep(settings.BUS_HEALTHCHECK_SECONDS)
+            if self.memory_active:
+                client = redis.from_url(settings.REDIS_URL)
+                try:
+                    await client.ping()
+                except Exception:
+                    await client.close()
+                    continue
+                await self._use_redis(client)
+                logger.info("Redis is reachable again, message bus switched back to Redis")
+            else:
+                try:
+                    await self.redis_client.ping()
+                except Exception as e:
+                    logger.error(f"Lost connection to Redis: {e}")
+                    await self._use_memory()
     
     async def publish_packet_data(self, channel: str, packet_data: Dict[str, Any]) -> bool:
         """
         Publish packet data to a Redis channel.
         
+        The data is encoded with the channel's codec (see CHANNEL_CODECS). With
+        publish batching enabled the message is queued on the batching publisher
+        and sent with others after at most PUBLISH_LINGER_MS. On the in-process
+        bus the dictionary itself is delivered, without encoding.
+        
         Args:
             channel: Redis channel name
             packet_data: Packet information dictionary
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if successful (or queued), False otherwise
         """
+        if self.memory_active:
+            self.memory_bus.publish(channel, packet_data)
+            return True
         if not self.redis_client:
             logger.error("Redis client not initialized")
             return False
             
         try:
-            message = json.dumps(packet_data)
+            message = channel_codec(channel).encode(packet_data)
+            if self.publisher:
+                return self.publisher.submit(channel, message)
             await self.redis_client.publish(channel, message)
             return True
         except Exception as e:
             logger.error(f"Failed to publish message: {e}")
             return False
     
-    async def subscribe_to_channel(self, channel: str, callback: Callable[[Dict[str, Any]], None]):
+    async def _send_batch(self, batch: List[Tuple[str, bytes]]):
+        """
+        Send a batch of (channel, message) pairs in one pipelined round trip.
+        
+        In "envelope" mode the messages for each channel listed in
+        ENVELOPE_CHANNELS travel as one PUBLISH of a batch envelope; messages
+        on other channels, and all messages in "pipeline" mode, keep their
+        own PUBLISH and only the round trip is shared.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        by_channel: Dict[str, List[bytes]] = {}
+        for channel, message in batch:
+            if settings.PUBLISH_MODE == "envelope" and uses_envelopes(channel):
+                by_channel.setdefault(channel, []).append(message)
+            else:
+                pipe.publish(channel, message)
+        for channel, messages in by_channel.items():
+            envelope = messages[0] if len(messages) == 1 else pack_envelope(channel_codec(channel), messages)
+            pipe.publish(channel, envelope)
+        await pipe.execute()
+    
+    def get_publish_stats(self) -> Dict[str, Any]:
+        """Get batching publisher statistics."""
+        if not self.publisher:
+            return {"batching": "disabled"}
+        return {"batching": settings.PUBLISH_MODE, **self.publisher.get_stats()}
+    
+    async def subscribe_to_channel(self, channel: str, callback: Callable[[Any], None], raw: bool = False):
         """
         Subscribe to a Redis channel and process messages with callback.
         
         Args:
             channel: Redis channel name
             callback: Function to process received messages
+            raw: Pass each payload to the callback still encoded (possibly a batch
+                envelope) so it can be forwarded without decoding. The in-process
+                bus has no encoded form and always passes the original object.
+        
+        Returns once the active transport changes or the subscription fails, so
+        long-lived subscribers should call it again.
         """
+        if self.memory_active:
+            await self._subscribe_memory(channel, callback)
+            return
         if not self.redis_client:
             logger.error("Redis client not initialized")
             return
@@ -72,9 +344,15 @@ class MessageQueueService:
             async for message in pubsub.listen():
                 if message['type'] == 'message':
                     try:
-                        data = json.loads(message['data'])
-                        await callback(data)  # Make callback async
-                    except json.JSONDecodeError as e:
+                        payload = message['data']
+                        if raw:
+                            await callback(payload)
+                            continue
+                        data = detect_codec(payload).decode(payload)
+                        # Batch envelopes are unpacked so callbacks still see one packet at a time
+                        for item in unpack_messages(data):
+                            await callback(item)  # Make callback async
+                    except ValueError as e:
                         logger.error(f"Failed to decode message: {e}")
                     except Exception as e:
                         logger.error(f"Error processing message: {e}")
@@ -85,8 +363,437 @@ class MessageQueueService:
             if 'pubsub' in locals():
                 await pubsub.close()
     
+    async def _subscribe_memory(self, channel: str, callback: Callable[[Any], None]):
+        """Deliver in-process bus messages to the callback until the bus is switched off."""
+        subscriber_id, queue = self.memory_bus.subscribe(channel)
+        logger.info(f"Subscribed to in-process channel: {channel}")
+        try:
+            while self.memory_active:
+                try:
+                    message = await asyncio.wait_for(queue.get(), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                try:
+                    await callback(message)
+                except Exception as e:
+                    logger.error(f"Error processing message: {e}")
+        finally:
+            self.memory_bus.unsubscribe(channel, subscriber_id)
+    
+    async def publish_to_stream(self, stream: str, packet_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Append packet data to a Redis stream, trimming it to roughly STREAM_MAXLEN entries.
+        
+        Args:
+            stream: Redis stream key
+            packet_data: Packet information dictionary
+            
+        Returns:
+            The entry ID, or None if the append failed
+        """
+        if self.memory_active:
+            return self.memory_bus.append(stream, packet_data)
+        if not self.redis_client:
+            logger.error("Redis client not initialized")
+            return None
+            
+        try:
+            entry_id = await self.redis_client.xadd(
+                stream,
+                {"data": channel_codec(stream).encode(packet_data)},
+                maxlen=settings.STREAM_MAXLEN,
+                approximate=True
+            )
+            self.stream_stats["published"] += 1
+            return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+        except Exception as e:
+            self.stream_stats["publish_failures"] += 1
+            logger.error(f"Failed to append to stream {stream}: {e}")
+            return None
+    
+    async def append_to_stream(self, stream: str, packet_data: Dict[str, Any], fallback: StreamFallback) -> bool:
+        """
+        Queue packet data for a batched append to a Redis stream.
+        
+        Appends are gathered like pub/sub messages (PUBLISH_LINGER_MS,
+        PUBLISH_MAX_BATCH) and sent as one pipelined round trip of XADDs.
+        Without batching this is a single publish_to_stream.
+        
+        Args:
+            stream: Redis stream key
+            packet_data: Packet information dictionary
+            fallback: Called with the packets of a batch whose append failed
+            
+        Returns:
+            bool: True if appended or queued; False if the caller must persist the packet itself
+        """
+        if self.stream_publisher and not self.memory_active:
+            return self.stream_publisher.submit(stream, (packet_data, fallback))
+        return await self.publish_to_stream(stream, packet_data) is not None
+    
+    async def _send_stream_batch(self, batch: List[Tuple[str, Tuple[Dict[str, Any], StreamFallback]]]):
+        """Append a batch of (stream, (packet, fallback)) in one pipelined round trip."""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for stream, (packet_data, _) in batch:
+                pipe.xadd(
+                    stream,
+                    {"data": channel_codec(stream).encode(packet_data)},
+                    maxlen=settings.STREAM_MAXLEN,
+                    approximate=True
+                )
+            await pipe.execute()
+            self.stream_stats["published"] += len(batch)
+        except Exception as e:
+            self.stream_stats["publish_failures"] += len(batch)
+            logger.error(f"Failed to append {len(batch)} entries to streams, persisting them directly: {e}")
+            by_fallback: Dict[StreamFallback, List[Dict[str, Any]]] = {}
+            for _, (packet_data, fallback) in batch:
+                by_fallback.setdefault(fallback, []).append(packet_data)
+            for fallback, packets in by_fallback.items():
+                fallback(packets)
+    
+    async def ensure_group(self, stream: str, group: str, start_id: str = "$") -> bool:
+        """
+        Create a consumer group if it does not exist yet.
+        
+        Args:
+            stream: Redis stream key (created when missing)
+            group: Consumer group name
+            start_id: Position a new group starts reading from ("$" for new entries, "0" for all)
+            
+        Returns:
+            bool: True if the group exists afterwards, False otherwise
+        """
+        if not self.redis_client:
+            logger.error("Redis client not initialized")
+            return False
+            
+        try:
+            await self.redis_client.xgroup_create(stream, group, id=start_id, mkstream=True)
+            logger.info(f"Created consumer group {group} on stream {stream}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error(f"Failed to create consumer group {group} on {stream}: {e}")
+                return False
+        except Exception as e:
+            logger.error(f"Failed to create consumer group {group} on {stream}: {e}")
+            return False
+        return True
+    
+    async def set_group_position(self, stream: str, group: str, position: str) -> bool:
+        """
+        Move a consumer group's last-delivered ID so it replays from `position`.
+        
+        Args:
+            stream: Redis stream key
+            group: Consumer group name
+            position: Entry ID to resume after ("0" replays everything still in the stream)
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.redis_client:
+            logger.error("Redis client not initialized")
+            return False
+            
+        try:
+            await self.redis_client.xgroup_setid(stream, group, position)
+            logger.info(f"Consumer group {group} on {stream} repositioned to {position}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to reposition consumer group {group} on {stream}: {e}")
+            return False
+    
+    async def replay_group_once(self, stream: str, group: str, position: str) -> bool:
+        """
+        Rewind a consumer group to `position` unless it was already rewound there.
+        
+        The position is swapped into a shared marker key with SET ... GET, so of
+        all workers started with the same STREAM_REPLAY_FROM only the first one
+        rewinds the group; late starters and restarts leave it where it is.
+        
+        Args:
+            stream: Redis stream key
+            group: Consumer group name
+            position: Entry ID to resume after
+            
+        Returns:
+            bool: True if this call repositioned the group, False otherwise
+        """
+        if not self.redis_client:
+            logger.error("Redis client not initialized")
+            return False
+        
+        marker = REPLAY_MARKER_KEY.format(stream=stream, group=group)
+        try:
+            previous = await self.redis_client.set(marker, position, get=True)
+        except Exception as e:
+            logger.error(f"Failed to record replay position for {group} on {stream}: {e}")
+            return False
+        
+        if isinstance(previous, bytes):
+            previous = previous.decode()
+        if previous == position:
+            logger.info(f"Consumer group {group} on {stream} already replayed from {position}")
+            return False
+        
+        if await self.set_group_position(stream, group, position):
+            return True
+        # Let the next worker (or restart) try the rewind again
+        try:
+            await self.redis_client.delete(marker)
+        except Exception as e:
+            logger.error(f"Failed to clear replay position for {group} on {stream}: {e}")
+        return False
+    
+    async def consume_stream(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        handler: Callable[[List[Dict[str, Any]]], Awaitable[Optional[List[int]]]],
+        count: Optional[int] = None,
+        block_ms: Optional[int] = None,
+        start_id: Optional[str] = None
+    ):
+        """
+        Read a stream as part of a consumer group and acknowledge entries once handled.
+        
+        Entries this consumer received before a restart but never acknowledged are
+        handled first; after that new entries are read in batches of `count`. Entries
+        left pending by a crashed or failing consumer are claimed once they have been
+        idle for STREAM_CLAIM_IDLE_MS, so any process in the group can finish them.
+        
+        Args:
+            stream: Redis stream key
+            group: Consumer group name
+            consumer: Consumer name; keep it stable across restarts to recover pending entries
+            handler: Async function receiving a batch of decoded messages. It may
+                return the indexes of messages it could not handle; those entries stay
+                pending (and are retried) while the rest are acknowledged. If it raises,
+                the whole batch stays pending.
+            count: Maximum entries per read (defaults to STREAM_READ_COUNT)
+            block_ms: How long a read waits for new entries (defaults to STREAM_BLOCK_MS)
+            start_id: Optional position to replay from before consuming
+        
+        On the in-process bus the group receives entries appended while it is
+        running, with no acknowledgement, redelivery or replay. The consumer
+        follows the active transport when MESSAGE_BUS is "auto".
+        """
+        count = count or settings.STREAM_READ_COUNT
+        block_ms = block_ms or settings.STREAM_BLOCK_MS
+        self.group_stats.setdefault(group, {"consumed": 0, "handler_failures": 0, "claimed": 0})
+        while True:
+            if self.memory_active:
+                await self._consume_memory(stream, group, handler, count)
+            elif self.redis_client:
+                await self._consume_redis(stream, group, consumer, handler, count, block_ms, start_id)
+                # Replay applies to the first Redis session only
+                start_id = None
+            elif settings.MESSAGE_BUS == "auto":
+                await asyncio.sleep(1)
+            else:
+                logger.error("Redis client not initialized")
+                return
+    
+    async def _consume_memory(
+        self,
+        stream: str,
+        group: str,
+        handler: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        count: int
+    ):
+        """Hand in-process stream entries to the handler until the bus is switched off and drained."""
+        queue = self.memory_bus.group_queue(stream, group)
+        logger.info(f"Consuming in-process stream {stream} as {group}")
+        while self.memory_active or not queue.empty():
+            try:
+                _, message = await asyncio.wait_for(queue.get(), 1.0)
+            except asyncio.TimeoutError:
+                continue
+            batch = [message]
+            while len(batch) < count and not queue.empty():
+                batch.append(queue.get_nowait()[1])
+            try:
+                failed = await handler(batch) or []
+                if failed:
+                    # The in-process bus has no redelivery
+                    logger.error(f"Consumer group {group} dropped {len(failed)} entries it could not handle")
+                self.group_stats[group]["consumed"] += len(batch) - len(failed)
+            except Exception as e:
+                self.group_stats[group]["handler_failures"] += 1
+                logger.error(f"Consumer group {group} failed to handle {len(batch)} entries: {e}")
+    
+    async def _consume_redis(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        handler: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        count: int,
+        block_ms: int,
+        start_id: Optional[str]
+    ):
+        """Read the Redis stream as a group member until the transport changes."""
+        if not await self.ensure_group(stream, group):
+            await asyncio.sleep(1)
+            return
+        if start_id is not None:
+            await self.replay_group_once(stream, group, start_id)
+        
+        logger.info(f"Consuming stream {stream} as {group}/{consumer}")
+        # "0" reads this consumer's own pending entries; ">" reads never-delivered ones
+        pending_id: Optional[str] = "0"
+        next_claim = time.monotonic() + settings.STREAM_CLAIM_IDLE_MS / 1000
+        while self.redis_client and not self.memory_active:
+            try:
+                if time.monotonic() >= next_claim:
+                    next_claim = time.monotonic() + settings.STREAM_CLAIM_IDLE_MS / 1000
+                    claimed = await self._claim_stale(stream, group, consumer, count)
+                    if claimed:
+                        self.group_stats[group]["claimed"] += len(claimed)
+                        await self._handle_entries(stream, group, claimed, handler)
+                
+                response = await self.redis_client.xreadgroup(
+                    group,
+                    consumer,
+                    {stream: pending_id or ">"},
+                    count=count,
+                    block=None if pending_id else block_ms
+                )
+                entries = response[0][1] if response else []
+                if pending_id is not None:
+                    if not entries:
+                        pending_id = None
+                        continue
+                    last_id = entries[-1][0]
+                    pending_id = last_id.decode() if isinstance(last_id, bytes) else last_id
+                await self._handle_entries(stream, group, entries, handler)
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error consuming stream {stream} as {group}/{consumer}: {e}")
+                await asyncio.sleep(1)
+    
+    async def _claim_stale(self, stream: str, group: str, consumer: str, count: int) -> List[Tuple[Any, Any]]:
+        """Take over entries another consumer has left pending for too long."""
+        try:
+            response = await self.redis_client.xautoclaim(
+                stream, group, consumer,
+                min_idle_time=settings.STREAM_CLAIM_IDLE_MS,
+                start_id="0-0",
+                count=count
+            )
+            return response[1] if response else []
+        except Exception as e:
+            logger.error(f"Failed to claim stale entries on {stream} for {group}: {e}")
+            return []
+    
+    async def _handle_entries(
+        self,
+        stream: str,
+        group: str,
+        entries: List[Tuple[Any, Any]],
+        handler: Callable[[List[Dict[str, Any]]], Awaitable[None]]
+    ):
+        """Decode a batch, hand it to the handler and acknowledge what it handled."""
+        ids, messages, message_ids = [], [], []
+        for entry_id, fields in entries:
+            ids.append(entry_id)
+            # Entries trimmed by MAXLEN while pending come back without fields
+            if not fields:
+                continue
+            payload = fields.get(b"data", fields.get("data"))
+            try:
+                messages.append(detect_codec(payload).decode(payload))
+                message_ids.append(entry_id)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Failed to decode stream entry {entry_id}: {e}")
+        if not ids:
+            return
+            
+        try:
+            failed = (await handler(messages) or []) if messages else []
+        except Exception as e:
+            # Left pending; it is retried once it becomes claimable
+            self.group_stats[group]["handler_failures"] += 1
+            logger.error(f"Consumer group {group} failed to handle {len(messages)} entries: {e}")
+            return
+        if failed:
+            # Only the entries the handler could not take stay pending for a retry
+            self.group_stats[group]["handler_failures"] += 1
+            retry = {message_ids[index] for index in failed}
+            ids = [entry_id for entry_id in ids if entry_id not in retry]
+            logger.error(f"Consumer group {group} failed to handle {len(retry)} of {len(messages)} entries")
+        if ids:
+            await self.redis_client.xack(stream, group, *ids)
+        self.group_stats[group]["consumed"] += len(messages) - len(failed)
+    
+    async def get_stream_stats(self, stream: str) -> Dict[str, Any]:
+        """
+        Get length and per-group lag for a stream.
+        
+        Args:
+            stream: Redis stream key
+            
+        Returns:
+            Dict with the stream length, publish counters and, per consumer group, its
+            lag (entries not yet delivered), pending (delivered but unacknowledged)
+            entries and local consume counters
+        """
+        stats: Dict[str, Any] = {"stream": stream, **self.stream_stats}
+        if self.stream_publisher:
+            stats["append_batching"] = self.stream_publisher.get_stats()
+        if self.memory_active:
+            depths = self.memory_bus.get_stats()["groups"].get(stream, {})
+            stats["backend"] = "memory"
+            stats["groups"] = {
+                name: {"lag": depth, **self.group_stats.get(name, {})}
+                for name, depth in depths.items()
+            }
+            return stats
+        if not self.redis_client:
+            stats["status"] = "unavailable"
+            return stats
+            
+        try:
+            stats["length"] = await self.redis_client.xlen(stream)
+            groups = {}
+            for info in await self.redis_client.xinfo_groups(stream):
+                name = info["name"].decode() if isinstance(info["name"], bytes) else info["name"]
+                last_id = info.get("last-delivered-id")
+                groups[name] = {
+                    "consumers": info.get("consumers"),
+                    "pending": info.get("pending"),
+                    # Reported by Redis 7+; None when the server cannot compute it
+                    "lag": info.get("lag"),
+                    "last_delivered_id": last_id.decode() if isinstance(last_id, bytes) else last_id,
+                    **self.group_stats.get(name, {})
+                }
+            stats["groups"] = groups
+        except ResponseError:
+            # The stream does not exist until the first entry or group is created
+            stats["length"] = 0
+            stats["groups"] = {}
+        except Exception as e:
+            logger.error(f"Failed to get stats for stream {stream}: {e}")
+            stats["status"] = "error"
+        return stats
+    
     async def close(self):
         """Close Redis connection."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        self.memory_active = False
+        if self.publisher:
+            await self.publisher.close()
+            self.publisher = None
+        if self.stream_publisher:
+            await self.stream_publisher.close()
+            self.stream_publisher = None
         if self.redis_client:
             await self.redis_client.close()
 
@@ -0,0 +1,63 @@
+# src/backend/services/metrics.py
+
+import bisect
+import threading
+from typing import Dict, Any, Iterable, List
+
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram for latency and size metrics.
+    """
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a single observation."""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+
+    def _quantile(self, q: float) -> float:
+        """Estimate a quantile from the bucket upper bounds."""
+        if not self._count:
+            return 0.0
+        target = q * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else self._max
+        return self._max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current histogram state as a JSON-serializable dict."""
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self._counts)}
+            buckets["+Inf"] = self._counts[-1]
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "min": self._min,
+                "max": self._max,
+                "p50": self._quantile(0.5),
+                "p99": self._quantile(0.99),
+                "buckets": buckets,
+            }
+
+
+# Common bucket layouts
+MICRO_LATENCY_MS_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1, 10, 100, 1000)
+FINE_LATENCY_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+LATENCY_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
@@ -1,15 +1,18 @@
 # src/backend/services/network_capture.py
 
-from scapy.all import sniff, Packet, IP, TCP, UDP, ICMP, get_if_list
+from scapy.all import sniff, Packet, Ether, IP, TCP, UDP, ICMP, get_if_list
 import asyncio
+import itertools
 import json
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 from services.enrichment import DataEnrichmentService
 from core.config import settings
 from services.message_queue import message_queue
-from services.database import influxdb_service
+from services.pcap_store import pcap_store, LINKTYPE_ETHERNET, LINKTYPE_RAW
+from services.storage_backend import storage_backend
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,8 @@ class NetworkCaptureService:
     def __init__(self):
         self.is_capturing = False
         self.packet_count = 0
+        # Monotonic across restarts too: each run starts from the current time in microseconds
+        self._seq = itertools.count(time.time_ns() // 1000)
         self.enrichment_service = DataEnrichmentService()
         
     def process_packet(self, packet: Packet) -> Optional[Dict[str, Any]]:
@@ -37,7 +42,9 @@ class NetworkCaptureService:
             # Basic packet info
             packet_data = {
                 "id": f"pkt-{self.packet_count}",
-                "timestamp": datetime.now().isoformat(),
+                "seq": next(self._seq),
+                # Aware UTC, the convention storage and history queries share
+                "timestamp": datetime.now(timezone.utc).isoformat(),
                 "length": len(packet),
                 "summary": packet.summary(),
                 "protocol": "unknown",
@@ -156,9 +163,16 @@ class NetworkCaptureService:
             # Send to message queue for real-time streaming
             await message_queue.publish_packet_data("network_packets", packet_data)
             
-            # Write directly to database for persistence
-            # In production, this would be handled by a separate consumer service
-            influxdb_service.write_network_log(packet_data)
+            # The persistence and alerting consumer groups read the stream; write
+            # directly only when the stream is off or unreachable. Appends are
+            # batched, and a batch that fails is written directly as well.
+            if settings.STREAMS_ENABLED and await message_queue.append_to_stream(
+                settings.PACKET_STREAM, packet_data, storage_backend.write_batch
+            ):
+                return
+            
+            # Queue for persistence; the batching writer flushes in the background
+            storage_backend.write_network_log(packet_data)
             
         except Exception as e:
             logger.error(f"Error sending packet to pipeline: {e}")
@@ -190,16 +204,24 @@ class NetworkCaptureService:
             
             # Initialize message queue
             await message_queue.initialize()
+            if settings.PCAP_ENABLED:
+                pcap_store.start()
+            loop = asyncio.get_running_loop()
             
             def packet_handler(packet):
-                """Synchronous packet handler for scapy."""
+                """Synchronous packet handler for scapy (runs in the sniff thread)."""
                 if not self.is_capturing:
                     return
+                
+                if settings.PCAP_ENABLED:
+                    # Only enqueues; the pcap writer thread does the disk I/O
+                    linktype = LINKTYPE_ETHERNET if isinstance(packet, Ether) else LINKTYPE_RAW
+                    pcap_store.submit(float(packet.time), bytes(packet), linktype)
                     
                 packet_data = self.process_packet(packet)
                 if packet_data:
-                    # Create a task to handle async pipeline processing
-                    asyncio.create_task(self.send_to_pipeline(packet_data))
+                    # Hand off to the event loop; there is no running loop in this thread
+                    asyncio.run_coroutine_threadsafe(self.send_to_pipeline(packet_data), loop)
             
             # Start packet sniffing in a separate thread to avoid blocking
             await asyncio.to_thread(
@@ -235,7 +257,8 @@ class NetworkCaptureService:
         return {
             "is_capturing": self.is_capturing,
             "packet_count": self.packet_count,
-            "interface": settings.NETWORK_INTERFACE
+            "interface": settings.NETWORK_INTERFACE,
+            "pcap": pcap_store.get_stats() if settings.PCAP_ENABLED else "disabled"
         }
 
 
@@ -0,0 +1,75 @@
+# src/backend/services/packet_history.py
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class PacketHistory:
+    """
+    Ring buffer of the most recent packets a process has received.
+
+    Entries keep the time they were received alongside the packet, so a
+    lookup can tell whether the buffer still covers the requested start or
+    whether older packets have already been evicted (or arrived before the
+    buffer existed) and must come from the store instead.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        """
+        Args:
+            capacity: Maximum number of packets kept
+        """
+        self._entries: Deque[Tuple[float, Dict[str, Any]]] = deque(maxlen=capacity)
+        # Everything received at or after this moment is still in the buffer
+        self.covered_from = time.time()
+        self.last_seq: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def extend(self, packets: List[Dict[str, Any]]):
+        """Append packets in the order they were received."""
+        now = time.time()
+        for packet in packets:
+            if len(self._entries) == self._entries.maxlen:
+                self.covered_from = self._entries[0][0]
+            self._entries.append((now, packet))
+            seq = packet.get("seq")
+            if seq is not None:
+                self.last_seq = seq
+
+    def after_seq(self, seq: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Packets with a sequence number above `seq`.
+
+        Returns:
+            The packets, oldest first, and whether they are complete, i.e. the
+            packet right after `seq` is still buffered
+        """
+        packets = []
+        for _, packet in reversed(self._entries):
+            if packet.get("seq", seq + 1) <= seq:
+                break
+            packets.append(packet)
+        packets.reverse()
+        if not self._entries:
+            return packets, self.last_seq is not None and seq >= self.last_seq
+        first_seq = self._entries[0][1].get("seq")
+        complete = len(packets) < len(self._entries) or (first_seq is not None and first_seq <= seq + 1)
+        return packets, complete
+
+    def after_time(self, moment: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Packets received at or after a Unix timestamp.
+
+        Returns:
+            The packets, oldest first, and whether the buffer covers `moment`
+        """
+        packets = []
+        for received_at, packet in reversed(self._entries):
+            if received_at < moment:
+                break
+            packets.append(packet)
+        packets.reverse()
+        return packets, moment >= self.covered_from
@@ -0,0 +1,453 @@
+# src/backend/services/pcap_store.py
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import hashlib
+import ipaddress
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+from core.config import settings
+from services.log_query import NetworkLogFilter, resolve_time
+
+logger = logging.getLogger(__name__)
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+
+# libpcap file format (microsecond timestamps)
+PCAP_MAGIC = 0xa1b2c3d4
+GLOBAL_HEADER = struct.Struct("<IHHiIII")
+RECORD_HEADER = struct.Struct("<IIII")
+
+# Side index entry per packet: timestamp (us), flow hash, record offset, record length
+INDEX_ENTRY = struct.Struct("<qQII")
+
+IP_PROTOCOLS = {"ICMP": 1, "TCP": 6, "UDP": 17, "ICMPV6": 58}
+
+_STOP = object()
+
+# (protocol, source address, source port, destination address, destination port); addresses are packed bytes
+Flow = Tuple[int, bytes, int, bytes, int]
+
+
+def parse_flow(frame: bytes, linktype: int) -> Optional[Flow]:
+    """
+    Extract the 5-tuple from a captured frame without a full dissector.
+
+    Handles Ethernet (with VLAN tags) and raw IP frames carrying IPv4 or
+    IPv6. Ports are 0 for protocols without them and for non-first fragments.
+    """
+    offset = 0
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype = int.from_bytes(frame[12:14], "big")
+        offset = 14
+        while ethertype in (0x8100, 0x88a8) and len(frame) >= offset + 4:
+            ethertype = int.from_bytes(frame[offset + 2:offset + 4], "big")
+            offset += 4
+    elif linktype == LINKTYPE_RAW and frame:
+        ethertype = {4: 0x0800, 6: 0x86dd}.get(frame[0] >> 4, 0)
+    else:
+        return None
+
+    if ethertype == 0x0800 and len(frame) >= offset + 20:
+        protocol = frame[offset + 9]
+        source, dest = frame[offset + 12:offset + 16], frame[offset + 16:offset + 20]
+        fragment_offset = int.from_bytes(frame[offset + 6:offset + 8], "big") & 0x1fff
+        transport = offset + (frame[offset] & 0x0f) * 4
+    elif ethertype == 0x86dd and len(frame) >= offset + 40:
+        protocol = frame[offset + 6]
+        source, dest = frame[offset + 8:offset + 24], frame[offset + 24:offset + 40]
+        fragment_offset = 0
+        transport = offset + 40
+    else:
+        return None
+
+    source_port = dest_port = 0
+    if protocol in (6, 17) and not fragment_offset and len(frame) >= transport + 4:
+        source_port = int.from_bytes(frame[transport:transport + 2], "big")
+        dest_port = int.from_bytes(frame[transport + 2:transport + 4], "big")
+    return protocol, source, source_port, dest, dest_port
+
+
+def flow_hash(flow: Optional[Flow]) -> int:
+    """Direction-independent 64-bit hash of a 5-tuple, so both halves of a conversation share it."""
+    if flow is None:
+        return 0
+    protocol, source, source_port, dest, dest_port = flow
+    first, second = sorted([(source, source_port), (dest, dest_port)])
+    key = bytes([protocol]) + first[0] + first[1].to_bytes(2, "big") + second[0] + second[1].to_bytes(2, "big")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _protocol_number(protocol: Optional[str]) -> Optional[int]:
+    if protocol is None:
+        return None
+    return int(protocol) if protocol.isdigit() else IP_PROTOCOLS.get(protocol.upper(), -1)
+
+
+def _packed(ip: Optional[str]) -> Optional[bytes]:
+    return ipaddress.ip_address(ip).packed if ip else None
+
+
+def _in_network(address: bytes, cidr: Optional[str]) -> bool:
+    return cidr is None or ipaddress.ip_address(address) in ipaddress.ip_network(cidr, strict=False)
+
+
+def flow_matches(flow: Optional[Flow], filters: NetworkLogFilter, bidirectional: bool = True) -> bool:
+    """
+    Check a parsed frame against the 5-tuple parts of a filter.
+
+    With bidirectional, a packet also matches when swapping its source and
+    destination would make it match, so a flow filter returns both directions.
+    """
+    if flow is None:
+        return False
+    protocol = _protocol_number(filters.protocol)
+    if protocol is not None and flow[0] != protocol:
+        return False
+
+    def one_way(source: bytes, source_port: int, dest: bytes, dest_port: int) -> bool:
+        return (
+            (filters.source_ip is None or source == _packed(filters.source_ip))
+            and (filters.dest_ip is None or dest == _packed(filters.dest_ip))
+            and (filters.source_port is None or source_port == filters.source_port)
+            and (filters.dest_port is None or dest_port == filters.dest_port)
+            and _in_network(source, filters.source_cidr)
+            and _in_network(dest, filters.dest_cidr)
+        )
+
+    _, source, source_port, dest, dest_port = flow
+    if filters.ip and _packed(filters.ip) not in (source, dest):
+        return False
+    if filters.port is not None and filters.port not in (source_port, dest_port):
+        return False
+    if filters.cidr and not (_in_network(source, filters.cidr) or _in_network(dest, filters.cidr)):
+        return False
+    if one_way(source, source_port, dest, dest_port):
+        return True
+    return bidirectional and one_way(dest, dest_port, source, source_port)
+
+
+def _filter_hash(filters: NetworkLogFilter) -> Optional[int]:
+    """Index hash for a fully specified TCP/UDP 5-tuple, or None if the filter is partial."""
+    protocol = _protocol_number(filters.protocol)
+    if protocol not in (6, 17) or None in (filters.source_ip, filters.dest_ip, filters.source_port, filters.dest_port):
+        return None
+    return flow_hash((
+        protocol, _packed(filters.source_ip), filters.source_port, _packed(filters.dest_ip), filters.dest_port
+    ))
+
+
+class PcapStore:
+    """
+    Rolling on-disk store of full captured packets.
+
+    The capture thread only enqueues frames (dropping them if the queue is
+    full, never blocking); a writer thread appends them sequentially to
+    pcap segment files, each with a side index of (timestamp, flow hash,
+    offset) entries. Segments roll over by size or age, and the oldest are
+    deleted once the store exceeds its size or age limit.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        segment_seconds: int = 300,
+        max_bytes: int = 10 * 1024 * 1024 * 1024,
+        max_age_seconds: int = 86400,
+        queue_size: int = 50000,
+        snaplen: int = 65535,
+        flush_interval: float = 1.0
+    ):
+        """
+        Args:
+            directory: Directory holding segment (.pcap) and index (.idx) files
+            segment_bytes: Roll over to a new segment after this many bytes
+            segment_seconds: Roll over to a new segment after this much capture time
+            max_bytes: Delete the oldest segments beyond this total size
+            max_age_seconds: Delete segments whose newest packet is older than this
+            queue_size: Frames buffered between the capture and writer threads
+            snaplen: Bytes kept per frame
+            flush_interval: Seconds before buffered writes become readable
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_us = segment_seconds * 1_000_000
+        self.max_bytes = max_bytes
+        self.max_age_us = max_age_seconds * 1_000_000
+        self.snaplen = snaplen
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Segment metadata, oldest first; the last one is active while files are open
+        self._segments: List[Dict[str, Any]] = []
+        self._active: Optional[Dict[str, Any]] = None
+        self._data_file = None
+        self._index_file = None
+        self._flushed_at = 0.0
+
+        self.packets_written = 0
+        self.packets_dropped = 0
+        self.write_errors = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _path(self, seq: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"capture-{seq:012d}.{suffix}")
+
+    def _recover(self):
+        """Load metadata of segments left by a previous run, truncating torn index entries."""
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("capture-") and name.endswith(".pcap")):
+                continue
+            seq = int(name[len("capture-"):-len(".pcap")])
+            data_path, index_path = self._path(seq, "pcap"), self._path(seq, "idx")
+            try:
+                with open(data_path, "rb") as f:
+                    header = f.read(GLOBAL_HEADER.size)
+                entries = os.path.getsize(index_path) // INDEX_ENTRY.size if os.path.exists(index_path) else 0
+                if len(header) < GLOBAL_HEADER.size or not entries:
+                    raise ValueError("empty segment")
+                with open(index_path, "r+b") as f:
+                    f.truncate(entries * INDEX_ENTRY.size)
+                    first = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                    f.seek((entries - 1) * INDEX_ENTRY.size)
+                    last = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                self._segments.append({
+                    "seq": seq,
+                    "linktype": GLOBAL_HEADER.unpack(header)[6],
+                    "first_us": first[0],
+                    "last_us": last[0],
+                    "bytes": os.path.getsize(data_path) + entries * INDEX_ENTRY.size,
+                    "packets": entries,
+                })
+            except Exception as e:
+                logger.warning(f"Removing unreadable pcap segment {name}: {e}")
+                for path in (data_path, index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def start(self):
+        """Start the background writer thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="pcap-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, timestamp: float, frame: bytes, linktype: int = LINKTYPE_ETHERNET) -> bool:
+        """
+        Queue a captured frame; called from the capture thread.
+
+        Returns:
+            bool: False if the queue was full and the frame was dropped
+        """
+        try:
+            self._queue.put_nowait((int(timestamp * 1_000_000), frame, linktype))
+            return True
+        except queue.Full:
+            self.packets_dropped += 1
+            return False
+
+    def close(self, timeout: float = 10.0):
+        """Write queued frames, close the active segment and stop the writer."""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush_files()
+                continue
+            if item is _STOP:
+                self._seal()
+                return
+            try:
+                self._write(*item)
+                if time.monotonic() - self._flushed_at >= self.flush_interval:
+                    self._flush_files()
+            except Exception as e:
+                self.write_errors += 1
+                logger.error(f"Failed to write packet to pcap store: {e}")
+                self._seal()
+
+    def _write(self, ts_us: int, frame: bytes, linktype: int):
+        active = self._active
+        if (active is None or active["linktype"] != linktype or active["bytes"] >= self.segment_bytes
+                or ts_us - active["first_us"] >= self.segment_us):
+            self._seal()
+            active = self._open_segment(ts_us, linktype)
+
+        data = frame[:self.snaplen]
+        record = RECORD_HEADER.pack(ts_us // 1_000_000, ts_us % 1_000_000, len(data), len(frame)) + data
+        offset = self._data_file.tell()
+        self._data_file.write(record)
+        self._index_file.write(INDEX_ENTRY.pack(ts_us, flow_hash(parse_flow(data, linktype)), offset, len(record)))
+        with self._lock:
+            active["last_us"] = max(active["last_us"], ts_us)
+            active["bytes"] += len(record) + INDEX_ENTRY.size
+            active["packets"] += 1
+        self.packets_written += 1
+
+    def _open_segment(self, ts_us: int, linktype: int) -> Dict[str, Any]:
+        seq = self._segments[-1]["seq"] + 1 if self._segments else 0
+        self._data_file = open(self._path(seq, "pcap"), "wb", buffering=1024 * 1024)
+        self._index_file = open(self._path(seq, "idx"), "wb", buffering=64 * 1024)
+        self._data_file.write(GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, self.snaplen, linktype))
+        segment = {
+            "seq": seq, "linktype": linktype, "first_us": ts_us, "last_us": ts_us,
+            "bytes": GLOBAL_HEADER.size, "packets": 0,
+        }
+        with self._lock:
+            self._segments.append(segment)
+        self._active = segment
+        return segment
+
+    def _flush_files(self):
+        """Make buffered records visible to readers (data before index)."""
+        self._flushed_at = time.monotonic()
+        if self._data_file:
+            self._data_file.flush()
+            self._index_file.flush()
+
+    def _seal(self):
+        """Close the active segment and apply the size and age limits."""
+        if self._data_file:
+            for f in (self._data_file, self._index_file):
+                try:
+                    f.close()
+                except Exception as e:
+                    logger.error(f"Failed to close pcap segment: {e}")
+            self._data_file = self._index_file = None
+        self._active = None
+        self._enforce_limits()
+
+    def _enforce_limits(self):
+        cutoff = int(time.time() * 1_000_000) - self.max_age_us
+        with self._lock:
+            expired = []
+            total = sum(segment["bytes"] for segment in self._segments)
+            while self._segments and self._segments[0] is not self._active and (
+                total > self.max_bytes or self._segments[0]["last_us"] < cutoff
+            ):
+                segment = self._segments.pop(0)
+                total -= segment["bytes"]
+                expired.append(segment)
+        for segment in expired:
+            for suffix in ("pcap", "idx"):
+                try:
+                    os.remove(self._path(segment["seq"], suffix))
+                except FileNotFoundError:
+                    pass
+
+    def export(
+        self,
+        filters: NetworkLogFilter,
+        bidirectional: bool = True,
+        max_packets: Optional[int] = None,
+        chunk_bytes: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """
+        Stream a pcap file of stored packets matching a time range and 5-tuple filter.
+
+        Only segments overlapping the range are opened and only their index
+        is scanned; a fully specified TCP/UDP 5-tuple is matched on the
+        flow hash before any packet data is read.
+
+        Args:
+            filters: Time range and 5-tuple parts (threat indicators are not supported)
+            bidirectional: Also return the reverse direction of the filtered flow
+            max_packets: Stop after this many packets
+            chunk_bytes: Approximate size of each yielded chunk
+
+        Yields:
+            Chunks of a pcap file, starting with its global header
+        """
+        now = datetime.now(timezone.utc)
+        start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+        end = resolve_time(filters.end_time, now) if filters.end_time else now
+        start_us, end_us = int(start.timestamp() * 1_000_000), int(end.timestamp() * 1_000_000)
+        wanted_hash = _filter_hash(filters)
+        with self._lock:
+            segments = [dict(s) for s in self._segments if s["first_us"] < end_us and s["last_us"] >= start_us]
+        linktype = segments[0]["linktype"] if segments else LINKTYPE_ETHERNET
+
+        buffer = bytearray(GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, self.snaplen, linktype))
+        sent = 0
+        for segment in segments:
+            if segment["linktype"] != linktype:
+                logger.warning(f"Skipping pcap segment {segment['seq']} with a different link type")
+                continue
+            try:
+                with open(self._path(segment["seq"], "idx"), "rb") as f:
+                    index = f.read()
+                data_path = self._path(segment["seq"], "pcap")
+                data_size = os.path.getsize(data_path)
+                with open(data_path, "rb") as data:
+                    usable = len(index) - len(index) % INDEX_ENTRY.size
+                    for ts_us, packet_hash, offset, length in INDEX_ENTRY.iter_unpack(index[:usable]):
+                        if not start_us <= ts_us < end_us:
+                            continue
+                        if wanted_hash is not None and packet_hash != wanted_hash:
+                            continue
+                        if offset + length > data_size:
+                            break
+                        data.seek(offset)
+                        record = data.read(length)
+                        if not flow_matches(parse_flow(record[RECORD_HEADER.size:], linktype), filters, bidirectional):
+                            continue
+                        buffer += record
+                        sent += 1
+                        if len(buffer) >= chunk_bytes:
+                            yield bytes(buffer)
+                            buffer.clear()
+                        if max_packets and sent >= max_packets:
+                            yield bytes(buffer)
+                            return
+            except FileNotFoundError:
+                # Deleted by retention while we were reading
+                continue
+        yield bytes(buffer)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store size, time coverage and drop counters."""
+        with self._lock:
+            segments = list(self._segments)
+        return {
+            "segments": len(segments),
+            "bytes": sum(segment["bytes"] for segment in segments),
+            "packets_stored": sum(segment["packets"] for segment in segments),
+            "oldest": datetime.fromtimestamp(segments[0]["first_us"] / 1_000_000, timezone.utc).isoformat() if segments else None,
+            "newest": datetime.fromtimestamp(segments[-1]["last_us"] / 1_000_000, timezone.utc).isoformat() if segments else None,
+            "packets_written": self.packets_written,
+            "packets_dropped": self.packets_dropped,
+            "write_errors": self.write_errors,
+            "queue_depth": self._queue.qsize(),
+        }
+
+
+# Global instance
+pcap_store = PcapStore(
+    directory=settings.PCAP_DIR,
+    segment_bytes=settings.PCAP_SEGMENT_BYTES,
+    segment_seconds=settings.PCAP_SEGMENT_SECONDS,
+    max_bytes=settings.PCAP_MAX_BYTES,
+    max_age_seconds=settings.PCAP_MAX_AGE_HOURS * 3600,
+    queue_size=settings.PCAP_QUEUE_SIZE,
+    snaplen=settings.PCAP_SNAPLEN
+)
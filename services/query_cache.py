@@ -0,0 +1,188 @@
+# src/backend/services/query_cache.py
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+import asyncio
+
+from core.config import settings
+from services.log_query import NetworkLogFilter, RELATIVE_TIME_PATTERN, floor_time, resolve_time
+
+
+def split_time_range(
+    filters: NetworkLogFilter,
+    now: datetime,
+    bucket: timedelta,
+    settle: timedelta,
+    segment: timedelta,
+    max_segments: int = 12
+) -> List[Tuple[NetworkLogFilter, bool]]:
+    """
+    Split a filter's time range into cacheable segments and uncached remainders.
+
+    Relative bounds (and the default start of one hour ago) are aligned down
+    to `bucket`. Everything before the last bucket boundary that is at least
+    `settle` old is closed: its data will not change any more. The closed
+    range is cut at multiples of the segment width (`segment`, doubled until
+    the range spans at most `max_segments` of them), so a sliding window
+    keeps hitting the same segments as it moves. A part is cacheable when
+    both its bounds are segment boundaries or absolute times from the
+    request; the rest (a partial leading segment of a relative range, and
+    the partial trailing segment plus the open head) is recomputed.
+
+    Returns:
+        (filter, cacheable) parts with absolute times, oldest first
+    """
+    start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+    relative_start = not filters.start_time or RELATIVE_TIME_PATTERN.match(filters.start_time)
+    if relative_start:
+        start = floor_time(start, bucket)
+    end = resolve_time(filters.end_time, now) if filters.end_time else now
+    relative_end = not filters.end_time or RELATIVE_TIME_PATTERN.match(filters.end_time)
+    if filters.end_time and relative_end:
+        end = floor_time(end, bucket)
+    if start >= end:
+        return []
+    closed_end = max(start, min(end, floor_time(now - settle, bucket)))
+    span = (end - start) // bucket * bucket
+    while span > segment * max_segments:
+        segment *= 2
+
+    fixed = set()
+    if not relative_start:
+        fixed.add(start)
+    if not relative_end:
+        fixed.add(end)
+
+    def stable(moment: datetime) -> bool:
+        return moment in fixed or floor_time(moment, segment) == moment
+
+    cuts = [start]
+    cut = floor_time(start, segment) + segment
+    while cut < closed_end:
+        cuts.append(cut)
+        cut += segment
+    if closed_end > start:
+        cuts.append(closed_end)
+    pieces = [(a, b, stable(a) and stable(b)) for a, b in zip(cuts, cuts[1:])]
+    if closed_end < end:
+        pieces.append((closed_end, end, False))
+
+    # Adjacent uncached pieces are queried together
+    merged: List[Tuple[datetime, datetime, bool]] = []
+    for piece in pieces:
+        if merged and not merged[-1][2] and not piece[2]:
+            merged[-1] = (merged[-1][0], piece[1], False)
+        else:
+            merged.append(piece)
+    return [
+        (filters.model_copy(update={"start_time": a.isoformat(), "end_time": b.isoformat()}), cacheable)
+        for a, b, cacheable in merged
+    ]
+
+
+class QueryCache:
+    """
+    In-memory LRU cache of query results with request coalescing.
+
+    Results are bounded by their total row count. Concurrent requests for
+    the same key share a single in-flight computation, whether or not the
+    result is stored afterwards.
+    """
+
+    def __init__(self, max_rows: int = 200000):
+        """
+        Args:
+            max_rows: Total rows kept across all cached results before evicting
+        """
+        self.max_rows = max_rows
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        store: bool = True
+    ) -> Any:
+        """
+        Return the cached result for key, or compute it once for all concurrent callers.
+
+        Args:
+            key: Normalized, hashable description of the query
+            compute: Coroutine factory producing the result
+            store: Keep the result after computing it (only for immutable ranges)
+
+        Returns:
+            The result; callers must not mutate it, as it may be shared
+        """
+        if store and key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][1]
+        if key in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        # Service methods return [] on failure, so empty results are never stored
+        if store and value:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        rows = len(value) if isinstance(value, (list, dict)) else 1
+        if rows > self.max_rows:
+            return
+        if key in self._entries:
+            self._rows -= self._entries.pop(key)[0]
+        self._entries[key] = (rows, value)
+        self._rows += rows
+        while self._rows > self.max_rows:
+            _, (evicted_rows, _) = self._entries.popitem(last=False)
+            self._rows -= evicted_rows
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result."""
+        self._entries.clear()
+        self._rows = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate, coalescing and memory usage counters."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "rows": self._rows,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "inflight": len(self._inflight),
+        }
+
+
+# Global instance
+query_cache = QueryCache(max_rows=settings.QUERY_CACHE_MAX_ROWS)
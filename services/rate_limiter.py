@@ -0,0 +1,235 @@
+# src/backend/services/rate_limiter.py
+
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.config import settings
+from services.log_query import parse_interval
+from services.message_queue import message_queue
+
+logger = logging.getLogger(__name__)
+
+# Redis key prefix of rate limit state (one theoretical arrival time per key)
+KEY_PREFIX = "ratelimit:"
+
+# GCRA in one round trip. Uses the Redis clock so every process agrees on "now".
+# Returns {allowed, seconds until allowed} with the delay as a string (Lua numbers
+# are truncated to integers in replies).
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local wait = tat - now - tolerance
+if wait > 1e-9 then return {0, tostring(wait)} end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RateLimitPolicy:
+    """
+    `requests` per `period` seconds, allowed in a burst.
+
+    Under GCRA requests are spaced `interval` = period / requests apart on
+    average, and up to `tolerance` = period - interval ahead of schedule.
+    """
+
+    __slots__ = ("requests", "period", "interval", "tolerance")
+
+    def __init__(self, requests: int, period: float):
+        if requests < 1 or period <= 0:
+            raise ValueError(f"Invalid rate limit {requests}/{period}s")
+        self.requests = requests
+        self.period = period
+        self.interval = period / requests
+        self.tolerance = period - self.interval
+
+    def __repr__(self) -> str:
+        return f"RateLimitPolicy({self.requests}/{self.period}s)"
+
+
+def parse_policies(spec: str) -> Dict[Tuple[str, Optional[str]], RateLimitPolicy]:
+    """
+    Parse RATE_LIMIT_POLICIES, e.g. "control=5/10s,control:admin=20/10s".
+
+    Returns:
+        Policies keyed by (route, role); role None applies to every other role
+
+    Raises:
+        ValueError: For malformed entries
+    """
+    policies: Dict[Tuple[str, Optional[str]], RateLimitPolicy] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        match = re.fullmatch(r"([\w.-]+)(?::(\w+))?=(\d+)/(\d+[smhdw])", entry)
+        if not match:
+            raise ValueError(f"Invalid rate limit policy: {entry}")
+        route, role, requests, period = match.groups()
+        policies[(route, role)] = RateLimitPolicy(int(requests), parse_interval(period).total_seconds())
+    return policies
+
+
+class MemoryRateLimitBackend:
+    """
+    Per-process GCRA state: one float per key.
+
+    A key's state is worthless once its arrival time has passed, so expired
+    keys are swept every `sweep_seconds`; beyond `max_keys` the least
+    recently used key is forgotten.
+    """
+
+    def __init__(self, max_keys: int = 100000, sweep_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.sweep_seconds = sweep_seconds
+        self.clock = clock
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._next_sweep = clock() + sweep_seconds
+        self.evicted = 0
+
+    def _sweep(self, now: float):
+        expired = [key for key, tat in self._tats.items() if tat <= now]
+        for key in expired:
+            del self._tats[key]
+        self.evicted += len(expired)
+        self._next_sweep = now + self.sweep_seconds
+
+    async def acquire(self, key: str, policy: RateLimitPolicy) -> Tuple[bool, float]:
+        """
+        Take one request from a key's allowance.
+
+        Returns:
+            Whether it is allowed, and the seconds to wait if not
+        """
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        tat = max(self._tats.get(key, now), now)
+        wait = tat - now - policy.tolerance
+        # Rounding must not cost the last request of a burst
+        if wait > 1e-9:
+            return False, wait
+        self._tats[key] = tat + policy.interval
+        self._tats.move_to_end(key)
+        if len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+            self.evicted += 1
+        return True, 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._tats), "evicted": self.evicted}
+
+
+class RedisRateLimitBackend:
+    """GCRA state in Redis, updated atomically by a Lua script so limits hold across workers."""
+
+    def __init__(self):
+        self._script = None
+        self._client = None
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return message_queue.redis_client is not None
+
+    async def acquire(self, key: str, policy: RateLimitPolicy) -> Tuple[bool, float]:
+        """Same contract as MemoryRateLimitBackend.acquire; raises on Redis errors."""
+        client = message_queue.redis_client
+        if client is not self._client:
+            # The bus reconnects with new clients; scripts are registered per client (EVALSHA with fallback)
+            self._client, self._script = client, client.register_script(GCRA_SCRIPT)
+        allowed, wait = await self._script(keys=[KEY_PREFIX + key], args=[policy.interval, policy.tolerance])
+        return bool(int(allowed)), float(wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"errors": self.errors}
+
+
+class RateLimiter:
+    """
+    Rate limiting shared by every API route.
+
+    Limits come from RATE_LIMIT_POLICIES per route, optionally overridden
+    per role. With RATE_LIMIT_BACKEND "auto" and Redis reachable, state
+    lives in Redis and is shared by all workers; with "memory", and
+    whenever a Redis call fails, the in-process backend is used.
+    """
+
+    def __init__(self, policies: Dict[Tuple[str, Optional[str]], RateLimitPolicy], backend: str = "auto",
+                 memory: Optional[MemoryRateLimitBackend] = None):
+        """
+        Args:
+            policies: Policies keyed by (route, role); see parse_policies
+            backend: "auto" or "memory"
+            memory: In-process backend (a default one if omitted)
+        """
+        self.policies = policies
+        self.backend = backend
+        self.memory = memory or MemoryRateLimitBackend()
+        self.redis = RedisRateLimitBackend()
+        self.allowed = 0
+        self.limited = 0
+
+    def policy_for(self, route: str, role: Optional[str] = None) -> Optional[RateLimitPolicy]:
+        """The policy of a route for a role, or None if the route is unlimited."""
+        return self.policies.get((route, role)) or self.policies.get((route, None))
+
+    async def check(self, route: str, identity: str, role: Optional[str] = None) -> Tuple[bool, float]:
+        """
+        Count one request of `identity` against the route's policy.
+
+        Args:
+            route: Policy route name (e.g. "control")
+            identity: Who is limited, e.g. a user ID or client IP
+            role: Role of the caller, for role-specific policies
+
+        Returns:
+            Whether the request is allowed, and the seconds to wait if not
+        """
+        policy = self.policy_for(route, role)
+        if policy is None:
+            return True, 0.0
+        key = f"{route}:{identity}"
+        result = None
+        if self.backend == "auto" and self.redis.available:
+            try:
+                result = await self.redis.acquire(key, policy)
+            except Exception as e:
+                self.redis.errors += 1
+                logger.error(f"Redis rate limit check failed, using in-process limits: {e}")
+        if result is None:
+            result = await self.memory.acquire(key, policy)
+        if result[0]:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get allow/limit counters and backend state."""
+        return {
+            "backend": "redis" if self.backend == "auto" and self.redis.available else "memory",
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "memory": self.memory.get_stats(),
+            "redis": self.redis.get_stats(),
+        }
+
+
+def retry_after_header(wait: float) -> Dict[str, str]:
+    """Retry-After header for a denied request."""
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
+
+
+# Global instance
+rate_limiter = RateLimiter(
+    parse_policies(settings.RATE_LIMIT_POLICIES),
+    backend=settings.RATE_LIMIT_BACKEND,
+    memory=MemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MEMORY_MAX_KEYS)
+)
@@ -0,0 +1,196 @@
+# src/backend/services/rollups.py
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import logging
+import threading
+
+from services.line_protocol import encode_line, timestamp_us
+from services.log_query import floor_time
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MEASUREMENT = "traffic_rollup"
+
+# Dimensions counted per bucket; host dimensions are truncated to the top talkers
+ROLLUP_DIMENSIONS = ("protocol", "dest_port", "source_ip", "dest_ip")
+TRUNCATED_DIMENSIONS = ("dest_port", "source_ip", "dest_ip")
+OTHER_KEY = "other"
+
+# Tiers from finest to coarsest: name -> bucket width
+TIERS = {"1m": timedelta(minutes=1), "1h": timedelta(hours=1)}
+
+Counters = Dict[Tuple[str, str], List[int]]
+
+
+def select_rollup_tier(span: timedelta, interval: Optional[timedelta] = None) -> Optional[str]:
+    """
+    Pick the coarsest rollup tier that still fits the requested resolution.
+
+    With an explicit interval, the tier width must divide it. Totals
+    over a span use the hourly tier beyond a day and the minute tier beyond
+    an hour; shorter spans read raw data.
+
+    Returns:
+        Tier name, or None to read raw data
+    """
+    if interval is not None:
+        fitting = [name for name, width in TIERS.items() if width <= interval and interval % width == timedelta(0)]
+        return fitting[-1] if fitting else None
+    if span > timedelta(hours=24):
+        return "1h"
+    if span > timedelta(hours=1):
+        return "1m"
+    return None
+
+
+def _add(counters: Counters, dimension: str, key: Any, length: int, packets: int = 1):
+    entry = counters.setdefault((dimension, str(key)), [0, 0])
+    entry[0] += packets
+    entry[1] += length
+
+
+def _truncate(counters: Counters, keep: int) -> Counters:
+    """Keep the `keep` busiest keys of each truncated dimension, folding the rest into 'other'."""
+    result: Counters = {}
+    by_dimension: Dict[str, List[Tuple[str, List[int]]]] = {}
+    for (dimension, key), values in counters.items():
+        if dimension in TRUNCATED_DIMENSIONS:
+            by_dimension.setdefault(dimension, []).append((key, values))
+        else:
+            result[(dimension, key)] = values
+    for dimension, entries in by_dimension.items():
+        entries.sort(key=lambda entry: entry[1][0], reverse=True)
+        for key, values in entries[:keep]:
+            result[(dimension, key)] = list(values)
+        for key, values in entries[keep:]:
+            _add(result, dimension, OTHER_KEY, values[1], values[0])
+    return result
+
+
+def _ranked(counters: Counters) -> List[Tuple[str, str, str, List[int]]]:
+    """(dimension, rank, key, values) rows, busiest first per dimension; 'other' gets rank "other"."""
+    rows = []
+    rank: Dict[str, int] = {}
+    for (dimension, key), values in sorted(counters.items(), key=lambda item: (item[0][0], -item[1][0], item[0][1])):
+        if key == OTHER_KEY and dimension in TRUNCATED_DIMENSIONS:
+            rows.append((dimension, OTHER_KEY, key, values))
+            continue
+        rows.append((dimension, str(rank.get(dimension, 0)), key, values))
+        rank[dimension] = rank.get(dimension, 0) + 1
+    return rows
+
+
+class RollupAggregator:
+    """
+    Engine-side downsampler producing per-minute and per-hour traffic rollups.
+
+    Packets are counted into the open bucket of every tier. When a bucket
+    closes, its counters (top talkers plus an 'other' remainder) are handed
+    to the tier's emit callback as traffic_rollup line protocol records.
+
+    Keys (IPs, ports) are stored as a string field; the only per-key tag is
+    the key's rank within its bucket, so the number of series stays bounded
+    by `top_keys` per dimension however many hosts are seen.
+
+    When several workers share the packet stream, each counts only its
+    share; their points carry a worker tag so they do not overwrite each
+    other, and rollup queries sum over it.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, List[str]], None],
+        sensor: str,
+        top_keys: int = 50,
+        worker: Optional[str] = None
+    ):
+        """
+        Args:
+            emit: Called with (tier, lines) when a bucket closes
+            sensor: Identifier of the capturing sensor, stored as a tag
+            top_keys: Keys kept per truncated dimension per bucket
+            worker: Identifier of this worker, stored as a tag (None with a single worker)
+        """
+        self.emit = emit
+        self.sensor = sensor
+        self.worker = worker
+        self.top_keys = top_keys
+        self._buckets: Dict[str, Tuple[Optional[datetime], Counters]] = {tier: (None, {}) for tier in TIERS}
+        self._lock = threading.Lock()
+        self.buckets_emitted = 0
+
+    def record(self, log_data: Dict[str, Any]):
+        """Count a packet into the open bucket of every tier."""
+        moment = datetime.fromtimestamp(timestamp_us(log_data.get("timestamp")) / 1_000_000, timezone.utc)
+        length = log_data.get("length", 0)
+        with self._lock:
+            self._record(moment, length, log_data)
+
+    def _record(self, moment: datetime, length: int, log_data: Dict[str, Any]):
+        for tier, width in TIERS.items():
+            start, counters = self._buckets[tier]
+            bucket_start = floor_time(moment, width)
+            if start is None:
+                start = bucket_start
+            elif bucket_start > start:
+                self._close(tier, start, counters)
+                start, counters = bucket_start, {}
+            # Late packets for an already-closed bucket are counted in the open one
+            _add(counters, "protocol", log_data.get("protocol", "unknown"), length)
+            _add(counters, "source_ip", log_data.get("source_ip", "unknown"), length)
+            _add(counters, "dest_ip", log_data.get("dest_ip", "unknown"), length)
+            if log_data.get("dest_port"):
+                _add(counters, "dest_port", log_data["dest_port"], length)
+            # Counters are exact until the bucket closes; truncating earlier could drop a final top key
+            self._buckets[tier] = (start, counters)
+
+    def flush_due(self, now: Optional[datetime] = None):
+        """Close buckets whose time has passed even if no new packets arrived."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            for tier, width in TIERS.items():
+                start, counters = self._buckets[tier]
+                if start is not None and floor_time(now, width) > start:
+                    self._close(tier, start, counters)
+                    self._buckets[tier] = (None, {})
+
+    def close(self):
+        """
+        Emit every open bucket as a partial, e.g. at shutdown.
+
+        Partials are stamped with the current time (still inside the bucket)
+        rather than the bucket start, so the remainder written after a
+        restart lands on a different point instead of overwriting this one.
+        """
+        with self._lock:
+            for tier in TIERS:
+                start, counters = self._buckets[tier]
+                if start is not None:
+                    self._close(tier, start, counters, partial=True)
+                self._buckets[tier] = (None, {})
+
+    def _close(self, tier: str, start: datetime, counters: Counters, partial: bool = False):
+        if not counters:
+            return
+        timestamp = int(start.timestamp()) * 1_000_000
+        if partial:
+            bucket_end = timestamp + int(TIERS[tier].total_seconds() * 1_000_000) - 1
+            timestamp = min(max(timestamp_us(None), timestamp + 1), bucket_end)
+        tags = {"sensor": self.sensor}
+        if self.worker:
+            tags["worker"] = self.worker
+        lines = [
+            encode_line(
+                ROLLUP_MEASUREMENT,
+                tags={**tags, "dimension": dimension, "rank": rank},
+                fields={"key": key, "packets": values[0], "bytes": values[1]},
+                timestamp=timestamp,
+            )
+            for dimension, rank, key, values in _ranked(_truncate(counters, self.top_keys))
+        ]
+        try:
+            self.emit(tier, lines)
+            self.buckets_emitted += 1
+        except Exception as e:
+            logger.error(f"Failed to emit {tier} rollup for {start.isoformat()}: {e}")
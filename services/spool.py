@@ -0,0 +1,288 @@
+# src/backend/services/spool.py
+
+import fcntl
+import os
+import threading
+import logging
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".lp"
+# Held (flock) by the process owning a spool directory for as long as it runs
+LOCK_NAME = ".lock"
+
+
+def _lock_directory(directory: str) -> Optional[int]:
+    """Take the directory's lock without waiting; returns the held descriptor, or None if another process holds it."""
+    fd = os.open(os.path.join(directory, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class WriteAheadSpool:
+    """
+    Append-only, segmented on-disk spool for line protocol records.
+
+    Records are appended sequentially to the active segment. Once a segment
+    reaches `segment_bytes` it is fsynced and sealed; sealed segments are
+    replayed oldest-first and deleted once their records are persisted.
+    When the spool exceeds `max_bytes` the oldest segments are evicted,
+    except the one being replayed, which stays pinned until it is committed.
+
+    The directory is locked for as long as the spool is open, so no two
+    processes ever write or delete the same segments. Processes sharing a
+    parent directory each get their own subdirectory (`adopt_from`); a
+    spool adopts the segments of every sibling whose owner has exited, and
+    only while holding that sibling's lock.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+        adopt_from: Optional[str] = None
+    ):
+        """
+        Args:
+            directory: Directory holding this spool's segments
+            segment_bytes: Size at which the active segment is sealed
+            max_bytes: Total size before the oldest segments are evicted
+            adopt_from: Parent directory whose orphaned spools (and loose segments) are taken over
+
+        Raises:
+            OSError: If the directory cannot be created or another process has it open
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._sealed: List[Tuple[str, int]] = []
+        self._active = None
+        self._active_path: Optional[str] = None
+        self._active_bytes = 0
+        self._next_sequence = 0
+        # Segment handed out by read_oldest and not yet committed; never evicted
+        self._replaying: Optional[str] = None
+
+        self.records_spooled = 0
+        self.records_replayed = 0
+        self.segments_evicted = 0
+        self.bytes_evicted = 0
+        self.segments_adopted = 0
+
+        self._lock_fd = self._open_directory(adopt_from is not None)
+        self._recover()
+        if adopt_from is not None:
+            self._adopt(adopt_from)
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{sequence:012d}{SEGMENT_SUFFIX}")
+
+    def _open_directory(self, shared_parent: bool) -> int:
+        """Create and lock the spool directory."""
+        if shared_parent and not os.path.isdir(self.directory):
+            # Created locked under a hidden name, so siblings never adopt it half-made
+            parent = os.path.dirname(self.directory) or "."
+            os.makedirs(parent, exist_ok=True)
+            staging = os.path.join(parent, f".{uuid.uuid4().hex}")
+            os.mkdir(staging)
+            fd = _lock_directory(staging)
+            os.rename(staging, self.directory)
+            return fd
+        os.makedirs(self.directory, exist_ok=True)
+        fd = _lock_directory(self.directory)
+        if fd is None:
+            raise OSError(f"Spool directory {self.directory} is in use by another process")
+        return fd
+
+    @staticmethod
+    def _segment_names(directory: str) -> List[str]:
+        return sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _recover(self):
+        """Pick up segments left behind by a previous run; they are treated as sealed."""
+        names = self._segment_names(self.directory)
+        for name in names:
+            path = os.path.join(self.directory, name)
+            size = os.path.getsize(path)
+            if size == 0:
+                os.remove(path)
+                continue
+            self._sealed.append((path, size))
+        if names:
+            self._next_sequence = int(names[-1][len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1
+        if self._sealed:
+            logger.info(f"Recovered {len(self._sealed)} spool segments ({self._total_bytes()} bytes)")
+
+    def _adopt(self, parent: str):
+        """Move the segments of unlocked sibling spools (and of the parent itself) into this one."""
+        own = os.path.abspath(self.directory)
+        candidates = [parent] + [
+            os.path.join(parent, name) for name in sorted(os.listdir(parent))
+            if not name.startswith(".") and os.path.isdir(os.path.join(parent, name))
+            and os.path.abspath(os.path.join(parent, name)) != own
+        ]
+        for candidate in candidates:
+            try:
+                fd = _lock_directory(candidate)
+            except OSError:
+                continue
+            if fd is None:
+                # Its owner is still running
+                continue
+            try:
+                for name in self._segment_names(candidate):
+                    source = os.path.join(candidate, name)
+                    size = os.path.getsize(source)
+                    if size == 0:
+                        os.remove(source)
+                        continue
+                    target = self._segment_path(self._next_sequence)
+                    self._next_sequence += 1
+                    os.rename(source, target)
+                    self._sealed.append((target, size))
+                    self.segments_adopted += 1
+                if candidate != parent:
+                    os.remove(os.path.join(candidate, LOCK_NAME))
+                    os.rmdir(candidate)
+            except OSError as e:
+                logger.error(f"Failed to adopt spool {candidate}: {e}")
+            finally:
+                os.close(fd)
+        if self.segments_adopted:
+            logger.info(f"Adopted {self.segments_adopted} spool segments of exited workers")
+
+    def _total_bytes(self) -> int:
+        return sum(size for _, size in self._sealed) + self._active_bytes
+
+    def _seal_active(self):
+        """fsync and close the active segment, moving it to the sealed list."""
+        if not self._active:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        if self._active_bytes:
+            self._sealed.append((self._active_path, self._active_bytes))
+        else:
+            os.remove(self._active_path)
+        self._active = None
+        self._active_path = None
+        self._active_bytes = 0
+
+    def _evict(self):
+        """Drop the oldest sealed segments until the spool fits in max_bytes."""
+        while self._total_bytes() > self.max_bytes:
+            evictable = [index for index, (path, _) in enumerate(self._sealed) if path != self._replaying]
+            if not evictable:
+                return
+            path, size = self._sealed.pop(evictable[0])
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Failed to evict spool segment {path}: {e}")
+            self.segments_evicted += 1
+            self.bytes_evicted += size
+            logger.warning(f"Spool full, evicted oldest segment {os.path.basename(path)} ({size} bytes)")
+
+    def append(self, lines: List[str]):
+        """Append records to the active segment, rolling and evicting as needed."""
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            if not self._active:
+                self._active_path = self._segment_path(self._next_sequence)
+                self._next_sequence += 1
+                self._active = open(self._active_path, "ab")
+            self._active.write(data)
+            self._active_bytes += len(data)
+            self.records_spooled += len(lines)
+            if self._active_bytes >= self.segment_bytes:
+                self._seal_active()
+            self._evict()
+
+    def has_pending(self) -> bool:
+        """Whether any records are waiting to be replayed."""
+        return bool(self._sealed) or self._active_bytes > 0
+
+    def read_oldest(self) -> Optional[Tuple[str, List[str]]]:
+        """
+        Read the oldest segment for replay, sealing the active one if it is all that is left.
+
+        Returns:
+            (segment path, records) or None if the spool is empty
+
+        Raises:
+            OSError: If the segment cannot be read; see discard_replaying
+        """
+        with self._lock:
+            if not self._sealed:
+                self._seal_active()
+            if not self._sealed:
+                return None
+            path, _ = self._sealed[0]
+            self._replaying = path
+        with open(path, "rb") as segment:
+            data = segment.read().decode("utf-8", errors="replace")
+        lines = data.split("\n")
+        # The last element is empty for a complete segment, or a torn record after a crash
+        return path, [line for line in lines[:-1] if line]
+
+    def commit(self, path: str, record_count: int = 0):
+        """Delete a segment whose records have been persisted."""
+        with self._lock:
+            self._sealed = [(p, size) for p, size in self._sealed if p != path]
+            self.records_replayed += record_count
+            if self._replaying == path:
+                self._replaying = None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def discard_replaying(self):
+        """Drop the segment read_oldest failed to read, so replay moves on to the next one."""
+        with self._lock:
+            path = self._replaying
+            if path is None:
+                return
+            size = sum(s for p, s in self._sealed if p == path)
+            self.segments_evicted += 1
+            self.bytes_evicted += size
+        logger.warning(f"Discarding unreadable spool segment {os.path.basename(path)} ({size} bytes)")
+        self.commit(path)
+
+    def close(self):
+        """fsync and close the active segment, and release the directory."""
+        with self._lock:
+            self._seal_active()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spool depth and eviction counters."""
+        with self._lock:
+            return {
+                "segments": len(self._sealed) + (1 if self._active_bytes else 0),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                "records_spooled": self.records_spooled,
+                "records_replayed": self.records_replayed,
+                "segments_evicted": self.segments_evicted,
+                "bytes_evicted": self.bytes_evicted,
+                "segments_adopted": self.segments_adopted,
+            }
@@ -0,0 +1,553 @@
+# src/backend/services/sqlite_backend.py
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import asyncio
+import bisect
+import ipaddress
+import logging
+import os
+import sqlite3
+import threading
+
+from services.influx_writer import BatchingWriter
+from services.line_protocol import classify_direction, timestamp_us
+from services.log_query import (
+    NetworkLogFilter,
+    GROUPABLE_COLUMNS,
+    merge_aggregate_rows,
+    parse_interval,
+    resolve_time,
+)
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "network_logs_"
+
+INSERT_COLUMNS = (
+    "ts", "protocol", "direction", "source_ip", "source_port", "dest_ip", "dest_port",
+    "length", "summary", "flags", "threat_indicators",
+)
+
+AGGREGATE_EXPRESSIONS = {"packets": "COUNT(*)", "bytes": "TOTAL(length)"}
+
+# One table per time partition; the indexes cover time-range scans and
+# IP lookups together with the columns aggregates read, so neither
+# needs to touch the table itself.
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    ts INTEGER NOT NULL,
+    protocol TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    source_ip TEXT NOT NULL,
+    source_port INTEGER NOT NULL,
+    dest_ip TEXT NOT NULL,
+    dest_port INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    summary TEXT,
+    flags TEXT,
+    threat_indicators TEXT
+);
+CREATE INDEX IF NOT EXISTS {table}_time ON {table} (ts, protocol, length);
+CREATE INDEX IF NOT EXISTS {table}_protocol ON {table} (protocol, ts, length);
+CREATE INDEX IF NOT EXISTS {table}_source_ip ON {table} (source_ip, ts, length);
+CREATE INDEX IF NOT EXISTS {table}_dest_ip ON {table} (dest_ip, ts, length);
+"""
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=256)
+def _network(cidr: str):
+    return ipaddress.ip_network(cidr, strict=False)
+
+
+def _cidr_match(ip: Optional[str], cidr: str) -> bool:
+    """SQL function: whether an address lies inside a network."""
+    try:
+        return ipaddress.ip_address(ip) in _network(cidr)
+    except (TypeError, ValueError):
+        return False
+
+
+def _to_datetime(ts: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=ts)
+
+
+def sql_predicates(filters: NetworkLogFilter) -> Tuple[List[str], List[Any]]:
+    """
+    Render the non-time parts of a filter as SQL predicates with bound parameters.
+
+    Returns:
+        (clauses to AND together, parameters in order)
+    """
+    clauses, params = [], []
+    if filters.protocol:
+        clauses.append("protocol = ?")
+        params.append(filters.protocol)
+    if filters.source_ip:
+        clauses.append("source_ip = ?")
+        params.append(filters.source_ip)
+    if filters.dest_ip:
+        clauses.append("dest_ip = ?")
+        params.append(filters.dest_ip)
+    if filters.ip:
+        clauses.append("(source_ip = ? OR dest_ip = ?)")
+        params += [filters.ip, filters.ip]
+    if filters.source_port is not None:
+        clauses.append("source_port = ?")
+        params.append(filters.source_port)
+    if filters.dest_port is not None:
+        clauses.append("dest_port = ?")
+        params.append(filters.dest_port)
+    if filters.port is not None:
+        clauses.append("(source_port = ? OR dest_port = ?)")
+        params += [filters.port, filters.port]
+    if filters.source_cidr:
+        clauses.append("cidr_match(source_ip, ?)")
+        params.append(filters.source_cidr)
+    if filters.dest_cidr:
+        clauses.append("cidr_match(dest_ip, ?)")
+        params.append(filters.dest_cidr)
+    if filters.cidr:
+        clauses.append("(cidr_match(source_ip, ?) OR cidr_match(dest_ip, ?))")
+        params += [filters.cidr, filters.cidr]
+    for indicator in filters.indicators:
+        # instr rather than LIKE, since "_" is a LIKE wildcard
+        clauses.append("instr(',' || IFNULL(threat_indicators, '') || ',', ?) > 0")
+        params.append(f",{indicator},")
+    return clauses, params
+
+
+class SQLiteBackend:
+    """
+    Embedded network log store for single-box deployments and tests.
+
+    Logs go to one table per time partition in a WAL-mode database, so
+    readers never block the batched writer and retention is a DROP TABLE.
+    Writes are queued and inserted in batches by a BatchingWriter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        partition_hours: int = 24,
+        retention_days: int = 30,
+        batch_size: int = 5000,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 100000
+    ):
+        """
+        Args:
+            path: Database file path
+            partition_hours: Width of each time partition table
+            retention_days: Age after which partitions are dropped (0 keeps them)
+            batch_size: Rows per insert transaction
+            flush_interval: Maximum seconds a row waits before being inserted
+            max_queue_size: Rows queued before new ones are dropped
+        """
+        self.path = path
+        self.partition_us = partition_hours * 3600 * 1_000_000
+        self.retention_days = retention_days
+        self.conn: Optional[sqlite3.Connection] = None
+        self.writer: Optional[BatchingWriter] = None
+        self._write_lock = threading.Lock()
+        self._partition_lock = threading.Lock()
+        # Sorted partition start times (epoch microseconds)
+        self._partitions: List[int] = []
+        self._local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = self._connect()
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._partitions = sorted(
+                self._partition_start(name)
+                for (name,) in self.conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (PARTITION_PREFIX + "%",)
+                )
+            )
+            self.writer = BatchingWriter(
+                write_fn=self._write_rows,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                max_queue_size=max_queue_size,
+                name="sqlite-writer"
+            )
+            self.writer.start()
+            logger.info(f"SQLite backend ready with {len(self._partitions)} partitions")
+        except Exception as e:
+            logger.error(f"Failed to initialize SQLite backend: {e}")
+            self.conn = None
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=1")
+        conn.create_function("cidr_match", 2, _cidr_match, deterministic=True)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection; WAL lets readers run alongside the writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect(read_only=True)
+            self._local.conn = conn
+            self._read_conns.append(conn)
+        return conn
+
+    def _table(self, start: int) -> str:
+        return PARTITION_PREFIX + _to_datetime(start).strftime("%Y%m%d%H")
+
+    @staticmethod
+    def _partition_start(table: str) -> int:
+        moment = datetime.strptime(table[len(PARTITION_PREFIX):], "%Y%m%d%H").replace(tzinfo=timezone.utc)
+        return int((moment - _EPOCH) / timedelta(microseconds=1))
+
+    def _partitions_between(self, start: int, end: int, newest_first: bool = False) -> List[str]:
+        """Tables of partitions overlapping [start, end)."""
+        with self._partition_lock:
+            starts = [p for p in self._partitions if p < end and p + self.partition_us > start]
+        if newest_first:
+            starts.reverse()
+        return [self._table(p) for p in starts]
+
+    @staticmethod
+    def _time_range(filters: NetworkLogFilter) -> Tuple[int, int]:
+        """Resolve a filter's time bounds to epoch microseconds (default: the last hour)."""
+        now = datetime.now(timezone.utc)
+        start = resolve_time(filters.start_time, now) if filters.start_time else now - timedelta(hours=1)
+        end = resolve_time(filters.end_time, now) if filters.end_time else now
+        return (
+            int((start - _EPOCH) / timedelta(microseconds=1)),
+            int((end - _EPOCH) / timedelta(microseconds=1)),
+        )
+
+    @staticmethod
+    def _where(filters: NetworkLogFilter, start: int, end: int) -> Tuple[str, List[Any]]:
+        clauses, params = sql_predicates(filters)
+        return " AND ".join(["ts >= ?", "ts < ?"] + clauses), [start, end] + params
+
+    @staticmethod
+    def _to_row(log_data: Dict[str, Any]) -> Tuple:
+        source_ip = log_data.get("source_ip", "unknown")
+        dest_ip = log_data.get("dest_ip", "unknown")
+        return (
+            timestamp_us(log_data.get("timestamp")),
+            log_data.get("protocol", "unknown"),
+            classify_direction(source_ip, dest_ip),
+            source_ip,
+            log_data.get("source_port") or 0,
+            dest_ip,
+            log_data.get("dest_port") or 0,
+            log_data.get("length", 0),
+            log_data.get("summary", ""),
+            ",".join(log_data.get("flags", [])) or None,
+            ",".join(log_data.get("threat_indicators", [])) or None,
+        )
+
+    @staticmethod
+    def _row_to_log(row: sqlite3.Row) -> Dict[str, Any]:
+        moment = _to_datetime(row["ts"])
+        return {
+            "id": f"log-{moment.timestamp()}",
+            "timestamp": moment.isoformat(),
+            "protocol": row["protocol"],
+            "source_ip": row["source_ip"],
+            "source_port": row["source_port"],
+            "dest_ip": row["dest_ip"],
+            "dest_port": row["dest_port"],
+            "length": row["length"],
+            "summary": row["summary"],
+        }
+
+    def _write_rows(self, rows: List[Tuple]):
+        """Insert a batch in one transaction, creating partitions as needed (raises on failure)."""
+        by_partition: Dict[int, List[Tuple]] = {}
+        for row in rows:
+            by_partition.setdefault(row[0] - row[0] % self.partition_us, []).append(row)
+        placeholders = ", ".join("?" for _ in INSERT_COLUMNS)
+        with self._write_lock:
+            for start in by_partition:
+                if start not in self._partitions:
+                    self.conn.executescript(PARTITION_SCHEMA.format(table=self._table(start)))
+                    with self._partition_lock:
+                        bisect.insort(self._partitions, start)
+            with self.conn:
+                for start, partition_rows in by_partition.items():
+                    self.conn.executemany(
+                        f"INSERT INTO {self._table(start)} ({', '.join(INSERT_COLUMNS)}) VALUES ({placeholders})",
+                        partition_rows
+                    )
+
+    def write_network_log(self, log_data: Dict[str, Any]) -> bool:
+        """
+        Queue a network log entry for batched insertion.
+
+        Args:
+            log_data: Dictionary containing packet information
+
+        Returns:
+            bool: True if queued, False otherwise
+        """
+        if not self.conn or not self.writer:
+            logger.error("SQLite backend not initialized")
+            return False
+        try:
+            return self.writer.submit(self._to_row(log_data))
+        except Exception as e:
+            logger.error(f"Failed to queue network log for SQLite: {e}")
+            return False
+
+    def write_batch(self, logs: List[Dict[str, Any]]) -> bool:
+        """
+        Queue several network log entries for batched insertion.
+
+        Returns:
+            bool: True if every entry was queued
+        """
+        queued = [self.write_network_log(log_data) for log_data in logs]
+        return all(queued)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every row queued so far has been inserted."""
+        return self.writer.drain(timeout) if self.writer else True
+
+    def query_network_logs(
+        self,
+        limit: int = 100,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        protocol_filter: Optional[str] = None,
+        filters: Optional[NetworkLogFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Query the latest network logs, newest first.
+
+        Partitions are read newest first and the scan stops as soon as
+        `limit` rows have been found.
+
+        Args:
+            limit: Maximum number of records to return
+            start_time: Start time in RFC3339 format
+            end_time: End time in RFC3339 format
+            protocol_filter: Filter by protocol (TCP, UDP, etc.)
+            filters: Additional IP/port/CIDR/indicator filters
+
+        Returns:
+            List of log entries
+        """
+        if not self.conn:
+            logger.error("SQLite backend not initialized")
+            return []
+
+        try:
+            overrides = {"start_time": start_time, "end_time": end_time, "protocol": protocol_filter}
+            filters = (filters or NetworkLogFilter()).model_copy(
+                update={key: value for key, value in overrides.items() if value is not None}
+            )
+            start, end = self._time_range(filters)
+            where, params = self._where(filters, start, end)
+            logs = []
+            for table in self._partitions_between(start, end, newest_first=True):
+                rows = self._reader().execute(
+                    f"SELECT * FROM {table} WHERE {where} ORDER BY ts DESC LIMIT ?", params + [limit - len(logs)]
+                )
+                logs += [self._row_to_log(row) for row in rows]
+                if len(logs) >= limit:
+                    break
+            return logs
+
+        except Exception as e:
+            logger.error(f"Failed to query SQLite: {e}")
+            return []
+
+    def stream_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        resume_from: Optional[Tuple[datetime, int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every matching network log, oldest first, in constant memory.
+
+        Uses a dedicated connection, since a streaming response may be
+        iterated from several threads. Errors are raised.
+
+        Args:
+            filters: Which logs to include (defaults to the last hour, up to now)
+            resume_from: (timestamp, rows already sent with that timestamp) from a cursor
+
+        Yields:
+            Log entries in the same shape as query_network_logs
+        """
+        if not self.conn:
+            raise RuntimeError("SQLite backend not initialized")
+
+        start, end = self._time_range(filters)
+        skip_time, skip = resume_from or (None, 0)
+        skip_ts = int((skip_time - _EPOCH) / timedelta(microseconds=1)) if skip_time else None
+        if skip_ts is not None:
+            start = max(start, skip_ts)
+        where, params = self._where(filters, start, end)
+        conn = self._connect(read_only=True)
+        try:
+            for table in self._partitions_between(start, end):
+                cursor = conn.execute(
+                    f"SELECT * FROM {table} WHERE {where} ORDER BY ts, source_ip, dest_ip, source_port, dest_port",
+                    params
+                )
+                for row in cursor:
+                    if skip and row["ts"] == skip_ts:
+                        skip -= 1
+                        continue
+                    skip = 0
+                    yield self._row_to_log(row)
+        finally:
+            conn.close()
+
+    def aggregate_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        group_by: Optional[str] = None,
+        interval: Optional[str] = None,
+        metric: str = "packets",
+        top: Optional[int] = None,
+        exclude_zero: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Compute packet or byte counts with SQL GROUP BY over each partition.
+
+        Args:
+            filters: Which logs to include
+            group_by: Column to group by (protocol, source_ip, dest_port, ...) or None
+            interval: Window duration for a time series (e.g. "1m"), or None for totals
+            metric: "packets" or "bytes"
+            top: Keep only the N largest groups (totals only)
+            exclude_zero: Skip rows where the group_by column is 0
+
+        Returns:
+            List of {"time", "key", "value"} rows; time (the window end) is None for totals
+        """
+        if not self.conn:
+            logger.error("SQLite backend not initialized")
+            return []
+
+        try:
+            if group_by is not None and group_by not in GROUPABLE_COLUMNS:
+                raise ValueError(f"Cannot group by {group_by}")
+            if metric not in AGGREGATE_EXPRESSIONS:
+                raise ValueError(f"Unknown metric {metric}")
+            every = int(parse_interval(interval) / timedelta(microseconds=1)) if interval else None
+
+            start, end = self._time_range(filters)
+            where, params = self._where(filters, start, end)
+            if exclude_zero and group_by:
+                where += f" AND {group_by} != 0"
+            columns, group_columns = [], []
+            if every:
+                columns.append(f"(ts / {every} + 1) * {every} AS window_end")
+                group_columns.append("window_end")
+            if group_by:
+                columns.append(group_by)
+                group_columns.append(group_by)
+            columns.append(f"{AGGREGATE_EXPRESSIONS[metric]} AS value")
+            group_clause = f" GROUP BY {', '.join(group_columns)}" if group_columns else ""
+
+            rows = []
+            for table in self._partitions_between(start, end):
+                for row in self._reader().execute(
+                    f"SELECT {', '.join(columns)} FROM {table} WHERE {where}{group_clause}", params
+                ):
+                    if not row["value"]:
+                        continue
+                    rows.append({
+                        "time": _to_datetime(row["window_end"]).isoformat() if every else None,
+                        "key": row[group_by] if group_by else None,
+                        "value": int(row["value"]),
+                    })
+            # Partitions are grouped separately, so sum across them before ranking
+            return merge_aggregate_rows(rows, interval, top)
+
+        except Exception as e:
+            logger.error(f"Failed to aggregate SQLite logs: {e}")
+            return []
+
+    def drop_expired_partitions(self, now: Optional[datetime] = None) -> int:
+        """
+        Drop partitions that lie entirely before the retention window.
+
+        Returns:
+            int: Number of partitions dropped
+        """
+        if not self.conn or not self.retention_days:
+            return 0
+        now = now or datetime.now(timezone.utc)
+        cutoff = int((now - timedelta(days=self.retention_days) - _EPOCH) / timedelta(microseconds=1))
+        with self._partition_lock:
+            expired = [p for p in self._partitions if p + self.partition_us <= cutoff]
+        with self._write_lock:
+            for start in expired:
+                self.conn.execute(f"DROP TABLE IF EXISTS {self._table(start)}")
+                with self._partition_lock:
+                    self._partitions.remove(start)
+                logger.info(f"Dropped expired partition {self._table(start)}")
+        return len(expired)
+
+    def check_filter(self, filters: NetworkLogFilter):
+        """Every filter is supported (CIDRs are matched with ipaddress)."""
+
+    def is_ready(self) -> bool:
+        """Whether the database was opened."""
+        return self.conn is not None
+
+    def is_backfilling(self) -> bool:
+        """Rows are never replayed into the past, so closed ranges are final."""
+        return False
+
+    def write_lag_seconds(self) -> float:
+        """Worst-case delay of the batching writer, retries included."""
+        return self.writer.max_write_delay() if self.writer else 0.0
+
+    def get_write_stats(self) -> Dict[str, Any]:
+        """Get batched writer metrics plus partition and file sizes."""
+        if not self.writer:
+            return {}
+        stats = self.writer.get_stats()
+        stats["partitions"] = len(self._partitions)
+        stats["database_bytes"] = sum(
+            os.path.getsize(self.path + suffix) for suffix in ("", "-wal") if os.path.exists(self.path + suffix)
+        )
+        return stats
+
+    def prepare(self):
+        """Apply retention once at startup."""
+        self.drop_expired_partitions()
+
+    async def run_maintenance(self):
+        """Drop expired partitions periodically."""
+        while self.conn and self.retention_days:
+            await asyncio.sleep(3600)
+            try:
+                await asyncio.to_thread(self.drop_expired_partitions)
+            except Exception as e:
+                logger.error(f"Failed to drop expired partitions: {e}")
+
+    def close(self):
+        """Insert pending rows, checkpoint the WAL and close connections."""
+        if self.writer:
+            self.writer.close()
+        for conn in self._read_conns:
+            conn.close()
+        self._read_conns = []
+        self._local = threading.local()
+        if self.conn:
+            with self._write_lock:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self.conn.close()
+            self.conn = None
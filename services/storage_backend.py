@@ -0,0 +1,120 @@
+# src/backend/services/storage_backend.py
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple, runtime_checkable
+import logging
+
+from core.config import settings
+from services.log_query import NetworkLogFilter
+
+logger = logging.getLogger(__name__)
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """
+    Interface every network log store implements.
+
+    Writes are queued and batched by the backend itself; reads take a
+    NetworkLogFilter and return rows in the shapes the API serves.
+    """
+
+    def write_network_log(self, log_data: Dict[str, Any]) -> bool:
+        """Queue one parsed packet for writing."""
+        ...
+
+    def write_batch(self, logs: List[Dict[str, Any]]) -> bool:
+        """Queue several parsed packets for writing."""
+        ...
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far has been written."""
+        ...
+
+    def query_network_logs(
+        self,
+        limit: int = 100,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        protocol_filter: Optional[str] = None,
+        filters: Optional[NetworkLogFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """Latest `limit` matching logs, newest first."""
+        ...
+
+    def stream_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        resume_from: Optional[Tuple[datetime, int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching log, oldest first, in a stable order; raises on error."""
+        ...
+
+    def aggregate_network_logs(
+        self,
+        filters: NetworkLogFilter,
+        group_by: Optional[str] = None,
+        interval: Optional[str] = None,
+        metric: str = "packets",
+        top: Optional[int] = None,
+        exclude_zero: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Packet or byte counts as {"time", "key", "value"} rows."""
+        ...
+
+    def check_filter(self, filters: NetworkLogFilter):
+        """Raise ValueError for filters this backend cannot answer."""
+        ...
+
+    def is_ready(self) -> bool:
+        """Whether the backend can serve reads and writes."""
+        ...
+
+    def is_backfilling(self) -> bool:
+        """Whether already-closed time ranges may still receive writes."""
+        ...
+
+    def write_lag_seconds(self) -> float:
+        """Longest a queued log can take to become readable while writes succeed."""
+        ...
+
+    def get_write_stats(self) -> Dict[str, Any]:
+        """Write pipeline metrics for /health."""
+        ...
+
+    def prepare(self):
+        """One-off setup at startup (buckets, retention, schema)."""
+        ...
+
+    async def run_maintenance(self):
+        """Long-running housekeeping task (rollups, retention)."""
+        ...
+
+    def close(self):
+        """Flush pending writes and release resources."""
+        ...
+
+
+def create_storage_backend() -> StorageBackend:
+    """
+    Build the backend selected by STORAGE_BACKEND.
+
+    Backends are imported lazily so that an unused one never opens
+    connections or starts writer threads.
+    """
+    if settings.STORAGE_BACKEND == "sqlite":
+        from services.sqlite_backend import SQLiteBackend
+        logger.info(f"Using SQLite storage backend at {settings.SQLITE_PATH}")
+        return SQLiteBackend(
+            path=settings.SQLITE_PATH,
+            partition_hours=settings.SQLITE_PARTITION_HOURS,
+            retention_days=settings.SQLITE_RETENTION_DAYS
+        )
+    if settings.STORAGE_BACKEND != "influxdb":
+        logger.error(f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND}, falling back to influxdb")
+    from services.database import influxdb_service
+    return influxdb_service
+
+
+# Global instance
+storage_backend = create_storage_backend()
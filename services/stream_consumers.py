@@ -0,0 +1,79 @@
+# src/backend/services/stream_consumers.py
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from core.config import settings
+from services.message_queue import message_queue
+from services.storage_backend import storage_backend
+
+logger = logging.getLogger(__name__)
+
+ALERT_CHANNEL = "security_alerts"
+
+
+async def persist_packets(batch: List[Dict[str, Any]]) -> Optional[List[int]]:
+    """
+    Persistence group handler: queue a batch of packets on the storage backend.
+
+    Returns:
+        Indexes of the packets the backend did not accept; only those stay
+        pending (and are retried), so accepted rows are never written twice
+    """
+    return [index for index, packet in enumerate(batch) if not storage_backend.write_network_log(packet)]
+
+
+async def raise_alerts(batch: List[Dict[str, Any]]) -> Optional[List[int]]:
+    """
+    Alerting group handler: publish an alert for every packet with threat indicators.
+
+    Returns:
+        Indexes of the packets whose alert could not be published, to be retried
+    """
+    failed = []
+    for index, packet in enumerate(batch):
+        indicators = packet.get("threat_indicators") or []
+        if not indicators:
+            continue
+        alert = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "packet_id": packet.get("id"),
+            "packet_timestamp": packet.get("timestamp"),
+            "source_ip": packet.get("source_ip"),
+            "dest_ip": packet.get("dest_ip"),
+            "dest_port": packet.get("dest_port"),
+            "protocol": packet.get("protocol"),
+            "indicators": indicators
+        }
+        if not await message_queue.publish_packet_data(ALERT_CHANNEL, alert):
+            failed.append(index)
+    return failed
+
+
+def start_stream_consumers() -> List[asyncio.Task]:
+    """
+    Start the persistence and alerting consumer groups on the packet stream.
+
+    Returns:
+        The consumer tasks; cancel them on shutdown
+    """
+    consumer = settings.STREAM_CONSUMER_NAME
+    if settings.WS_WORKERS != 1:
+        # Workers share a host name but must not share pending entries
+        consumer = f"{consumer}-{os.getpid()}"
+    consumers = {
+        settings.STREAM_PERSISTENCE_GROUP: persist_packets,
+        settings.STREAM_ALERTING_GROUP: raise_alerts,
+    }
+    return [
+        asyncio.create_task(message_queue.consume_stream(
+            settings.PACKET_STREAM,
+            group,
+            consumer,
+            handler,
+            start_id=settings.STREAM_REPLAY_FROM
+        ))
+        for group, handler in consumers.items()
+    ]
@@ -0,0 +1,294 @@
+# src/backend/services/token_verifier.py
+
+import asyncio
+import json
+import logging
+import re
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from firebase_admin import auth
+
+from core.config import settings
+from services.metrics import Histogram, MICRO_LATENCY_MS_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Public certificates Firebase signs ID tokens with, keyed by key ID
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ISSUER_PREFIX = "https://securetoken.google.com/"
+# Minimum seconds between key downloads triggered by unknown key IDs
+KEY_REFRESH_COOLDOWN_SECONDS = 60
+# Firebase ID tokens live at most an hour; once a revoked user's last cached
+# token is gone for that long, no token issued before the revocation remains
+ID_TOKEN_LIFETIME_SECONDS = 3600
+
+# Returns ({key ID: PEM certificate or public key}, seconds the keys may be cached)
+KeyFetcher = Callable[[], Tuple[Dict[str, str], float]]
+# Returns the time (Unix seconds) before which a user's tokens are revoked, or None;
+# raises auth.UserNotFoundError / auth.UserDisabledError for users that lost access
+RevocationLookup = Callable[[str], Optional[float]]
+
+
+def fetch_firebase_keys() -> Tuple[Dict[str, str], float]:
+    """Download Firebase's signing certificates and their Cache-Control max-age."""
+    with urllib.request.urlopen(FIREBASE_CERTS_URL, timeout=10) as response:
+        keys = json.loads(response.read())
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    return keys, float(match.group(1)) if match else 3600.0
+
+
+def lookup_revocation(uid: str) -> Optional[float]:
+    """Read a user's revocation time from Firebase; raises if the user is disabled or gone."""
+    user = auth.get_user(uid)
+    if user.disabled:
+        raise auth.UserDisabledError("The user record is disabled.")
+    valid_after = user.tokens_valid_after_timestamp
+    return valid_after / 1000 if valid_after else None
+
+
+def _load_key(pem: str):
+    if "BEGIN CERTIFICATE" in pem:
+        return x509.load_pem_x509_certificate(pem.encode()).public_key()
+    return load_pem_public_key(pem.encode())
+
+
+class TokenVerifier:
+    """
+    Local verification of Firebase ID tokens with a claims cache.
+
+    Signatures are checked in-process against Firebase's public keys, which
+    are cached for as long as Google's Cache-Control allows, and decoded
+    claims are kept until the token expires, so repeat requests with the same
+    token cost a dictionary lookup. Revocation is not checked per call:
+    every `revocation_interval` seconds the users with cached tokens are
+    looked up in the background, and the tokens of revoked or disabled
+    users are dropped and rejected from then on.
+
+    Errors are raised as the firebase_admin auth exceptions callers of
+    `auth.verify_id_token` already handle.
+    """
+
+    def __init__(
+        self,
+        project_id: Optional[str],
+        max_entries: int = 10000,
+        revocation_interval: float = 60.0,
+        fetch_keys: KeyFetcher = fetch_firebase_keys,
+        check_revocation: RevocationLookup = lookup_revocation
+    ):
+        """
+        Args:
+            project_id: Firebase project the tokens must be issued for
+            max_entries: Maximum cached tokens; the least recently used are evicted
+            revocation_interval: Seconds between background revocation checks
+            fetch_keys: Loads the signing keys (blocking; run in a thread)
+            check_revocation: Looks up a user's revocation time (blocking; run in a thread)
+        """
+        self.project_id = project_id
+        self.max_entries = max_entries
+        self.revocation_interval = revocation_interval
+        self.fetch_keys = fetch_keys
+        self.check_revocation = check_revocation
+        self._claims: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._keys: Dict[str, Any] = {}
+        self._keys_expire = 0.0
+        self._keys_fetched = float("-inf")
+        self._key_lock = asyncio.Lock()
+        # uid -> Unix time before which its tokens are revoked (inf if disabled or deleted)
+        self._revoked_before: Dict[str, float] = {}
+        # uid -> Unix time after which its revocation entry is forgotten unless it has cached tokens again
+        self._revoked_until: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.latency_ms = Histogram(MICRO_LATENCY_MS_BUCKETS)
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.revoked = 0
+        self.key_refreshes = 0
+        self.revocation_checks = 0
+
+    def start(self):
+        """Start the background revocation checks (idempotent)."""
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._revocation_loop())
+
+    async def close(self):
+        """Stop the background revocation checks."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Verify an ID token and return its claims, with "uid" set to the subject.
+
+        Raises:
+            auth.InvalidIdTokenError (or its ExpiredIdTokenError subclass) for
+            tokens that fail verification, auth.RevokedIdTokenError for tokens
+            of revoked or disabled users
+        """
+        started = time.perf_counter()
+        try:
+            claims = self._claims.get(token)
+            if claims is not None and claims["exp"] > time.time():
+                self._claims.move_to_end(token)
+                self.hits += 1
+            else:
+                self.misses += 1
+                claims = await self._decode(token)
+            if self._is_revoked(claims):
+                self._claims.pop(token, None)
+                raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+            self._claims[token] = claims
+            if len(self._claims) > self.max_entries:
+                self._claims.popitem(last=False)
+            return claims
+        except auth.InvalidIdTokenError:
+            self.failures += 1
+            raise
+        finally:
+            self.latency_ms.observe((time.perf_counter() - started) * 1000)
+
+    def _is_revoked(self, claims: Dict[str, Any]) -> bool:
+        revoked_before = self._revoked_before.get(claims["uid"])
+        return revoked_before is not None and claims["auth_time"] < revoked_before
+
+    async def _signing_key(self, kid: str):
+        if kid in self._keys and time.time() < self._keys_expire:
+            return self._keys[kid]
+        async with self._key_lock:
+            # Refresh when the keys expired, or for a key ID we have not seen (rotation),
+            # but not on every forged key ID
+            now = time.time()
+            unknown = kid not in self._keys and now - self._keys_fetched >= KEY_REFRESH_COOLDOWN_SECONDS
+            if unknown or now >= self._keys_expire:
+                keys, max_age = await asyncio.to_thread(self.fetch_keys)
+                self._keys = {key_id: _load_key(pem) for key_id, pem in keys.items()}
+                self._keys_fetched = time.time()
+                self._keys_expire = self._keys_fetched + max_age
+                self.key_refreshes += 1
+        return self._keys.get(kid)
+
+    async def _decode(self, token: str) -> Dict[str, Any]:
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise auth.InvalidIdTokenError(f"Malformed ID token: {e}", cause=e)
+        if header.get("alg") != "RS256":
+            raise auth.InvalidIdTokenError("ID token must be signed with RS256.")
+        try:
+            key = await self._signing_key(header.get("kid", ""))
+        except Exception as e:
+            logger.error(f"Failed to fetch token signing keys: {e}")
+            raise auth.InvalidIdTokenError("Could not fetch the keys to verify the ID token.", cause=e)
+        if key is None:
+            raise auth.InvalidIdTokenError("ID token has an unknown key ID.")
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=f"{ISSUER_PREFIX}{self.project_id}",
+                options={"require": ["exp", "iat", "sub", "auth_time"]}
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise auth.ExpiredIdTokenError("The Firebase ID token has expired.", e)
+        except jwt.PyJWTError as e:
+            raise auth.InvalidIdTokenError(f"Invalid ID token: {e}", cause=e)
+        if not claims["sub"] or claims["auth_time"] > time.time():
+            raise auth.InvalidIdTokenError("ID token has an invalid subject or auth_time.")
+        claims["uid"] = claims["sub"]
+        return claims
+
+    async def _revocation_loop(self):
+        while True:
+            await asyncio.sleep(self.revocation_interval)
+            await self.check_revocations()
+
+    async def check_revocations(self):
+        """
+        Look up every user with cached tokens and drop the revoked ones.
+
+        Users already known to be revoked or disabled are looked up again
+        too, so that re-enabling an account (or a lookup reporting nothing
+        revoked) clears their entry; entries are forgotten an ID token
+        lifetime after their user's last cached token.
+        """
+        now = time.time()
+        expired = [token for token, claims in self._claims.items() if claims["exp"] <= now]
+        for token in expired:
+            del self._claims[token]
+        cached: Set[str] = {claims["uid"] for claims in self._claims.values()}
+        for uid in cached & self._revoked_before.keys():
+            self._revoked_until[uid] = now + ID_TOKEN_LIFETIME_SECONDS
+        for uid in [uid for uid in self._revoked_before if uid not in cached and self._revoked_until.get(uid, 0) <= now]:
+            self._forget_revocation(uid)
+        for uid in cached | self._revoked_before.keys():
+            try:
+                revoked_before = await asyncio.to_thread(self.check_revocation, uid)
+            except (auth.UserNotFoundError, auth.UserDisabledError):
+                revoked_before = float("inf")
+            except Exception as e:
+                logger.error(f"Revocation check failed for {uid}: {e}")
+                continue
+            self.revocation_checks += 1
+            if revoked_before is None:
+                self._forget_revocation(uid)
+                continue
+            if uid not in self._revoked_before:
+                self._revoked_until[uid] = now + ID_TOKEN_LIFETIME_SECONDS
+            self._revoked_before[uid] = revoked_before
+            stale = [
+                token for token, claims in self._claims.items()
+                if claims["uid"] == uid and claims["auth_time"] < revoked_before
+            ]
+            for token in stale:
+                del self._claims[token]
+            self.revoked += len(stale)
+
+    def _forget_revocation(self, uid: str):
+        self._revoked_before.pop(uid, None)
+        self._revoked_until.pop(uid, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters, key refreshes and verification latency."""
+        lookups = self.hits + self.misses
+        return {
+            "cached_tokens": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "failures": self.failures,
+            "revoked": self.revoked,
+            "revoked_users": len(self._revoked_before),
+            "key_refreshes": self.key_refreshes,
+            "revocation_checks": self.revocation_checks,
+            "latency_ms": self.latency_ms.snapshot(),
+        }
+
+
+# Global instance
+token_verifier = TokenVerifier(
+    settings.FIREBASE_PROJECT_ID,
+    max_entries=settings.TOKEN_CACHE_SIZE,
+    revocation_interval=settings.TOKEN_REVOCATION_CHECK_SECONDS
+)
+
+
+async def verify_id_token(token: str) -> Dict[str, Any]:
+    """
+    Verify an ID token through the cache, or per call with the Firebase SDK
+    (including a revocation lookup) when TOKEN_CACHE_ENABLED is off or no
+    FIREBASE_PROJECT_ID is configured.
+    """
+    if settings.TOKEN_CACHE_ENABLED and token_verifier.project_id:
+        return await token_verifier.verify(token)
+    return await asyncio.to_thread(auth.verify_id_token, token, check_revoked=True)
@@ -0,0 +1,96 @@
+# src/backend/services/user_bootstrap.py
+
+import logging
+from typing import Any, Callable, Optional
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+USERS_COLLECTION = "users"
+# Document recording that the first (admin) user has been assigned
+BOOTSTRAP_COLLECTION = "system"
+BOOTSTRAP_DOCUMENT = "bootstrap"
+
+# Runs fn(transaction) in a transaction on db, retrying on contention, and returns its result
+TransactionRunner = Callable[[Any, Callable[[Any], Any]], Any]
+
+
+def run_firestore_transaction(db, fn: Callable[[Any], Any]) -> Any:
+    """Run fn in a Firestore transaction, which the SDK retries when documents it read changed."""
+    @firestore.transactional
+    def run(transaction):
+        return fn(transaction)
+    return run(db.transaction())
+
+
+class UserBootstrap:
+    """
+    Assigns the role of a user on their first login.
+
+    The very first user becomes admin and everyone after them an analyst.
+    Instead of listing the users collection, a single bootstrap marker
+    document is read and created in the same transaction as the user's
+    document, so assignment costs a constant number of reads and two
+    concurrent first logins cannot both become admin. Deployments that
+    predate the marker are detected once, with a query limited to two
+    documents, when the marker is created.
+
+    Uses firestore.client() by default, which honours FIRESTORE_EMULATOR_HOST.
+    """
+
+    def __init__(
+        self,
+        db_factory: Optional[Callable[[], Any]] = None,
+        run_transaction: TransactionRunner = run_firestore_transaction
+    ):
+        """
+        Args:
+            db_factory: Returns the Firestore client (firestore.client by default)
+            run_transaction: Runs a function in a transaction on that client
+        """
+        self._db_factory = db_factory or firestore.client
+        self._db = None
+        self.run_transaction = run_transaction
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self._db_factory()
+        return self._db
+
+    def assign_initial_role(self, uid: str, email: Optional[str]) -> str:
+        """
+        Pick a first-login user's role and store their user document.
+
+        Args:
+            uid: Firebase user ID
+            email: User's email address
+
+        Returns:
+            "admin" for the first user of the deployment, "analyst" otherwise
+        """
+        users = self.db.collection(USERS_COLLECTION)
+        marker_ref = self.db.collection(BOOTSTRAP_COLLECTION).document(BOOTSTRAP_DOCUMENT)
+        user_ref = users.document(uid)
+
+        def assign(transaction) -> str:
+            marker = marker_ref.get(transaction=transaction)
+            if marker.exists:
+                # Repeated first logins of the admin (e.g. before the role claim was set) stay admin
+                role = "admin" if (marker.to_dict() or {}).get("admin_uid") == uid else "analyst"
+            else:
+                existing = [doc for doc in users.limit(2).get(transaction=transaction) if doc.id != uid]
+                role = "analyst" if existing else "admin"
+                transaction.set(marker_ref, {
+                    "admin_uid": uid if role == "admin" else None,
+                    "created_at": firestore.SERVER_TIMESTAMP,
+                })
+            transaction.set(user_ref, {"uid": uid, "email": email, "role": role}, merge=True)
+            return role
+
+        return self.run_transaction(self.db, assign)
+
+
+# Global instance
+user_bootstrap = UserBootstrap()
@@ -0,0 +1,176 @@
+# src/backend/services/user_directory.py
+
+import asyncio
+import base64
+import bisect
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from firebase_admin import auth
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLE = "viewer"
+
+# Returns every user as {"uid", "email", "role"} dicts (blocking; run in a thread)
+UserLoader = Callable[[], Iterable[Dict[str, Any]]]
+
+
+def user_to_record(user) -> Dict[str, Any]:
+    """Convert a firebase_admin UserRecord to the directory's plain dict."""
+    claims = user.custom_claims or {}
+    return {"uid": user.uid, "email": user.email, "role": claims.get("role", DEFAULT_ROLE)}
+
+
+def load_firebase_users() -> Iterable[Dict[str, Any]]:
+    """Page through every Firebase user."""
+    return (user_to_record(user) for user in auth.list_users().iterate_all())
+
+
+def encode_page_token(uid: str) -> str:
+    """Opaque token for the page after `uid`."""
+    return base64.urlsafe_b64encode(uid.encode()).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> str:
+    """Inverse of encode_page_token; raises ValueError for foreign tokens."""
+    try:
+        return base64.b64decode(token + "=" * (-len(token) % 4), altchars=b"-_", validate=True).decode()
+    except Exception:
+        raise ValueError("Invalid page token")
+
+
+class UserDirectory:
+    """
+    Server-side cache of every user with an index by role.
+
+    Loaded in full on first use and refreshed in the background once older
+    than `ttl_seconds`, serving the previous copy meanwhile. Role changes
+    made through this service are applied in place, so they show up without
+    a reload. Users and the role index are kept sorted by UID, which page
+    tokens point into, so a page costs a binary search plus the page itself.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, loader: UserLoader = load_firebase_users):
+        """
+        Args:
+            ttl_seconds: Age after which the cache is reloaded in the background
+            loader: Returns every user (blocking; run in a thread)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.loader = loader
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._uids: List[str] = []
+        self._by_role: Dict[str, List[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Updates made while a reload is reading users, re-applied over its result
+        self._updates_during_reload: Optional[Dict[str, Tuple[Optional[str], str]]] = None
+        self.loads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    async def ensure_loaded(self):
+        """Load the directory if it never was; start a background reload if it is stale."""
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self.reload()
+        elif time.monotonic() - self._loaded_at > self.ttl_seconds:
+            if not self._refresh_task or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.reload())
+
+    async def reload(self):
+        """Replace the cache with a fresh copy of every user."""
+        self._updates_during_reload = {}
+        try:
+            records = await asyncio.to_thread(lambda: list(self.loader()))
+        except Exception as e:
+            logger.error(f"Failed to load user directory: {e}")
+            if not self.loaded:
+                raise
+            return
+        finally:
+            updates, self._updates_during_reload = self._updates_during_reload, None
+        users = {record["uid"]: record for record in records}
+        uids = sorted(users)
+        by_role: Dict[str, List[str]] = {}
+        for uid in uids:
+            by_role.setdefault(users[uid]["role"], []).append(uid)
+        self._users, self._uids, self._by_role = users, uids, by_role
+        for uid, (email, role) in updates.items():
+            self.update(uid, email, role)
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        logger.info(f"User directory loaded with {len(users)} users")
+
+    def update(self, uid: str, email: Optional[str], role: str):
+        """Insert or update one user in place (e.g. after a role change)."""
+        if self._updates_during_reload is not None:
+            self._updates_during_reload[uid] = (email, role)
+        previous = self._users.get(uid)
+        if previous is None:
+            bisect.insort(self._uids, uid)
+        else:
+            members = self._by_role.get(previous["role"], [])
+            index = bisect.bisect_left(members, uid)
+            if index < len(members) and members[index] == uid:
+                del members[index]
+            email = email if email is not None else previous["email"]
+        self._users[uid] = {"uid": uid, "email": email, "role": role}
+        bisect.insort(self._by_role.setdefault(role, []), uid)
+
+    def search(
+        self,
+        role: Optional[str] = None,
+        query: Optional[str] = None,
+        page_size: int = 100,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page through cached users, optionally by role and email/UID substring.
+
+        Args:
+            role: Only users with this role (answered from the role index)
+            query: Case-insensitive substring of the email or UID
+            page_size: Maximum users returned
+            page_token: Token from the previous page
+
+        Returns:
+            The page of users, ordered by UID, and the next page's token (None on the last page)
+
+        Raises:
+            ValueError: If the page token is invalid
+        """
+        after = decode_page_token(page_token) if page_token else None
+        uids = self._by_role.get(role, []) if role is not None else self._uids
+        start = bisect.bisect_right(uids, after) if after is not None else 0
+        needle = query.lower() if query else None
+        page: List[Dict[str, Any]] = []
+        for index in range(start, len(uids)):
+            record = self._users[uids[index]]
+            if needle and needle not in record["uid"].lower() and needle not in (record["email"] or "").lower():
+                continue
+            if len(page) == page_size:
+                return page, encode_page_token(page[-1]["uid"])
+            page.append(record)
+        return page, None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache size, age and per-role counts."""
+        return {
+            "users": len(self._users),
+            "roles": {role: len(uids) for role, uids in self._by_role.items()},
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self.loaded else None,
+            "loads": self.loads,
+        }
+
+
+# Global instance
+user_directory = UserDirectory(ttl_seconds=settings.USER_DIRECTORY_TTL_SECONDS)
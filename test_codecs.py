@@ -0,0 +1,29 @@
+import pytest
+
+from services.codecs import CODECS, JSON_CODEC, detect_codec, get_codec, pack_envelope, unpack_messages
+
+PACKETS = [{"id": f"pkt-{i}", "protocol": "TCP", "dest_port": 443, "flags": ["SYN"]} for i in range(20)]
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_envelope_round_trip_and_detection(name):
+    codec = get_codec(name)
+    envelope = pack_envelope(codec, [codec.encode(packet) for packet in PACKETS])
+    assert detect_codec(envelope) is codec
+    assert unpack_messages(codec.decode(envelope)) == PACKETS
+
+
+@pytest.mark.parametrize("name", sorted(CODECS))
+def test_spliced_frame_matches_reencoded_frame(name):
+    codec = get_codec(name)
+    envelope = pack_envelope(codec, [codec.encode(packet) for packet in PACKETS])
+    items = codec.envelope_items(envelope)
+    frame = codec.map({"type": codec.encode("network_log_batch"), "data": items})
+    assert codec.decode(frame) == {"type": "network_log_batch", "data": PACKETS}
+    # A plain message is not mistaken for an envelope
+    assert codec.envelope_items(codec.encode(PACKETS[0])) is None
+
+
+def test_unknown_codec_falls_back_to_json():
+    assert get_codec("protobuf") is JSON_CODEC
+    assert get_codec(None) is JSON_CODEC
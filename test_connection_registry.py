@@ -0,0 +1,204 @@
+import asyncio
+
+from services.connection_registry import INBOX_CHANNEL, ConnectionRegistry
+from services.message_queue import message_queue
+
+
+class RegistryRedis:
+    """Just enough of redis.asyncio for the registry, shared between workers."""
+
+    def __init__(self):
+        self.hashes, self.sets, self.zsets, self.strings = {}, {}, {}, {}
+
+    def pipeline(self, transaction=False):
+        return Pipeline(self)
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.hashes.setdefault(key, {}).update(mapping or {field: value})
+
+    async def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    async def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        pass
+
+    async def zrangebyscore(self, key, low, high):
+        return [member for member, score in self.zsets.get(key, {}).items() if score >= low]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def delete(self, key):
+        for store in (self.hashes, self.sets, self.strings):
+            store.pop(key, None)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def eval(self, script, numkeys, key, worker, *args):
+        # Compare-and-expire / compare-and-delete lock scripts
+        if self.strings.get(key) != worker:
+            return 0
+        if "del" in script:
+            await self.delete(key)
+        return 1
+
+
+class Pipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(getattr(self.client, name)(*args, **kwargs))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+def make_worker(name, lock_dir=None):
+    registry = ConnectionRegistry(lock_dir=lock_dir)
+    registry.worker_id = name
+    return registry
+
+
+def test_local_only_without_redis(monkeypatch, tmp_path):
+    monkeypatch.setattr(message_queue, "redis_client", None)
+    registry = make_worker("w1", str(tmp_path))
+    received = []
+
+    async def deliver(message):
+        received.append(message)
+
+    async def scenario():
+        first = registry.add({"uid": "u1"}, "/ws/logs/network", deliver)
+        registry.add({"uid": "u2"}, "/ws/logs/network", deliver)
+        routed = await registry.send_to_user("u1", {"text": "hi"})
+        registry.remove(first)
+        locked = await registry.acquire_lock("capture")
+        await registry.close()
+        return routed, await registry.count(), locked
+
+    routed, counts, locked = asyncio.run(scenario())
+    assert routed == 1 and received == [{"text": "hi"}]
+    assert counts == {"total": 1, "workers": {"w1": 1}}
+    assert locked
+
+
+def test_counts_and_messages_span_workers(monkeypatch):
+    monkeypatch.setattr(message_queue, "redis_client", RegistryRedis())
+    workers = {name: make_worker(name) for name in ("w1", "w2")}
+    inboxes = {INBOX_CHANNEL.format(worker=name): worker for name, worker in workers.items()}
+    received = []
+
+    async def publish(channel, envelope):
+        await inboxes[channel]._deliver(envelope)
+        return True
+
+    monkeypatch.setattr(message_queue, "publish_packet_data", publish)
+
+    async def scenario():
+        for name, worker in workers.items():
+            await worker._heartbeat_once()
+
+            async def deliver(message, name=name):
+                received.append((name, message))
+
+            worker.add({"uid": "u1"}, "/ws/logs/network", deliver)
+        workers["w2"].add({"uid": "u2"}, "/ws/metrics", deliver)
+        await asyncio.sleep(0)
+        routed = await workers["w1"].send_to_user("u1", {"text": "hi"})
+        # A dead worker's connections are skipped and pruned
+        await message_queue.redis_client.sadd("ws:user:u1", "w3/1")
+        stale = await workers["w1"].send_to_user("u1", {"text": "again"})
+        await asyncio.sleep(0)
+        locks = [await worker.acquire_lock("capture") for worker in workers.values()]
+        return routed, stale, await workers["w1"].count(), locks
+
+    routed, stale, counts, locks = asyncio.run(scenario())
+    assert routed == 2 and stale == 2
+    assert sorted(received[:2]) == [("w1", {"text": "hi"}), ("w2", {"text": "hi"})]
+    assert counts == {"total": 3, "workers": {"w1": 1, "w2": 2}}
+    assert "w3/1" not in message_queue.redis_client.sets["ws:user:u1"]
+    assert locks == [True, False]
+
+
+def test_file_lock_without_redis_allows_one_holder_and_hands_over(monkeypatch, tmp_path):
+    monkeypatch.setattr(message_queue, "redis_client", None)
+    first, second = make_worker("w1", str(tmp_path)), make_worker("w2", str(tmp_path))
+    taken = []
+
+    async def scenario():
+        locks = [await first.acquire_lock("capture"), await second.acquire_lock("capture", lambda: taken.append("w2"))]
+        await second._heartbeat_once()
+        before = list(taken)
+        await first.close()
+        await second._heartbeat_once()
+        await second._heartbeat_once()
+        await second.close()
+        return locks, before
+
+    locks, before = asyncio.run(scenario())
+    assert locks == [True, False]
+    assert before == [] and taken == ["w2"]
+
+
+def test_expired_lock_is_taken_over_on_heartbeat(monkeypatch):
+    monkeypatch.setattr(message_queue, "redis_client", RegistryRedis())
+    first, second = make_worker("w1"), make_worker("w2")
+    taken = []
+
+    async def scenario():
+        locks = [await first.acquire_lock("capture"), await second.acquire_lock("capture", lambda: taken.append("w2"))]
+        # The holder crashed and stopped refreshing the lock, which then expired
+        await message_queue.redis_client.delete("ws:lock:capture")
+        await second._heartbeat_once()
+        await first._heartbeat_once()
+        return locks, first.get_stats()["locks"], second.get_stats()["locks"]
+
+    locks, first_locks, second_locks = asyncio.run(scenario())
+    assert locks == [True, False] and taken == ["w2"]
+    assert first_locks == [] and second_locks == ["capture"]
+
+
+def test_lost_lock_stops_guarded_work_and_is_not_extended(monkeypatch):
+    redis = RegistryRedis()
+    monkeypatch.setattr(message_queue, "redis_client", redis)
+    first, second = make_worker("w1"), make_worker("w2")
+    events = []
+
+    async def scenario():
+        await first.acquire_lock("capture", on_lost=lambda: events.append("w1 stopped"))
+        await second.acquire_lock("capture", on_acquired=lambda: events.append("w2 started"))
+        await redis.delete("ws:lock:capture")
+        await second._heartbeat_once()
+        # The old holder neither extends nor releases the new holder's lock
+        await first._heartbeat_once()
+        await first.close()
+        return redis.strings.get("ws:lock:capture")
+
+    assert asyncio.run(scenario()) == "w2"
+    assert events == ["w2 started", "w1 stopped"]
@@ -0,0 +1,66 @@
+import asyncio
+
+from services.codecs import JSON_CODEC, get_codec, pack_envelope
+from services.fanout_hub import FanoutHub
+
+
+def test_hub_decodes_once_and_fans_out():
+    hub = FanoutHub(queue_size=2)
+
+    async def scenario():
+        first = hub.register("packets")
+        second = hub.register("packets")
+        envelope = pack_envelope(JSON_CODEC, [JSON_CODEC.encode({"n": 1}), JSON_CODEC.encode({"n": 2})])
+        await hub._dispatch("packets", envelope)
+        payload, packets = await first.get()
+        assert payload == envelope and packets == [{"n": 1}, {"n": 2}]
+        # The same decoded list is shared rather than decoded per subscriber
+        assert (await second.get())[1] is packets
+
+        hub.unregister(second)
+        for n in range(3):
+            await hub._dispatch("packets", JSON_CODEC.encode({"n": n}))
+        stats = hub.get_stats()
+        await hub.close()
+        return first, stats
+
+    first, stats = asyncio.run(scenario())
+    assert stats["messages_received"] == 4
+    assert stats["channels"]["packets"] == {"subscribers": 1, "filtered": 0, "dropped": 1}
+    assert first.queue.qsize() == 2
+
+
+def test_hub_reads_msgpack_payloads():
+    codec = get_codec("msgpack")
+    hub = FanoutHub()
+
+    async def scenario():
+        subscription = hub.register("packets")
+        await hub._dispatch("packets", codec.encode({"n": 1}))
+        item = await subscription.get()
+        await hub.close()
+        return item
+
+    assert asyncio.run(scenario())[1] == [{"n": 1}]
+
+
+def test_history_and_new_subscription_split_the_stream():
+    hub = FanoutHub()
+
+    async def scenario():
+        hub.enable_history("packets", capacity=3)
+        for seq in range(1, 5):
+            await hub._dispatch("packets", {"seq": seq})
+        history = hub.history("packets")
+        subscription = hub.register("packets")
+        buffered = history.after_seq(2)
+        await hub._dispatch("packets", {"seq": 5})
+        live = await subscription.get()
+        await hub.close()
+        return history, buffered, live
+
+    history, buffered, live = asyncio.run(scenario())
+    assert buffered == ([{"seq": 3}, {"seq": 4}], True)
+    assert live == (None, [{"seq": 5}])
+    # Seq 1 was evicted, so resuming from before it is incomplete
+    assert history.after_seq(0) == ([{"seq": 3}, {"seq": 4}, {"seq": 5}], False)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from services.firewall import FirewallManager, parse_set_elements
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRunner:
+    """A kernel holding the two sets; scripts apply atomically, shared by every manager using it."""
+
+    def __init__(self, listings=None, fail_on=None, clock=None):
+        self.calls = []
+        self.clock = clock or Clock()
+        self.sets = {name: parse_set_elements(listing, self.clock()) for name, listing in (listings or {}).items()}
+        self.fail_on = fail_on
+
+    def __call__(self, argv, stdin=None):
+        self.calls.append((argv, stdin))
+        if self.fail_on and self.fail_on in (stdin or ""):
+            return 1, "", "Error: Could not process rule: Operation not permitted"
+        now = self.clock()
+        if "list" in argv:
+            elements = [
+                {"elem": {"val": address, "expires": expires - now}} if expires is not None else address
+                for address, expires in self.sets.get(argv[-1], {}).items()
+                if expires is None or expires > now
+            ]
+            return 0, json.dumps({"nftables": [{"set": {"name": argv[-1], "elem": elements}}]}), ""
+        sets = {name: {a: e for a, e in elements.items() if e is None or e > now} for name, elements in self.sets.items()}
+        for line in (stdin or "").splitlines():
+            match = re.match(r"(add|delete) element inet \S+ (\S+) \{ (.*) \}", line)
+            if not match:
+                continue
+            action, name, items = match.groups()
+            elements = sets.setdefault(name, {})
+            for item in items.split(", "):
+                address, _, timeout = item.partition(" timeout ")
+                if action == "delete":
+                    if address not in elements:
+                        return 1, "", "Error: Could not process rule: No such file or directory"
+                    del elements[address]
+                else:
+                    elements[address] = now + int(timeout[:-1]) if timeout else None
+        self.sets = sets
+        return 0, "", ""
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_dry_run_renders_setup_and_timeouts():
+    clock = Clock()
+    manager = FirewallManager(table="nv", dry_run=True, runner=None, clock=clock)
+    result = run(manager.block(["10.0.0.1", "10.0.0.2", "2001:db8::1"], ttl=60))
+    assert result["applied"] and result["blocked"] == 3
+    script = result["script"]
+    assert "add set inet nv blocked_v4 { type ipv4_addr; flags timeout; }" in script
+    assert "add rule inet nv input ip saddr @blocked_v4 drop" in script
+    assert "add element inet nv blocked_v4 { 10.0.0.1 timeout 60s, 10.0.0.2 timeout 60s }" in script
+    assert "add element inet nv blocked_v6 { 2001:db8::1 timeout 60s }" in script
+    # Setup is only part of the first batch
+    second = run(manager.block(["10.0.0.3"]))
+    assert second["script"] == "add element inet nv blocked_v4 { 10.0.0.3 }\n"
+    assert [entry["ip"] for entry in run(manager.list_blocked())] == ["10.0.0.1", "10.0.0.2", "10.0.0.3", "2001:db8::1"]
+
+
+def test_per_request_dry_run_changes_nothing():
+    runner = FakeRunner()
+    manager = FirewallManager(use_sudo=False, runner=runner, clock=Clock())
+    result = run(manager.block(["10.0.0.1"], dry_run=True))
+    assert not result["applied"] and result["error"] is None
+    assert "add table inet netverse" in result["script"]
+    assert runner.calls == [] and manager.get_stats()["blocked"] == 0
+
+
+def test_batch_is_one_nft_transaction():
+    runner = FakeRunner()
+    manager = FirewallManager(runner=runner, clock=Clock())
+    addresses = [f"10.1.{i // 256}.{i % 256}" for i in range(1000)]
+    run(manager.block(addresses))
+    # Setup, two set listings, then the whole batch in one `nft -f -`
+    assert [argv for argv, _ in runner.calls][-1] == ["sudo", "-n", "nft", "-f", "-"]
+    assert len(runner.calls) == 4
+    assert runner.calls[-1][1].count("\n") == 1
+    # Later batches re-read the sets first
+    run(manager.block(["10.2.0.1"]))
+    assert len(runner.calls) == 7
+
+
+def test_reblock_and_unblock_delete_only_known_elements():
+    clock = Clock()
+    manager = FirewallManager(dry_run=True, clock=clock)
+    run(manager.block(["10.0.0.1"], ttl=60))
+    result = run(manager.block(["10.0.0.1", "10.0.0.2"], ttl=300))
+    assert result["script"].splitlines() == [
+        "delete element inet netverse blocked_v4 { 10.0.0.1 }",
+        "add element inet netverse blocked_v4 { 10.0.0.1 timeout 300s, 10.0.0.2 timeout 300s }",
+    ]
+    result = run(manager.unblock(["10.0.0.2", "10.9.9.9"]))
+    assert result["unblocked"] == 1
+    assert result["script"] == "delete element inet netverse blocked_v4 { 10.0.0.2 }\n"
+    # Nothing to do is not an error and runs nothing
+    batches = manager.batches_applied
+    assert run(manager.unblock(["10.9.9.9"]))["applied"] and manager.batches_applied == batches
+
+
+def test_expired_blocks_are_forgotten():
+    clock = Clock()
+    manager = FirewallManager(dry_run=True, clock=clock)
+    run(manager.block(["10.0.0.1"], ttl=60))
+    run(manager.block(["10.0.0.2"]))
+    assert run(manager.list_blocked()) == [
+        {"ip": "10.0.0.1", "expires_at": 1060.0},
+        {"ip": "10.0.0.2", "expires_at": None},
+    ]
+    clock.now += 61
+    assert [entry["ip"] for entry in run(manager.list_blocked())] == ["10.0.0.2"]
+    # The kernel already dropped the element, so it is not deleted before re-adding
+    assert run(manager.block(["10.0.0.1"], ttl=60))["script"] == "add element inet netverse blocked_v4 { 10.0.0.1 timeout 60s }\n"
+
+
+def test_existing_elements_are_loaded_at_setup():
+    listing = json.dumps({"nftables": [
+        {"metainfo": {"version": "1.0.6"}},
+        {"set": {"family": "inet", "name": "blocked_v4", "table": "netverse", "type": "ipv4_addr",
+                 "elem": ["10.0.0.5", {"elem": {"val": "10.0.0.6", "timeout": 600, "expires": 120}}]}},
+    ]})
+    runner = FakeRunner(listings={"blocked_v4": listing})
+    manager = FirewallManager(use_sudo=False, runner=runner, clock=Clock())
+    result = run(manager.unblock(["10.0.0.5"]))
+    assert result["applied"]
+    assert runner.calls[-1][1] == "delete element inet netverse blocked_v4 { 10.0.0.5 }\n"
+    assert run(manager.list_blocked()) == [{"ip": "10.0.0.6", "expires_at": 1120.0}]
+
+
+def test_parse_set_elements():
+    listing = json.dumps({"nftables": [{"set": {"name": "blocked_v6", "elem": [
+        "2001:db8::1", {"elem": {"val": "2001:db8::2", "timeout": 60}}, {"elem": {"val": "2001:db8::3", "expires": 5}}
+    ]}}]})
+    assert parse_set_elements(listing, 100.0) == {"2001:db8::1": None, "2001:db8::2": None, "2001:db8::3": 105.0}
+    assert parse_set_elements(json.dumps({"nftables": []}), 100.0) == {}
+
+
+def test_failed_batch_keeps_state():
+    runner = FakeRunner(fail_on="10.0.0.2")
+    manager = FirewallManager(runner=runner, clock=Clock())
+    assert run(manager.block(["10.0.0.1"]))["applied"]
+    result = run(manager.block(["10.0.0.2"]))
+    assert not result["applied"] and "Operation not permitted" in result["error"]
+    assert [entry["ip"] for entry in run(manager.list_blocked())] == ["10.0.0.1"]
+    assert manager.get_stats()["failures"] == 1
+
+
+def test_failed_setup_is_retried():
+    runner = FakeRunner(fail_on="add table")
+    manager = FirewallManager(runner=runner, clock=Clock())
+    assert run(manager.block(["10.0.0.1"]))["error"]
+    runner.fail_on = None
+    assert run(manager.block(["10.0.0.1"]))["applied"]
+
+
+def test_kernel_state_is_shared_between_workers():
+    clock = Clock()
+    runner = FakeRunner(clock=clock)
+    first = FirewallManager(runner=runner, clock=clock)
+    second = FirewallManager(runner=runner, clock=clock)
+    run(first.block(["10.0.0.1"], ttl=60))
+    run(first.block(["10.0.0.2"]))
+    # Another worker's unblock and re-block act on what the kernel holds
+    assert run(second.unblock(["10.0.0.2"]))["unblocked"] == 1
+    clock.now += 30
+    result = run(second.block(["10.0.0.1"], ttl=600))
+    assert result["applied"] and result["script"].startswith("delete element inet netverse blocked_v4 { 10.0.0.1 }")
+    assert runner.sets["blocked_v4"] == {"10.0.0.1": 1630.0}
+    assert run(first.list_blocked()) == run(second.list_blocked()) == [{"ip": "10.0.0.1", "expires_at": 1630.0}]
+
+
+def test_batch_is_retried_when_the_sets_changed_meanwhile():
+    clock = Clock()
+    runner = FakeRunner(clock=clock)
+    manager = FirewallManager(runner=runner, clock=clock)
+    run(manager.block(["10.0.0.1"]))
+    run(manager.block(["10.0.0.2"]))
+    calls = len(runner.calls)
+    # The first attempt's read goes stale before its commit (another worker removed 10.0.0.1)
+    original = runner.__call__
+    removed = []
+
+    def racing(argv, stdin=None):
+        if stdin and "10.0.0.1" in stdin and not removed:
+            removed.append(runner.sets["blocked_v4"].pop("10.0.0.1"))
+        return original(argv, stdin)
+
+    manager.runner = racing
+    result = run(manager.unblock(["10.0.0.1", "10.0.0.2"]))
+    assert result["applied"] and result["script"] == "delete element inet netverse blocked_v4 { 10.0.0.2 }\n"
+    # Two listings and a failed batch, then the same again with a successful one
+    assert len(runner.calls) - calls == 6
+    assert runner.sets["blocked_v4"] == {}
+
+
+def test_invalid_addresses_are_rejected():
+    manager = FirewallManager(dry_run=True)
+    with pytest.raises(ValueError):
+        run(manager.block(["10.0.0.0/24"]))
+    with pytest.raises(ValueError):
+        run(manager.block(["10.0.0.1; flush ruleset"]))
+    # Addresses are canonicalized and deduplicated
+    assert manager.normalize(["2001:DB8:0::1", "2001:db8::1"]) == ["2001:db8::1"]
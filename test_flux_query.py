@@ -0,0 +1,151 @@
+import ipaddress
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from services.flux_query import (
+    build_aggregate_query,
+    build_network_logs_query,
+    build_rollup_query,
+    check_filter_supported,
+    flux_string,
+    flux_time,
+    ipv4_cidr_regex,
+)
+from services.log_query import NetworkLogFilter, decode_cursor, encode_cursor
+from services.rollups import RollupAggregator, select_rollup_tier
+
+
+def test_flux_string_escaping():
+    assert flux_string('a"b\\c${x}') == '"a\\"b\\\\c\\${x}"'
+
+
+def test_flux_time():
+    assert flux_time("-1h") == "-1h"
+    assert flux_time("2023-10-27T10:00:00Z") == 'time(v: "2023-10-27T10:00:00.000000Z")'
+
+
+@pytest.mark.parametrize("cidr", ["10.0.0.0/8", "192.168.1.0/24", "172.16.0.0/12", "10.1.64.0/18", "1.2.3.4/32"])
+def test_ipv4_cidr_regex_matches_network(cidr):
+    network = ipaddress.ip_network(cidr)
+    pattern = re.compile(ipv4_cidr_regex(cidr))
+    for address in ["10.0.0.1", "10.255.1.1", "192.168.1.77", "192.168.2.1", "172.16.5.4",
+                    "172.32.0.1", "10.1.64.0", "10.1.127.255", "10.1.128.0", "1.2.3.4", "1.2.3.40"]:
+        assert bool(pattern.match(address)) == (ipaddress.ip_address(address) in network), address
+
+
+def test_ipv6_networks_are_rejected_before_querying():
+    check_filter_supported(NetworkLogFilter(cidr="10.0.0.0/8", source_cidr="2001:db8::1/128"))
+    for field in ("cidr", "source_cidr", "dest_cidr"):
+        with pytest.raises(ValueError):
+            check_filter_supported(NetworkLogFilter(**{field: "2001:db8::/32"}))
+
+
+def test_filter_validation_rejects_injection():
+    with pytest.raises(ValidationError):
+        NetworkLogFilter(source_ip='1.2.3.4") or true or ("')
+    with pytest.raises(ValidationError):
+        NetworkLogFilter(indicators=["x/ or true"])
+    with pytest.raises(ValidationError):
+        NetworkLogFilter(start_time="-1h) |> drop()")
+
+
+def test_network_logs_query_sorts_before_limit():
+    query = build_network_logs_query(
+        "network-logs",
+        NetworkLogFilter(protocol="TCP", source_ip="10.0.0.1", dest_port=443),
+        limit=50
+    )
+    assert 'r.protocol == "TCP"' in query
+    assert 'r.source_ip == "10.0.0.1" and r.dest_port == 443' in query
+    assert query.rstrip().endswith('|> group()\n    |> top(n: 50, columns: ["_time"])')
+
+
+def test_aggregate_query_skips_pivot_for_tags():
+    query = build_aggregate_query("network-logs", NetworkLogFilter(), "protocol", "1m", "bytes")
+    assert "pivot" not in query
+    assert 'aggregateWindow(every: 1m, fn: sum, column: "_value"' in query
+
+    query = build_aggregate_query("network-logs", NetworkLogFilter(), "source_ip", None, "packets", top=10)
+    assert "pivot" in query
+    assert query.rstrip().endswith('|> top(n: 10, columns: ["_value"])')
+
+
+def test_aggregate_query_rejects_unknown_group():
+    with pytest.raises(ValueError):
+        build_aggregate_query("network-logs", NetworkLogFilter(), "summary")
+
+
+def test_cursor_round_trip():
+    moment = datetime(2024, 1, 1, 12, 30, 0, 123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(moment, 3)) == (moment, 3)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_select_rollup_tier():
+    assert select_rollup_tier(timedelta(hours=48)) == "1h"
+    assert select_rollup_tier(timedelta(hours=3)) == "1m"
+    assert select_rollup_tier(timedelta(hours=1)) is None
+    assert select_rollup_tier(timedelta(days=7), timedelta(minutes=5)) == "1m"
+    assert select_rollup_tier(timedelta(days=7), timedelta(hours=2)) == "1h"
+    assert select_rollup_tier(timedelta(days=7), timedelta(seconds=90)) is None
+
+
+def test_rollup_aggregator_emits_closed_buckets():
+    emitted = []
+    aggregator = RollupAggregator(emit=lambda tier, lines: emitted.append((tier, lines)), sensor="s1", top_keys=1)
+    for second, dest_ip in ((0, "10.0.0.2"), (10, "10.0.0.2"), (20, "10.0.0.3"), (70, "10.0.0.2")):
+        aggregator.record({
+            "timestamp": f"2024-01-01T00:{second // 60:02d}:{second % 60:02d}",
+            "protocol": "TCP", "source_ip": "10.0.0.1", "dest_ip": dest_ip, "dest_port": 443, "length": 100,
+        })
+    assert [tier for tier, _ in emitted] == ["1m"]
+    lines = emitted[0][1]
+    assert 'traffic_rollup,dimension=protocol,rank=0,sensor=s1 key="TCP",packets=3i,bytes=300i 1704067200000000' in lines
+    assert any(line.startswith("traffic_rollup,dimension=dest_ip,rank=0,") and 'key="10.0.0.2",packets=2i' in line for line in lines)
+    assert any(line.startswith("traffic_rollup,dimension=dest_ip,rank=other,") and "packets=1i" in line for line in lines)
+
+    aggregator.flush_due(datetime(2024, 1, 1, 1, 0, 5, tzinfo=timezone.utc))
+    assert [tier for tier, _ in emitted] == ["1m", "1m", "1h"]
+
+
+def test_rollup_keeps_exact_counts_until_bucket_closes():
+    emitted = []
+    aggregator = RollupAggregator(emit=lambda tier, lines: emitted.append(lines), sensor="s1", top_keys=1)
+    # Many one-off hosts first, then a host that only wins over the whole minute
+    for i in range(500):
+        aggregator.record({"timestamp": "2024-01-01T00:00:01", "source_ip": f"10.1.{i // 256}.{i % 256}", "length": 1})
+    for _ in range(3):
+        aggregator.record({"timestamp": "2024-01-01T00:00:30", "source_ip": "10.9.9.9", "length": 1})
+    aggregator.flush_due(datetime(2024, 1, 1, 0, 1, 1, tzinfo=timezone.utc))
+    top = [line for line in emitted[0] if line.startswith("traffic_rollup,dimension=source_ip,rank=0,")]
+    assert len(top) == 1 and 'key="10.9.9.9",packets=3i' in top[0]
+    # Series are bounded by rank, not by host
+    tags = {line.split(" ")[0] for line in emitted[0] if "dimension=source_ip" in line}
+    assert len(tags) == 2
+
+
+def test_rollup_points_of_workers_do_not_collide():
+    emitted = []
+    for worker in ("101", "102"):
+        aggregator = RollupAggregator(emit=lambda tier, lines: emitted.extend(lines), sensor="s1", worker=worker)
+        aggregator.record({"timestamp": "2024-01-01T00:00:01", "protocol": "TCP", "source_ip": "10.0.0.1", "length": 1})
+        aggregator.flush_due(datetime(2024, 1, 1, 0, 1, 1, tzinfo=timezone.utc))
+    protocol = [line for line in emitted if "dimension=protocol" in line]
+    # Same bucket and rank, but different series, so neither overwrites the other
+    assert len({line.rsplit(" ", 2)[0] for line in protocol}) == 2
+    assert all(",worker=10" in line for line in protocol)
+
+
+def test_rollup_query():
+    query = build_rollup_query(
+        "network-logs-1h", "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "dest_port", metric="bytes", top=10
+    )
+    assert 'r.dimension == "dest_port" and (r._field == "bytes" or r._field == "key")' in query
+    assert '|> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")' in query
+    assert "_value: r.bytes" in query
+    assert '|> group(columns: ["key"])' in query
+    assert '|> top(n: 10, columns: ["_value"])' in query
@@ -0,0 +1,209 @@
+import threading
+import time
+
+import pytest
+
+from services.influx_writer import BatchingWriter
+from services.line_protocol import encode_line, encode_network_log, encode_compact_network_log
+from services.spool import WriteAheadSpool
+
+SAMPLE_PACKET = {
+    "timestamp": "2024-01-01T00:00:00.123456",
+    "protocol": "TCP",
+    "source_ip": "192.168.1.100",
+    "dest_ip": "192.168.1.1",
+    "source_port": 12345,
+    "dest_port": 80,
+    "length": 60,
+    "summary": 'IP / TCP 192.168.1.100:12345 > 192.168.1.1:http S "quoted"',
+}
+
+
+def test_encode_network_log():
+    line = encode_network_log(SAMPLE_PACKET)
+    assert line.startswith("network_traffic,dest_ip=192.168.1.1,protocol=TCP,source_ip=192.168.1.100 ")
+    assert "source_port=12345i" in line
+    assert '\\"quoted\\"' in line
+    assert line.endswith(" 1704067200123456")
+
+
+def test_encode_compact_network_log():
+    packet = dict(SAMPLE_PACKET, dest_ip="8.8.8.8", source_ip_enrichment={"geoip": {"country": "US"}})
+    line = encode_compact_network_log(packet, sensor="sensor-1")
+    assert line.startswith("network_traffic_v2,direction=outbound,protocol=TCP,sensor=sensor-1 ")
+    assert 'source_ip="192.168.1.100",dest_ip="8.8.8.8"' in line
+    assert "geoip" not in line and "raw_data" not in line
+
+
+def test_encode_line_escaping():
+    line = encode_line("m", {"a b": "c,d", "empty": ""}, {"f=1": 1.5, "skip": None, "ok": True}, 1)
+    assert line == "m,a\\ b=c\\,d f\\=1=1.5,ok=true 1"
+
+
+def test_writer_flushes_by_size():
+    batches = []
+    writer = BatchingWriter(write_fn=batches.append, batch_size=3, flush_interval=60)
+    writer.start()
+    for i in range(7):
+        writer.submit(f"m v={i}i {i}")
+    writer.close()
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert writer.get_stats()["records_written"] == 7
+
+
+def test_writer_flushes_by_time():
+    flushed = threading.Event()
+    writer = BatchingWriter(write_fn=lambda batch: flushed.set(), batch_size=1000, flush_interval=0.05)
+    writer.start()
+    writer.submit("m v=1i 1")
+    assert flushed.wait(2)
+    writer.close()
+
+
+def test_writer_retries_then_succeeds():
+    attempts = []
+
+    def flaky_write(batch):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("influxdb unavailable")
+
+    writer = BatchingWriter(write_fn=flaky_write, batch_size=1, flush_interval=60, retry_backoff=0.01)
+    writer.start()
+    writer.submit("m v=1i 1")
+    writer.close()
+    stats = writer.get_stats()
+    assert len(attempts) == 3
+    assert stats["retries"] == 2
+    assert stats["records_written"] == 1
+    assert stats["batch_size"]["count"] == 1
+
+
+def test_writer_spools_during_outage_and_replays(tmp_path):
+    written = []
+    database_up = threading.Event()
+
+    def write(batch):
+        if not database_up.is_set():
+            raise ConnectionError("influxdb unavailable")
+        written.extend(batch)
+
+    spool = WriteAheadSpool(str(tmp_path), segment_bytes=64)
+    writer = BatchingWriter(
+        write_fn=write, batch_size=2, flush_interval=60, max_retries=0,
+        spool=spool, replay_interval=0.05
+    )
+    writer.start()
+    for i in range(6):
+        writer.submit(f"m v={i}i {i}")
+    deadline = time.monotonic() + 2
+    while spool.get_stats()["records_spooled"] < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.degraded
+
+    database_up.set()
+    deadline = time.monotonic() + 2
+    while spool.has_pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    assert sorted(written) == sorted(f"m v={i}i {i}" for i in range(6))
+    assert not writer.degraded
+
+
+def test_spool_evicts_oldest_and_recovers(tmp_path):
+    # Each record is 9 bytes, so every append seals its own segment
+    spool = WriteAheadSpool(str(tmp_path), segment_bytes=9, max_bytes=30)
+    for i in range(5):
+        spool.append([f"m v={i}i {i}"])
+    spool.close()
+    stats = spool.get_stats()
+    assert stats["segments_evicted"] == 2
+    assert stats["bytes"] == 27
+
+    recovered = WriteAheadSpool(str(tmp_path), segment_bytes=9, max_bytes=30)
+    path, lines = recovered.read_oldest()
+    assert lines == ["m v=2i 2"]
+    recovered.commit(path, len(lines))
+    assert recovered.read_oldest()[1] == ["m v=3i 3"]
+
+
+def test_spool_skips_torn_record(tmp_path):
+    (tmp_path / "segment-000000000000.lp").write_bytes(b"m v=1i 1\nm v=2")
+    spool = WriteAheadSpool(str(tmp_path))
+    assert spool.read_oldest()[1] == ["m v=1i 1"]
+
+
+def test_spool_never_evicts_segment_being_replayed(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), segment_bytes=9, max_bytes=30)
+    spool.append(["m v=0i 0"])
+    path, lines = spool.read_oldest()
+    for i in range(1, 5):
+        spool.append([f"m v={i}i {i}"])
+    assert lines == ["m v=0i 0"]
+    assert spool.read_oldest()[0] == path
+    spool.commit(path, len(lines))
+    assert spool.read_oldest()[1] == ["m v=3i 3"]
+
+
+def test_replay_skips_missing_segment(tmp_path):
+    written = []
+    spool = WriteAheadSpool(str(tmp_path), segment_bytes=9)
+    spool.append(["m v=0i 0"])
+    spool.append(["m v=1i 1"])
+    # Removed behind the spool's back between listing and reading
+    (tmp_path / "segment-000000000000.lp").unlink()
+    writer = BatchingWriter(write_fn=written.extend, spool=spool, replay_interval=0)
+    writer._maybe_replay()
+    writer._maybe_replay()
+    assert written == ["m v=1i 1"]
+    assert not spool.has_pending()
+    assert spool.get_stats()["segments_evicted"] == 1
+
+
+def test_overflow_is_spooled_off_the_submitting_thread(tmp_path):
+    blocked = threading.Event()
+    spool = WriteAheadSpool(str(tmp_path))
+    writer = BatchingWriter(
+        write_fn=lambda batch: blocked.wait(), batch_size=1, flush_interval=60,
+        max_queue_size=2, spool=spool
+    )
+    appends = []
+    original_append = spool.append
+    spool.append = lambda lines: (appends.append(threading.current_thread().name), original_append(lines))
+    writer.start()
+    accepted = sum(writer.submit(f"m v={i}i {i}") for i in range(10))
+    deadline = time.monotonic() + 2
+    while spool.get_stats()["records_spooled"] + 3 < accepted and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spool.get_stats()["records_spooled"] + 3 >= accepted > 3
+    assert threading.current_thread().name not in appends
+    blocked.set()
+    writer.close()
+
+
+def test_spool_directory_is_exclusive(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path))
+    with pytest.raises(OSError):
+        WriteAheadSpool(str(tmp_path))
+    spool.close()
+    WriteAheadSpool(str(tmp_path)).close()
+
+
+def test_worker_spools_adopt_only_exited_siblings(tmp_path):
+    # A running worker, an exited one and segments from the single-worker layout
+    running = WriteAheadSpool(str(tmp_path / "worker-1"), segment_bytes=9, adopt_from=str(tmp_path))
+    running.append(["m v=1i 1"])
+    exited = WriteAheadSpool(str(tmp_path / "worker-2"), segment_bytes=9, adopt_from=str(tmp_path))
+    exited.append(["m v=2i 2"])
+    exited.close()
+    (tmp_path / "segment-000000000000.lp").write_bytes(b"m v=0i 0\n")
+
+    spool = WriteAheadSpool(str(tmp_path / "worker-3"), segment_bytes=9, adopt_from=str(tmp_path))
+    replayed = []
+    while (segment := spool.read_oldest()) is not None:
+        replayed.extend(segment[1])
+        spool.commit(segment[0])
+    assert sorted(replayed) == ["m v=0i 0", "m v=2i 2"]
+    assert spool.get_stats()["segments_adopted"] == 2
+    assert not (tmp_path / "worker-2").exists()
+    assert running.read_oldest()[1] == ["m v=1i 1"]
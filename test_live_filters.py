@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from services.codecs import JSON_CODEC, pack_envelope
+from services.fanout_hub import FanoutHub
+from services.live_filters import FilterIndex, LiveFilter, compile_filter
+
+
+def packet(protocol="TCP", source="10.0.0.5", dest="8.8.8.8", sport=50000, dport=443, indicators=(), country="US"):
+    return {
+        "protocol": protocol, "source_ip": source, "dest_ip": dest, "source_port": sport, "dest_port": dport,
+        "threat_indicators": list(indicators),
+        "dest_ip_enrichment": {"geoip": {"country": country}},
+    }
+
+
+@pytest.mark.parametrize("expression,expected", [
+    ({"protocol": "tcp"}, True),
+    ({"protocols": ["UDP", "ICMP"]}, False),
+    ({"cidr": "10.0.0.0/24"}, True),
+    ({"source_cidr": "8.8.0.0/16"}, False),
+    ({"ip": "8.8.8.8", "port": 443}, True),
+    ({"ports": [53, 80]}, False),
+    ({"indicators": ["large_packet"]}, False),
+    ({"enrichment": {"geoip.country": "us"}}, True),
+    ({"dest_port": 443, "enrichment": {"geoip.country": "DE"}}, False),
+])
+def test_compiled_predicates(expression, expected):
+    assert compile_filter(LiveFilter(**expression))(packet()) is expected
+
+
+def test_invalid_filters_are_rejected():
+    for expression in ({"cidr": "10.0.0.0/33"}, {"ports": [70000]}, {"enrichment": {"geoip.country; drop": "x"}}):
+        with pytest.raises(ValidationError):
+            LiveFilter(**expression)
+
+
+def test_index_only_evaluates_candidates():
+    index = FilterIndex()
+    index.add(1, LiveFilter(protocol="UDP"))
+    index.add(2, LiveFilter(dest_port=443))
+    index.add(3, LiveFilter(cidr="10.0.0.0/8"))
+    index.add(4)
+    assert sorted(index.match(packet())) == [2, 3]
+    assert sorted(index.match(packet(protocol="UDP", dport=53, source="1.1.1.1"))) == [1]
+    index.remove(2)
+    index.add(3, LiveFilter(protocol="ICMP"))
+    assert list(index.match(packet())) == []
+    assert index.unfiltered == {4}
+
+
+def test_hub_sends_filtered_clients_only_matching_packets():
+    hub = FanoutHub()
+
+    async def scenario():
+        everything = hub.register("packets")
+        udp_only = hub.register("packets")
+        hub.set_filter(udp_only, LiveFilter(protocol="UDP"))
+        envelope = pack_envelope(JSON_CODEC, [JSON_CODEC.encode(packet()), JSON_CODEC.encode(packet(protocol="UDP"))])
+        await hub._dispatch("packets", envelope)
+        await hub._dispatch("packets", JSON_CODEC.encode(packet()))
+        results = [await everything.get(), await everything.get(), await udp_only.get()]
+        remaining = udp_only.queue.qsize()
+        await hub.close()
+        return results, remaining
+
+    (first, second, filtered), remaining = asyncio.run(scenario())
+    assert len(first[1]) == 2 and len(second[1]) == 1
+    assert filtered[0] is None and [p["protocol"] for p in filtered[1]] == ["UDP"]
+    assert remaining == 0
@@ -0,0 +1,37 @@
+from services.live_metrics import LiveMetrics, diff_states, flatten_state
+
+
+def packet(protocol, source, dest, length, indicators=()):
+    return {"protocol": protocol, "source_ip": source, "dest_ip": dest, "length": length,
+            "threat_indicators": list(indicators)}
+
+
+def test_tick_summarizes_rates_and_talkers():
+    metrics = LiveMetrics(top_talkers=2, history_seconds=2)
+    metrics.observe([packet("TCP", "10.0.0.1", "1.1.1.1", 100), packet("UDP", "10.0.0.2", "1.1.1.1", 50, ["dns"])])
+    metrics.tick()
+    metrics.observe([packet("TCP", "10.0.0.1", "8.8.8.8", 300)])
+    delta = metrics.tick()
+    state = metrics.state
+    assert state["1s/packets_per_sec/TCP"] == 1 and "1s/packets_per_sec/UDP" not in state
+    assert state["2s/packets_per_sec/TCP"] == 1.0 and state["2s/bytes_per_sec/TCP"] == 200.0
+    assert state["2s/top_talkers/10.0.0.1"] == 200.0 and state["2s/top_talkers/8.8.8.8"] == 150.0
+    assert "2s/top_talkers/1.1.1.1" not in state
+    assert state["2s/indicators/dns"] == 1
+    assert "1s/packets_per_sec/UDP" in delta["unset"]
+    assert delta["set"]["1s/top_talkers/8.8.8.8"] == 300
+
+
+def test_unchanged_state_produces_empty_delta():
+    metrics = LiveMetrics()
+    metrics.tick()
+    seq = metrics.seq
+    assert metrics.tick() == {"set": {}, "unset": []}
+    assert metrics.seq == seq
+
+
+def test_flatten_and_diff():
+    previous = flatten_state({"a": {"b": 1, "c": {"d": 2}}, "e": {}})
+    current = flatten_state({"a": {"b": 1, "c": {"d": 3}}, "f": 4})
+    assert previous == {"a/b": 1, "a/c/d": 2, "e": {}}
+    assert diff_states(previous, current) == {"set": {"a/c/d": 3, "f": 4}, "unset": ["e"]}
@@ -0,0 +1,308 @@
+import asyncio
+import json
+
+from services.codecs import JSON_CODEC, pack_envelope, unpack_messages
+from services.message_queue import BatchingPublisher, MessageQueueService
+
+
+class StreamRedis:
+    """Just enough of the Redis stream commands to drive consume_stream."""
+
+    def __init__(self):
+        self.entries = []
+        self.groups = {}
+        self.acked = []
+        self.keys = {}
+
+    async def set(self, key, value, get=False):
+        previous = self.keys.get(key)
+        self.keys[key] = value.encode()
+        return previous if get else True
+
+    async def delete(self, *keys):
+        return sum(self.keys.pop(key, None) is not None for key in keys)
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entry_id = f"{len(self.entries) + 1}-0".encode()
+        self.entries.append((entry_id, {k.encode(): v for k, v in fields.items()}))
+        return entry_id
+
+    async def xgroup_create(self, stream, group, id="$", mkstream=False):
+        self.groups.setdefault(group, {"last": 0, "pending": {}})
+
+    async def xgroup_setid(self, stream, group, id):
+        self.groups[group]["last"] = int(id.split("-")[0])
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        state = self.groups[group]
+        (position,) = streams.values()
+        if position == ">":
+            batch = self.entries[state["last"]:state["last"] + count]
+            if batch:
+                state["last"] += len(batch)
+                for entry_id, _ in batch:
+                    state["pending"][entry_id] = consumer
+            else:
+                await asyncio.sleep(block / 1000)
+        else:
+            after = int(position.split("-")[0])
+            batch = [entry for entry in self.entries
+                     if entry[0] in state["pending"] and int(entry[0].split(b"-")[0]) > after][:count]
+        return [[b"stream", batch]] if batch else []
+
+    async def xack(self, stream, group, *ids):
+        for entry_id in ids:
+            self.groups[group]["pending"].pop(entry_id, None)
+            self.acked.append(entry_id)
+        return len(ids)
+
+    async def xautoclaim(self, *args, **kwargs):
+        return [b"0-0", []]
+
+    def pipeline(self, transaction=True):
+        return StreamPipeline(self)
+
+
+class StreamPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    async def execute(self):
+        self.redis.round_trips = getattr(self.redis, "round_trips", 0) + 1
+        if getattr(self.redis, "down", False):
+            raise ConnectionError("redis down")
+        return [await self.redis.xadd(*args, **kwargs) for args, kwargs in self.commands]
+
+
+def run_consumer(queue, handler, seconds=0.05, **kwargs):
+    async def scenario():
+        task = asyncio.create_task(queue.consume_stream("s", "g", "c1", handler, count=2, block_ms=5, **kwargs))
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def publish(queue, count):
+    async def scenario():
+        for i in range(count):
+            await queue.publish_to_stream("s", {"n": i})
+
+    asyncio.run(scenario())
+
+
+def test_consume_acks_batches_in_order():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    publish(queue, 5)
+    seen = []
+
+    async def handler(batch):
+        seen.append([message["n"] for message in batch])
+
+    run_consumer(queue, handler)
+    assert seen == [[0, 1], [2, 3], [4]]
+    assert len(queue.redis_client.acked) == 5
+    assert queue.group_stats["g"]["consumed"] == 5
+
+
+def test_failed_batches_stay_pending_and_are_redelivered_after_restart():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    publish(queue, 3)
+
+    async def failing(batch):
+        raise RuntimeError("storage down")
+
+    run_consumer(queue, failing)
+    assert queue.redis_client.acked == []
+    assert len(queue.redis_client.groups["g"]["pending"]) == 3
+
+    seen = []
+
+    async def handler(batch):
+        seen.extend(message["n"] for message in batch)
+
+    # Same consumer name after a restart: its pending entries come first
+    run_consumer(queue, handler)
+    assert seen == [0, 1, 2]
+    assert queue.redis_client.groups["g"]["pending"] == {}
+
+
+def test_partially_handled_batches_only_retry_the_rest():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    publish(queue, 4)
+
+    async def handler(batch):
+        # Odd packets are rejected by the backend
+        return [index for index, message in enumerate(batch) if message["n"] % 2]
+
+    run_consumer(queue, handler)
+    assert queue.redis_client.acked == [b"1-0", b"3-0"]
+    assert set(queue.redis_client.groups["g"]["pending"]) == {b"2-0", b"4-0"}
+    assert queue.group_stats["g"]["consumed"] == 2
+
+
+def test_stream_appends_are_pipelined_and_fall_back_on_failure():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    fallback = []
+
+    async def scenario():
+        queue.stream_publisher = BatchingPublisher(queue._send_stream_batch, linger=0.01, max_batch=100)
+        queue.stream_publisher.start()
+        for i in range(5):
+            assert await queue.append_to_stream("s", {"n": i}, fallback.extend)
+        await asyncio.sleep(0.03)
+        queue.redis_client.down = True
+        for i in range(5, 7):
+            await queue.append_to_stream("s", {"n": i}, fallback.extend)
+        await queue.stream_publisher.close()
+
+    asyncio.run(scenario())
+    assert [json.loads(fields[b"data"])["n"] for _, fields in queue.redis_client.entries] == [0, 1, 2, 3, 4]
+    assert queue.redis_client.round_trips == 2
+    assert fallback == [{"n": 5}, {"n": 6}]
+    assert queue.stream_stats == {"published": 5, "publish_failures": 2}
+
+
+def test_replay_from_position():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    publish(queue, 4)
+    run_consumer(queue, lambda batch: asyncio.sleep(0))
+    seen = []
+
+    async def handler(batch):
+        seen.extend(message["n"] for message in batch)
+
+    run_consumer(queue, handler, start_id="2-0")
+    assert seen == [2, 3]
+    assert json.loads(queue.redis_client.entries[0][1][b"data"]) == {"n": 0}
+
+
+def test_replay_position_is_applied_once_across_workers():
+    queue = MessageQueueService()
+    queue.redis_client = StreamRedis()
+    publish(queue, 4)
+    seen = []
+
+    async def handler(batch):
+        seen.extend(message["n"] for message in batch)
+
+    run_consumer(queue, handler, start_id="2-0")
+    publish(queue, 1)
+    # A late worker (or a restart) with the same setting must not rewind again
+    run_consumer(queue, handler, start_id="2-0")
+    assert seen == [2, 3, 0]
+
+    run_consumer(queue, handler, start_id="3-0")
+    assert seen == [2, 3, 0, 3, 0]
+
+
+def test_publisher_batches_by_size_and_linger():
+    sent = []
+
+    async def send(batch):
+        sent.append(batch)
+
+    async def scenario():
+        publisher = BatchingPublisher(send, linger=0.02, max_batch=3)
+        publisher.start()
+        for i in range(4):
+            publisher.submit("c", str(i).encode())
+        await asyncio.sleep(0.05)
+        publisher.submit("c", b"late")
+        await publisher.close()
+        return publisher.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert [[message for _, message in batch] for batch in sent] == [[b"0", b"1", b"2"], [b"3"], [b"late"]]
+    assert stats["messages_published"] == 5
+    assert stats["batch_size"]["count"] == 3
+    assert stats["publish_latency_ms"]["count"] == 5
+
+
+def test_envelope_round_trip():
+    messages = [JSON_CODEC.encode({"n": i}) for i in range(3)]
+    assert unpack_messages(json.loads(pack_envelope(JSON_CODEC, messages))) == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert unpack_messages({"n": 0}) == [{"n": 0}]
+
+
+def test_in_process_bus_delivers_objects_and_feeds_groups():
+    queue = MessageQueueService()
+    packet = {"id": "pkt-1", "threat_indicators": []}
+    received, batches = [], []
+
+    async def on_message(message):
+        received.append(message)
+
+    async def handler(batch):
+        batches.append(batch)
+
+    async def scenario():
+        await queue._use_memory()
+        subscriber = asyncio.create_task(queue.subscribe_to_channel("c", on_message))
+        consumer = asyncio.create_task(queue.consume_stream("s", "g", "c1", handler))
+        await asyncio.sleep(0)
+        assert await queue.publish_packet_data("c", packet)
+        ids = [await queue.publish_to_stream("s", {"n": n}) for n in range(3)]
+        await asyncio.sleep(0.01)
+        stats = await queue.get_stream_stats("s")
+        subscriber.cancel()
+        consumer.cancel()
+        await asyncio.gather(subscriber, consumer, return_exceptions=True)
+        return ids, stats
+
+    ids, stats = asyncio.run(scenario())
+    # Handed over as the same object, never serialized
+    assert received == [packet] and received[0] is packet
+    assert ids == ["1-0", "2-0", "3-0"]
+    assert [message["n"] for batch in batches for message in batch] == [0, 1, 2]
+    assert stats["backend"] == "memory" and stats["groups"]["g"]["consumed"] == 3
+
+
+def test_in_process_stream_rejects_when_any_group_is_full():
+    queue = MessageQueueService()
+    queue.memory_bus.queue_size = 1
+
+    async def scenario():
+        await queue._use_memory()
+        assert await queue.publish_to_stream("s", {"n": 0}) is None  # no consumer groups yet
+        queue.memory_bus.group_queue("s", "a")
+        queue.memory_bus.group_queue("s", "b").put_nowait(("0-0", {}))
+        return await queue.publish_to_stream("s", {"n": 1})
+
+    assert asyncio.run(scenario()) is None
+    assert queue.memory_bus.group_queue("s", "a").empty()
+
+
+def test_envelopes_only_on_opted_in_channels():
+    published = []
+
+    class Pipeline:
+        def publish(self, channel, message):
+            published.append((channel, message))
+
+        async def execute(self):
+            return []
+
+    class Redis:
+        def pipeline(self, transaction=True):
+            return Pipeline()
+
+    queue = MessageQueueService()
+    queue.redis_client = Redis()
+    batch = [("network_packets", JSON_CODEC.encode({"n": i})) for i in range(3)]
+    batch += [("security_alerts", JSON_CODEC.encode({"alert": i})) for i in range(2)]
+    asyncio.run(queue._send_batch(batch))
+    alerts = [json.loads(message) for channel, message in published if channel == "security_alerts"]
+    packets = [json.loads(message) for channel, message in published if channel == "network_packets"]
+    assert alerts == [{"alert": 0}, {"alert": 1}]
+    assert len(packets) == 1 and unpack_messages(packets[0]) == [{"n": 0}, {"n": 1}, {"n": 2}]
@@ -11,3 +11,19 @@ def test_get_logs_summary():
     r = requests.get(f"{API}/logs/summary")
     assert r.status_code == 200
     assert "total_packets" in r.json() or "summary" in r.json()
+
+def test_get_network_logs_with_filters():
+    r = requests.get(f"{API}/logs/network", params={"protocol": "TCP", "cidr": "10.0.0.0/8", "dest_port": 443})
+    assert r.status_code == 200
+    assert isinstance(r.json(), list)
+
+def test_get_logs_aggregate():
+    r = requests.get(f"{API}/logs/aggregate", params={"group_by": "protocol", "interval": "1m"})
+    assert r.status_code == 200
+    assert "buckets" in r.json()
+
+def test_export_network_logs_ndjson():
+    r = requests.get(f"{API}/logs/network/export", params={"limit": 10})
+    assert r.status_code == 200
+    trailer = r.text.strip().split("\n")[-1]
+    assert "_export" in trailer
@@ -0,0 +1,25 @@
+from services.packet_history import PacketHistory
+
+
+def test_after_seq_reports_gaps():
+    history = PacketHistory(capacity=3)
+    assert history.after_seq(10) == ([], False)
+    history.extend([{"seq": seq} for seq in (11, 12)])
+    assert history.after_seq(10) == ([{"seq": 11}, {"seq": 12}], True)
+    assert history.after_seq(12) == ([], True)
+    history.extend([{"seq": seq} for seq in (13, 14)])
+    assert history.after_seq(10) == ([{"seq": 12}, {"seq": 13}, {"seq": 14}], False)
+    assert history.after_seq(11) == ([{"seq": 12}, {"seq": 13}, {"seq": 14}], True)
+
+
+def test_after_time_tracks_coverage(monkeypatch):
+    clock = iter([100.0, 110.0, 120.0, 130.0])
+    monkeypatch.setattr("services.packet_history.time.time", lambda: next(clock))
+    history = PacketHistory(capacity=2)
+    for seq in range(3):
+        history.extend([{"seq": seq}])
+    # Created at 100; the packet received at 110 was evicted
+    assert history.covered_from == 110.0
+    assert history.after_time(115.0) == ([{"seq": 1}, {"seq": 2}], True)
+    assert history.after_time(105.0) == ([{"seq": 1}, {"seq": 2}], False)
+    assert history.after_time(125.0) == ([{"seq": 2}], True)
@@ -0,0 +1,73 @@
+import io
+import time
+
+from scapy.all import Ether, IP, TCP, UDP, rdpcap
+
+from services.log_query import NetworkLogFilter
+from services.pcap_store import PcapStore, flow_hash, parse_flow, LINKTYPE_ETHERNET
+
+BASE = 1704067200.0  # 2024-01-01T00:00:00Z
+RANGE = {"start_time": "2024-01-01T00:00:00Z", "end_time": "2024-01-01T01:00:00Z"}
+
+
+def frame(src, sport, dst, dport, transport=TCP):
+    return bytes(Ether() / IP(src=src, dst=dst) / transport(sport=sport, dport=dport) / b"payload")
+
+
+def write(store, frames):
+    store.start()
+    for offset, data in enumerate(frames):
+        assert store.submit(BASE + offset, data)
+    store.close()
+
+
+def export(store, bidirectional=True, **filters):
+    chunks = store.export(NetworkLogFilter(**{**RANGE, **filters}), bidirectional)
+    return rdpcap(io.BytesIO(b"".join(chunks)))
+
+
+def test_flow_hash_is_direction_independent():
+    forward = parse_flow(frame("10.0.0.1", 40000, "10.0.0.2", 443), LINKTYPE_ETHERNET)
+    reverse = parse_flow(frame("10.0.0.2", 443, "10.0.0.1", 40000), LINKTYPE_ETHERNET)
+    assert forward[0] == 6 and forward[2] == 40000 and forward[4] == 443
+    assert flow_hash(forward) == flow_hash(reverse)
+
+
+def test_export_filters_by_flow_and_time(tmp_path):
+    store = PcapStore(str(tmp_path), max_age_seconds=10 ** 10)
+    write(store, [
+        frame("10.0.0.1", 40000, "10.0.0.2", 443),
+        frame("10.0.0.2", 443, "10.0.0.1", 40000),
+        frame("10.0.0.3", 5353, "10.0.0.2", 53, UDP),
+        frame("10.0.0.1", 40001, "10.0.0.2", 443),
+    ])
+    flow = {"protocol": "TCP", "source_ip": "10.0.0.1", "source_port": 40000, "dest_ip": "10.0.0.2", "dest_port": 443}
+    assert len(export(store, **flow)) == 2
+    packets = export(store, **flow, start_time="2024-01-01T00:00:01Z")
+    assert len(packets) == 1 and packets[0][IP].src == "10.0.0.2" and packets[0].time == BASE + 1
+    assert len(export(store, bidirectional=False, **flow)) == 1
+    assert len(export(store, protocol="UDP")) == 1
+    assert len(export(store, cidr="10.0.0.0/31")) == 3
+    assert len(export(store)) == 4
+
+
+def test_segments_roll_over_expire_and_recover(tmp_path):
+    store = PcapStore(str(tmp_path), segment_seconds=2, max_age_seconds=10 ** 10)
+    write(store, [frame("10.0.0.1", 1000 + i, "10.0.0.2", 80) for i in range(5)])
+    assert store.get_stats()["segments"] == 3
+
+    recovered = PcapStore(str(tmp_path), segment_seconds=2, max_age_seconds=10 ** 10, max_bytes=store.get_stats()["bytes"] - 1)
+    assert recovered.get_stats()["packets_stored"] == 5
+    write(recovered, [])
+    recovered._enforce_limits()
+    assert recovered.get_stats()["segments"] == 2
+    assert len(export(recovered)) == 3
+
+
+def test_submit_never_blocks_when_full(tmp_path):
+    store = PcapStore(str(tmp_path), queue_size=1)
+    started = time.monotonic()
+    assert store.submit(BASE, b"x")
+    assert not store.submit(BASE, b"y")
+    assert time.monotonic() - started < 0.1
+    assert store.get_stats()["packets_dropped"] == 1
@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.log_query import NetworkLogFilter, merge_aggregate_rows, parse_time
+from services.query_cache import QueryCache, split_time_range
+
+NOW = datetime(2024, 1, 1, 12, 30, 45, tzinfo=timezone.utc)
+MINUTE = timedelta(minutes=1)
+SETTLE = timedelta(seconds=10)
+
+
+HOUR = timedelta(hours=1)
+
+
+def ranges(parts):
+    return [(part.start_time[11:16], part.end_time[11:16], cacheable) for part, cacheable in parts]
+
+
+def test_split_caches_aligned_segments_of_relative_range():
+    parts = split_time_range(NetworkLogFilter(start_time="-6h"), NOW, MINUTE, SETTLE, HOUR)
+    assert ranges(parts) == [
+        ("06:30", "07:00", False),
+        ("07:00", "08:00", True), ("08:00", "09:00", True), ("09:00", "10:00", True),
+        ("10:00", "11:00", True), ("11:00", "12:00", True),
+        # Partial trailing segment and open head are queried together
+        ("12:00", "12:30", False),
+    ]
+    assert parts[-1][0].end_time == NOW.isoformat()
+    # A minute later the cached segments are the same ones
+    later = split_time_range(NetworkLogFilter(start_time="-6h"), NOW + MINUTE, MINUTE, SETTLE, HOUR)
+    assert [part for part, cacheable in later if cacheable] == [part for part, cacheable in parts if cacheable]
+
+
+def test_split_past_range_is_fully_cached():
+    filters = NetworkLogFilter(start_time="2023-12-01T00:30:00Z", end_time="2023-12-01T03:15:00Z")
+    parts = split_time_range(filters, NOW, MINUTE, SETTLE, HOUR)
+    assert ranges(parts) == [
+        ("00:30", "01:00", True), ("01:00", "02:00", True), ("02:00", "03:00", True), ("03:00", "03:15", True),
+    ]
+
+
+def test_split_widens_segments_for_long_ranges():
+    parts = split_time_range(NetworkLogFilter(start_time="-24h"), NOW, MINUTE, SETTLE, HOUR, max_segments=12)
+    cached = [part for part, cacheable in parts if cacheable]
+    assert len(cached) <= 12
+    assert all(parse_time(part.end_time) - parse_time(part.start_time) == 2 * HOUR for part in cached)
+
+
+def test_split_empty_range():
+    assert split_time_range(NetworkLogFilter(start_time="-1m", end_time="-1m"), NOW, MINUTE, SETTLE, HOUR) == []
+
+
+def test_cache_coalesces_and_stores():
+    cache = QueryCache(max_rows=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [1, 2]
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        assert all(result == [1, 2] for result in results)
+        assert await cache.get_or_compute("k", compute) == [1, 2]
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+    assert stats["hit_rate"] == pytest.approx(5 / 6, abs=1e-4)
+
+
+def test_cache_skips_empty_and_unstored_results_and_evicts():
+    cache = QueryCache(max_rows=3)
+
+    async def scenario():
+        await cache.get_or_compute("empty", lambda: asyncio.sleep(0, result=[]))
+        await cache.get_or_compute("head", lambda: asyncio.sleep(0, result=[1]), store=False)
+        await cache.get_or_compute("a", lambda: asyncio.sleep(0, result=[1, 2]))
+        await cache.get_or_compute("b", lambda: asyncio.sleep(0, result=[3, 4]))
+
+    asyncio.run(scenario())
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["rows"], stats["evictions"]) == (1, 2, 1)
+
+
+def test_cache_propagates_errors_to_waiters():
+    cache = QueryCache()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("k", fail) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_merge_aggregate_rows_realigns_partial_windows():
+    rows = [
+        {"time": "2024-01-01T12:30:00+00:00", "key": "TCP", "value": 5},  # closed part cut at 12:30
+        {"time": "2024-01-01T13:00:00+00:00", "key": "TCP", "value": 2},  # head's window
+        {"time": "2024-01-01T12:00:00+00:00", "key": "TCP", "value": 7},
+    ]
+    assert merge_aggregate_rows(rows, "1h") == [
+        {"time": "2024-01-01T12:00:00+00:00", "key": "TCP", "value": 7},
+        {"time": "2024-01-01T13:00:00+00:00", "key": "TCP", "value": 7},
+    ]
+
+
+def test_cached_aggregate_applies_top_after_merging(monkeypatch):
+    from api_gateway.endpoints import logs
+
+    calls = []
+
+    def aggregate(filters, group_by, interval, metric, top, exclude_zero):
+        calls.append(top)
+        # "b" is second in every segment but first overall
+        if filters.end_time.startswith("2023-12-01T01"):
+            return [{"time": None, "key": "a", "value": 10}, {"time": None, "key": "b", "value": 8}]
+        return [{"time": None, "key": "c", "value": 10}, {"time": None, "key": "b", "value": 8}]
+
+    monkeypatch.setattr(logs.storage_backend, "aggregate_network_logs", aggregate)
+    monkeypatch.setattr(logs.storage_backend, "is_backfilling", lambda: False)
+    logs.query_cache.clear()
+    filters = NetworkLogFilter(start_time="2023-12-01T00:00:00Z", end_time="2023-12-01T02:00:00Z")
+    rows = asyncio.run(logs.cached_aggregate(filters, group_by="source_ip", top=1))
+    assert rows == [{"time": None, "key": "b", "value": 16}]
+    assert calls == [None, None]
+
+
+def test_cache_plan_waits_out_the_write_pipeline(monkeypatch):
+    from api_gateway.endpoints import logs
+
+    monkeypatch.setattr(logs.storage_backend, "is_backfilling", lambda: False)
+    now = datetime.now(timezone.utc)
+    filters = NetworkLogFilter(
+        start_time=(now - timedelta(hours=3)).isoformat(), end_time=(now - timedelta(minutes=2)).isoformat()
+    )
+    monkeypatch.setattr(logs.storage_backend, "write_lag_seconds", lambda: 0.0)
+    assert all(store for _, store, _ in logs._cache_plan(filters))
+    # Retries can still land writes in the last few minutes
+    monkeypatch.setattr(logs.storage_backend, "write_lag_seconds", lambda: 600.0)
+    plan = logs._cache_plan(filters)
+    assert not plan[-1][1] and parse_time(plan[-1][0].start_time) <= now - timedelta(minutes=10)
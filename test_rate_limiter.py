@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from services.rate_limiter import MemoryRateLimitBackend, RateLimiter, RateLimitPolicy, parse_policies
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(spec="control=5/10s,control:admin=20/10s,odd=3/10s", max_keys=100):
+    clock = Clock()
+    memory = MemoryRateLimitBackend(max_keys=max_keys, sweep_seconds=60, clock=clock)
+    return RateLimiter(parse_policies(spec), backend="memory", memory=memory), clock
+
+
+def check(limiter, route, identity, role=None):
+    return asyncio.run(limiter.check(route, identity, role))
+
+
+def test_burst_then_steady_rate():
+    limiter, clock = make_limiter()
+    assert [check(limiter, "control", "u1")[0] for _ in range(6)] == [True] * 5 + [False]
+    assert check(limiter, "control", "u1") == (False, pytest.approx(2.0))
+    clock.now += 2
+    assert check(limiter, "control", "u1")[0] and not check(limiter, "control", "u1")[0]
+    # Other identities and unlimited routes are unaffected
+    assert check(limiter, "control", "u2")[0] and check(limiter, "other", "u1")[0]
+    # Uneven intervals still allow the whole burst
+    assert [check(limiter, "odd", "u1")[0] for _ in range(4)] == [True] * 3 + [False]
+
+
+def test_role_policy_overrides_route_policy():
+    limiter, _ = make_limiter()
+    assert sum(check(limiter, "control", "admin-1", "admin")[0] for _ in range(25)) == 20
+    assert sum(check(limiter, "control", "analyst-1", "analyst")[0] for _ in range(25)) == 5
+
+
+def test_expired_and_excess_keys_are_evicted():
+    limiter, clock = make_limiter(max_keys=3)
+    for n in range(5):
+        check(limiter, "control", f"u{n}")
+    assert limiter.memory.get_stats() == {"keys": 3, "evicted": 2}
+    clock.now += 61
+    check(limiter, "control", "u9")
+    assert limiter.memory.get_stats() == {"keys": 1, "evicted": 5}
+
+
+@pytest.mark.parametrize("spec", ["control=5", "control=0/10s", "control:=5/10s"])
+def test_rejects_malformed_policies(spec):
+    with pytest.raises(ValueError):
+        parse_policies(spec)
+
+
+def test_policy_spacing():
+    policy = RateLimitPolicy(5, 10)
+    assert (policy.interval, policy.tolerance) == (2.0, 8.0)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.log_query import NetworkLogFilter
+from services.sqlite_backend import SQLiteBackend
+from services.storage_backend import StorageBackend
+
+BASE = datetime(2024, 1, 1, 23, 0, tzinfo=timezone.utc)
+RANGE = {"start_time": "2024-01-01T00:00:00Z", "end_time": "2024-01-03T00:00:00Z"}
+
+
+def make_log(minutes, protocol="TCP", source_ip="10.0.0.1", dest_ip="93.184.216.34", dest_port=443, **extra):
+    return {
+        "timestamp": (BASE + timedelta(minutes=minutes)).isoformat(),
+        "protocol": protocol,
+        "source_ip": source_ip,
+        "source_port": 40000,
+        "dest_ip": dest_ip,
+        "dest_port": dest_port,
+        "length": 100,
+        "summary": f"{protocol} packet",
+        **extra,
+    }
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "logs.db"), partition_hours=24, retention_days=0, flush_interval=0.01)
+    backend.write_batch([
+        make_log(0),
+        make_log(30, protocol="UDP", dest_port=53),
+        make_log(90, source_ip="192.168.1.7", threat_indicators=["port_scan"]),  # next day's partition
+        make_log(91, protocol="ICMP", dest_port=0),
+    ])
+    assert backend.flush()
+    yield backend
+    backend.close()
+
+
+def test_implements_storage_backend(backend):
+    assert isinstance(backend, StorageBackend)
+    assert backend.get_write_stats()["partitions"] == 2
+
+
+def test_query_newest_first_across_partitions(backend):
+    logs = backend.query_network_logs(limit=3, filters=NetworkLogFilter(**RANGE))
+    assert [log["protocol"] for log in logs] == ["ICMP", "TCP", "UDP"]
+    assert logs[0]["timestamp"] == "2024-01-02T00:31:00+00:00"
+
+
+def test_query_filters(backend):
+    def protocols(**filters):
+        return [log["protocol"] for log in backend.query_network_logs(filters=NetworkLogFilter(**RANGE, **filters))]
+
+    assert protocols(protocol="UDP") == ["UDP"]
+    assert protocols(port=53) == ["UDP"]
+    assert protocols(cidr="192.168.0.0/16") == ["TCP"]
+    assert protocols(indicators=["port_scan"]) == ["TCP"]
+    assert protocols(indicators=["port"]) == []
+
+
+def test_aggregate(backend):
+    filters = NetworkLogFilter(**RANGE)
+    by_protocol = backend.aggregate_network_logs(filters, group_by="protocol")
+    assert {row["key"]: row["value"] for row in by_protocol} == {"TCP": 2, "UDP": 1, "ICMP": 1}
+    ports = backend.aggregate_network_logs(filters, group_by="dest_port", metric="bytes", top=1, exclude_zero=True)
+    assert ports == [{"time": None, "key": 443, "value": 200}]
+    series = backend.aggregate_network_logs(filters, interval="1h")
+    assert series == [
+        {"time": "2024-01-02T00:00:00+00:00", "key": None, "value": 2},
+        {"time": "2024-01-02T01:00:00+00:00", "key": None, "value": 2},
+    ]
+
+
+def test_stream_resumes_after_cursor(backend):
+    rows = list(backend.stream_network_logs(NetworkLogFilter(**RANGE)))
+    assert [row["protocol"] for row in rows] == ["TCP", "UDP", "TCP", "ICMP"]
+    resumed = list(backend.stream_network_logs(
+        NetworkLogFilter(**RANGE), resume_from=(datetime.fromisoformat(rows[1]["timestamp"]), 1)
+    ))
+    assert resumed == rows[2:]
+
+
+def test_retention_drops_old_partitions(backend):
+    assert backend.drop_expired_partitions(datetime(2024, 1, 10, tzinfo=timezone.utc)) == 0
+    backend.retention_days = 8
+    assert backend.drop_expired_partitions(datetime(2024, 1, 10, tzinfo=timezone.utc)) == 1
+    assert [log["protocol"] for log in backend.query_network_logs(filters=NetworkLogFilter(**RANGE))] == ["ICMP", "TCP"]
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from firebase_admin import auth
+
+from services.token_verifier import ISSUER_PREFIX, TokenVerifier
+
+PROJECT = "netverse-test"
+
+
+def make_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return key, public
+
+
+SIGNING_KEY, PUBLIC_PEM = make_key()
+
+
+def make_token(uid="user-1", key=SIGNING_KEY, kid="k1", project=PROJECT, expires_in=3600, auth_time=None):
+    now = int(time.time())
+    claims = {
+        "iss": f"{ISSUER_PREFIX}{project}", "aud": project, "sub": uid,
+        "iat": now, "exp": now + expires_in, "auth_time": auth_time or now - 10, "email": f"{uid}@example.com",
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+class FakeKeySet:
+    def __init__(self, keys):
+        self.keys, self.calls = keys, 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.keys), 3600
+
+
+def make_verifier(revoked=None):
+    keys = FakeKeySet({"k1": PUBLIC_PEM})
+    revoked = revoked if revoked is not None else {}
+    verifier = TokenVerifier(PROJECT, max_entries=2, fetch_keys=keys, check_revocation=lambda uid: revoked.get(uid))
+    return verifier, keys, revoked
+
+
+def test_caches_claims_and_keys():
+    verifier, keys, _ = make_verifier()
+    token = make_token()
+
+    async def scenario():
+        first = await verifier.verify(token)
+        second = await verifier.verify(token)
+        await verifier.verify(make_token("user-2"))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["uid"] == "user-1" and second is first
+    stats = verifier.get_stats()
+    assert (stats["hits"], stats["misses"], keys.calls) == (1, 2, 1)
+
+
+@pytest.mark.parametrize("token", [
+    make_token(project="other-project"),
+    make_token(key=make_key()[0]),
+    make_token(kid="unknown"),
+    "not-a-token",
+])
+def test_rejects_invalid_tokens(token):
+    verifier, _, _ = make_verifier()
+    with pytest.raises(auth.InvalidIdTokenError):
+        asyncio.run(verifier.verify(token))
+    assert verifier.get_stats()["failures"] == 1
+
+
+def test_rejects_expired_tokens():
+    verifier, _, _ = make_verifier()
+    with pytest.raises(auth.ExpiredIdTokenError):
+        asyncio.run(verifier.verify(make_token(expires_in=-60)))
+
+
+def test_background_revocation_drops_cached_tokens():
+    verifier, _, revoked = make_verifier()
+    token = make_token(auth_time=int(time.time()) - 100)
+
+    async def scenario():
+        await verifier.verify(token)
+        revoked["user-1"] = time.time() - 50
+        # Still served from cache until the background check runs
+        await verifier.verify(token)
+        await verifier.check_revocations()
+        with pytest.raises(auth.RevokedIdTokenError):
+            await verifier.verify(token)
+        # A token from a later sign-in is fine
+        return await verifier.verify(make_token())
+
+    assert asyncio.run(scenario())["uid"] == "user-1"
+    assert verifier.get_stats()["revoked"] == 1
+
+
+def test_reenabled_user_is_accepted_again():
+    verifier, _, revoked = make_verifier()
+
+    async def scenario():
+        await verifier.verify(make_token())
+        revoked["user-1"] = float("inf")
+        await verifier.check_revocations()
+        with pytest.raises(auth.RevokedIdTokenError):
+            await verifier.verify(make_token())
+        # No tokens are cached any more, but the user is still looked up
+        del revoked["user-1"]
+        await verifier.check_revocations()
+        return await verifier.verify(make_token())
+
+    assert asyncio.run(scenario())["uid"] == "user-1"
+    assert verifier.get_stats()["revoked_users"] == 0
+
+
+def test_revocation_entries_are_forgotten_after_token_lifetime(monkeypatch):
+    verifier, _, revoked = make_verifier()
+    revoked["user-1"] = float("inf")
+
+    async def scenario():
+        await verifier.verify(make_token())
+        await verifier.check_revocations()
+        checks = verifier.get_stats()["revocation_checks"]
+        later = time.time() + 3601
+        monkeypatch.setattr(time, "time", lambda: later)
+        await verifier.check_revocations()
+        return checks
+
+    checks = asyncio.run(scenario())
+    stats = verifier.get_stats()
+    assert stats["revoked_users"] == 0 and stats["revocation_checks"] == checks
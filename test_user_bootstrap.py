@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.user_bootstrap import BOOTSTRAP_COLLECTION, USERS_COLLECTION, UserBootstrap
+
+
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeFirestore:
+    """In-memory documents with serializable transactions and read counting."""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+        self.lock = threading.Lock()
+
+    def collection(self, name):
+        return Collection(self, name)
+
+
+class Collection:
+    def __init__(self, db, name, limit=None):
+        self.db, self.name, self._limit = db, name, limit
+
+    def document(self, doc_id):
+        return Document(self.db, self.name, doc_id)
+
+    def limit(self, count):
+        return Collection(self.db, self.name, count)
+
+    def get(self, transaction=None):
+        ids = sorted(doc_id for collection, doc_id in self.db.docs if collection == self.name)[:self._limit]
+        self.db.reads += max(len(ids), 1)
+        return [Snapshot(doc_id, self.db.docs[(self.name, doc_id)]) for doc_id in ids]
+
+
+class Document:
+    def __init__(self, db, collection, doc_id):
+        self.db, self.key = db, (collection, doc_id)
+
+    def get(self, transaction=None):
+        self.db.reads += 1
+        return Snapshot(self.key[1], self.db.docs.get(self.key))
+
+
+class Transaction:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data, merge))
+
+
+def run_transaction(db, fn):
+    with db.lock:
+        transaction = Transaction()
+        result = fn(transaction)
+        for ref, data, merge in transaction.writes:
+            current = db.docs.get(ref.key) if merge else None
+            db.docs[ref.key] = {**(current or {}), **data}
+        return result
+
+
+def make_bootstrap(db):
+    return UserBootstrap(db_factory=lambda: db, run_transaction=run_transaction)
+
+
+def test_first_user_is_admin_with_constant_reads():
+    db = FakeFirestore()
+    bootstrap = make_bootstrap(db)
+    assert bootstrap.assign_initial_role("u0", "first@example.com") == "admin"
+    for n in range(1, 50):
+        db.reads = 0
+        assert bootstrap.assign_initial_role(f"u{n}", None) == "analyst"
+        assert db.reads == 1
+    # The admin logging in again before the claim is set stays admin
+    assert bootstrap.assign_initial_role("u0", "first@example.com") == "admin"
+    assert db.docs[(USERS_COLLECTION, "u7")]["role"] == "analyst"
+
+
+def test_concurrent_first_logins_elect_one_admin():
+    db = FakeFirestore()
+    bootstrap = make_bootstrap(db)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        roles = list(pool.map(lambda n: bootstrap.assign_initial_role(f"u{n}", None), range(20)))
+    assert roles.count("admin") == 1
+
+
+def test_existing_deployment_without_marker_gets_no_new_admin():
+    db = FakeFirestore()
+    db.docs[(USERS_COLLECTION, "legacy-admin")] = {"uid": "legacy-admin", "role": "admin"}
+    bootstrap = make_bootstrap(db)
+    assert bootstrap.assign_initial_role("newcomer", None) == "analyst"
+    assert db.docs[(BOOTSTRAP_COLLECTION, "bootstrap")]["admin_uid"] is None
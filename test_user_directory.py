@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from services.user_directory import UserDirectory
+
+USERS = [{"uid": f"u{n:03d}", "email": f"user{n}@example.com", "role": "analyst" if n % 3 else "admin"}
+         for n in range(30)]
+
+
+def make_directory(users=USERS):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [dict(user) for user in users]
+
+    directory = UserDirectory(ttl_seconds=300, loader=loader)
+    asyncio.run(directory.ensure_loaded())
+    return directory, loads
+
+
+def test_pages_through_role_index():
+    directory, loads = make_directory()
+    seen, token = [], None
+    while True:
+        page, token = directory.search(role="admin", page_size=4, page_token=token)
+        seen.extend(user["uid"] for user in page)
+        if token is None:
+            break
+    assert seen == [f"u{n:03d}" for n in range(0, 30, 3)]
+    assert len(loads) == 1
+
+
+def test_search_and_incremental_update():
+    directory, _ = make_directory()
+    page, token = directory.search(query="USER2", page_size=100)
+    assert [user["uid"] for user in page] == ["u002", "u020", "u021", "u022", "u023", "u024", "u025", "u026",
+                                              "u027", "u028", "u029"]
+    assert token is None
+    directory.update("u001", None, "viewer")
+    directory.update("u100", "new@example.com", "viewer")
+    viewers, _ = directory.search(role="viewer")
+    assert viewers == [{"uid": "u001", "email": "user1@example.com", "role": "viewer"},
+                       {"uid": "u100", "email": "new@example.com", "role": "viewer"}]
+    assert "u001" not in [user["uid"] for user in directory.search(role="analyst", page_size=100)[0]]
+    assert directory.get_stats()["roles"] == {"admin": 10, "analyst": 19, "viewer": 2}
+
+
+def test_rejects_foreign_page_tokens():
+    directory, _ = make_directory()
+    with pytest.raises(ValueError):
+        directory.search(page_token="%%%")
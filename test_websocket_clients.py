@@ -0,0 +1,188 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from api_gateway.endpoints import websockets
+from api_gateway.endpoints.websockets import ClientConnection, LiveBuffer, forward_in_batches, read_stored_history
+
+
+class SlowSocket:
+    """Records frames; sending blocks until the test opens the gate."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+def data(n, protocol="TCP"):
+    packet = {"n": n, "protocol": protocol, "length": 100}
+    return json.dumps({"type": "network_log", "data": packet}), [packet]
+
+
+def run_client(policy, frames, control=()):
+    async def scenario():
+        socket = SlowSocket()
+        client = ClientConnection(socket, {"email": "analyst@example.com"}, policy=policy, max_queue=3)
+        client.start()
+        await asyncio.sleep(0)
+        for text in control:
+            client.enqueue(text)
+        for n in range(frames):
+            client.enqueue(*data(n, "UDP" if n % 2 else "TCP"))
+        stats = client.get_stats()
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        client.stop()
+        await asyncio.sleep(0)
+        return socket, client.get_stats(), stats
+
+    return asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_newest_frames():
+    socket, stats, before = run_client("drop_oldest", 6)
+    assert [frame["data"]["n"] for frame in socket.sent] == [3, 4, 5]
+    assert stats["frames_dropped"] == 3 and before["queued"] == 3
+
+
+def test_coalesce_summarizes_and_keeps_control_frames():
+    socket, stats, _ = run_client("coalesce", 6, control=[json.dumps({"type": "pong"})])
+    # The summary stands in for frames 0-4, in their place after the earlier pong
+    assert [frame["type"] for frame in socket.sent] == ["pong", "summary", "network_log"]
+    summary = socket.sent[1]["data"]
+    assert summary["packets"] == 5 and summary["protocols"] == {"TCP": 3, "UDP": 2} and summary["bytes"] == 500
+    assert socket.sent[2]["data"]["n"] == 5
+    assert stats["frames_coalesced"] == 5
+
+
+def test_disconnect_policy_closes_slow_client():
+    socket, stats, _ = run_client("disconnect", 6)
+    assert socket.closed_with == 1013
+    assert stats["frames_dropped"] >= 3
+
+
+def test_forward_in_batches_by_window_and_size():
+    async def scenario():
+        queue = asyncio.Queue()
+        sent = []
+
+        async def send(batch):
+            sent.append([packet["n"] for packet in batch])
+
+        task = asyncio.create_task(forward_in_batches(queue.get, send, 0.03, 3))
+        queue.put_nowait((None, [{"n": 0}, {"n": 1}]))
+        queue.put_nowait((None, [{"n": 2}, {"n": 3}]))
+        await asyncio.sleep(0.01)
+        size_flushed = list(sent)
+        await asyncio.sleep(0.05)
+        queue.put_nowait((None, [{"n": 4}]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return size_flushed, sent
+
+    size_flushed, sent = asyncio.run(scenario())
+    assert size_flushed == [[0, 1, 2]]
+    assert sent == [[0, 1, 2], [3], [4]]
+
+
+def test_history_end_reports_dropped_history_frames():
+    async def scenario():
+        socket = SlowSocket()
+        client = ClientConnection(socket, {"email": "analyst@example.com"}, policy="drop_oldest", max_queue=3)
+        client.start()
+        await asyncio.sleep(0)
+        for n in range(2):
+            packet = {"n": n}
+            client.enqueue(json.dumps({"type": "network_log_history", "data": [packet]}), [packet], history=True)
+        client.enqueue(lambda: json.dumps({"type": "history_end", "complete": client.history_dropped == 0}).encode())
+        # Live frames arriving before the client catches up push out a history frame
+        client.enqueue(*data(2))
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        client.stop()
+        return socket.sent
+
+    sent = asyncio.run(scenario())
+    assert [frame["type"] for frame in sent] == ["network_log_history", "history_end", "network_log"]
+    assert sent[1]["complete"] is False
+
+
+def test_live_buffer_holds_messages_while_history_is_read():
+    async def scenario():
+        queue = asyncio.Queue(maxsize=2)
+        live = LiveBuffer(queue.get, max_packets=3)
+        for n in range(3):
+            await queue.put((None, [{"n": n}]))
+        await asyncio.sleep(0)
+        await live.stop()
+        queue.put_nowait((None, [{"n": 3}]))
+        received = [(await live.get())[1][0]["n"] for _ in range(4)]
+        return received, live.overflowed
+
+    assert asyncio.run(scenario()) == ([0, 1, 2, 3], False)
+
+
+def test_live_buffer_flags_overflow():
+    async def scenario():
+        queue = asyncio.Queue()
+        live = LiveBuffer(queue.get, max_packets=2)
+        for n in range(3):
+            queue.put_nowait((None, [{"n": n}]))
+        await asyncio.sleep(0)
+        await live.stop()
+        return [(await live.get())[1][0]["n"] for _ in range(2)], live.overflowed
+
+    assert asyncio.run(scenario()) == ([0, 1], True)
+
+
+def test_state_frames_collapse_into_one_resync():
+    async def scenario():
+        socket = SlowSocket()
+        client = ClientConnection(socket, {"email": "analyst@example.com"}, policy="drop_oldest", max_queue=3)
+        client.start()
+        await asyncio.sleep(0)
+        state = {"n": 0}
+
+        def snapshot():
+            return json.dumps({"type": "snapshot", "n": state["n"]})
+
+        for n in range(1, 11):
+            state["n"] = n
+            client.enqueue(json.dumps({"type": "delta", "n": n}), resync=snapshot)
+        queued = client.get_stats()["queued"]
+        socket.gate.set()
+        await asyncio.sleep(0.01)
+        state["n"] = 11
+        client.enqueue(json.dumps({"type": "delta", "n": 11}), resync=snapshot)
+        await asyncio.sleep(0.01)
+        client.stop()
+        return socket.sent, queued
+
+    sent, queued = asyncio.run(scenario())
+    # The queue stays bounded; the snapshot, built when sent, covers every delta it replaced
+    assert queued <= 3
+    assert sent == [{"type": "snapshot", "n": 10}, {"type": "delta", "n": 11}]
+
+
+def test_stored_history_bounds_are_utc(monkeypatch):
+    queries = []
+
+    def query_network_logs(limit, start_time, end_time):
+        queries.append((start_time, end_time))
+        return []
+
+    monkeypatch.setattr(websockets.storage_backend, "query_network_logs", query_network_logs)
+    # A client in UTC+2 asks for the ten minutes before the first buffered packet
+    since = datetime(2024, 1, 1, 2, 0, tzinfo=timezone(timedelta(hours=2)))
+    buffered = [{"seq": 5, "timestamp": "2024-01-01T00:10:00+00:00"}]
+    asyncio.run(read_stored_history(since, buffered, 100))
+    assert queries == [("2024-01-01T00:00:00+00:00", "2024-01-01T00:10:00+00:00")]